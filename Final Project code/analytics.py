@@ -0,0 +1,176 @@
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+from database_handler import date_range_filter
+
+# Vectorised analyses over the whole hours log. load_hours() reads
+# volunteer_hours once into flat arrays; everything else works on those
+# arrays without going back to sqlite. Needs NumPy.
+
+HoursArrays = namedtuple('HoursArrays', ['volunteer_ids', 'volunteer', 'day', 'hours'])
+Activity = namedtuple('Activity', ['first_day', 'active', 'hours'])
+Retention = namedtuple('Retention', ['cohorts', 'sizes', 'rates'])
+
+LOAD_BATCH_SIZE = 100000
+ACTIVITY_WINDOWS = (30, 90)
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+RETENTION_MONTHS = 12
+# date.toordinal() of 1970-01-01, where numpy's datetime64 days start.
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def load_hours(db_handler, start=None, end=None):
+    # Day numbers are date.toordinal() values, as volunteer_hours.day
+    # stores them. volunteer_ids only lists volunteers with at least one
+    # shift.
+    where, params = date_range_filter('day', start, end)
+    index = {}
+    volunteer = []
+    day = []
+    hours = []
+    cursor = db_handler.conn.cursor()
+    try:
+        cursor.execute(f'''
+            SELECT volunteer_id, day, COALESCE(hours_worked, 0)
+            FROM volunteer_hours
+            WHERE {where}
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+            if not rows:
+                break
+            ids, days, worked = zip(*rows)
+            volunteer.append(np.fromiter((index.setdefault(id, len(index)) for id in ids), np.int32, len(ids)))
+            day.append(np.array(days, np.int32))
+            hours.append(np.array(worked, np.float64))
+    finally:
+        cursor.close()
+    if not volunteer:
+        return HoursArrays([], np.zeros(0, np.int32), np.zeros(0, np.int32), np.zeros(0, np.float64))
+    return HoursArrays(list(index), np.concatenate(volunteer), np.concatenate(day), np.concatenate(hours))
+
+
+def distinct(values):
+    # Sorted unique values. Same result as np.unique, which on recent NumPy
+    # is many times slower than a plain sort for large integer arrays.
+    values = np.sort(values)
+    return values[np.append(True, values[1:] != values[:-1])] if len(values) else values
+
+
+def volunteer_totals(arrays):
+    # (total hours, shift count) per volunteer, aligned with volunteer_ids.
+    count = len(arrays.volunteer_ids)
+    totals = np.bincount(arrays.volunteer, weights=arrays.hours, minlength=count)
+    shifts = np.bincount(arrays.volunteer, minlength=count)
+    return totals, shifts
+
+
+def rolling_activity(arrays, window):
+    # For every day from the first to the last shift: how many volunteers
+    # worked at least once in the trailing `window` days, and the hours
+    # worked in that window.
+    if not len(arrays.day):
+        return Activity(None, np.zeros(0, np.int64), np.zeros(0))
+    first_day = int(arrays.day.min())
+    span = int(arrays.day.max()) - first_day + 1
+    offset = arrays.day - first_day
+
+    daily = np.bincount(offset, weights=arrays.hours, minlength=span)
+    cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+    days = np.arange(span)
+    hours = cumulative[days + 1] - cumulative[np.maximum(days + 1 - window, 0)]
+
+    # A shift keeps its volunteer active for `window` days, cut short by the
+    # same volunteer's next shift so overlapping windows are not counted
+    # twice. Each such interval is +1 at its start and -1 past its end.
+    pairs = distinct(arrays.volunteer.astype(np.int64) * span + offset)
+    volunteer, start = np.divmod(pairs, span)
+    next_start = np.append(start[1:], span + window)
+    next_start[np.append(volunteer[1:] != volunteer[:-1], True)] = span + window
+    stop = np.minimum(start + window, next_start)
+    changes = np.bincount(start, minlength=span + window + 1) - np.bincount(stop, minlength=span + window + 1)
+    active = np.cumsum(changes)[:span]
+    return Activity(first_day, active, hours)
+
+
+def month_numbers(days):
+    # Months since 1970-01 for an array of day ordinals.
+    return (days - EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def retention_cohorts(arrays, months=RETENTION_MONTHS):
+    # Volunteers grouped by the month of their first shift; rates[c, m] is
+    # the share of cohort c that worked in its m-th month after joining.
+    if not len(arrays.day):
+        return Retention([], np.zeros(0, np.int64), np.zeros((0, months + 1)))
+    month = month_numbers(arrays.day)
+    first = np.full(len(arrays.volunteer_ids), np.iinfo(np.int64).max)
+    np.minimum.at(first, arrays.volunteer, month)
+    cohort_months = distinct(first)
+    cohort = np.searchsorted(cohort_months, first)
+    sizes = np.bincount(cohort, minlength=len(cohort_months))
+
+    since = month - first[arrays.volunteer]
+    kept = since <= months
+    pairs = distinct(arrays.volunteer[kept].astype(np.int64) * (months + 1) + since[kept])
+    volunteer, since = np.divmod(pairs, months + 1)
+    active = np.bincount(cohort[volunteer] * (months + 1) + since, minlength=len(cohort_months) * (months + 1))
+    rates = active.reshape(len(cohort_months), months + 1) / sizes[:, None]
+
+    # Months a cohort has not reached yet are unknown, not zero.
+    last_month = month.max()
+    rates[np.arange(months + 1)[None, :] > (last_month - cohort_months)[:, None]] = np.nan
+    labels = [str(np.datetime64(int(m), 'M')) for m in cohort_months]
+    return Retention(labels, sizes, rates)
+
+
+def percentiles(values, points=PERCENTILES):
+    if not len(values):
+        return [float('nan')] * len(points)
+    return np.percentile(values, points).tolist()
+
+
+def activity_report_lines(db_handler, windows=ACTIVITY_WINDOWS):
+    # One line per calendar month, as of the month's last day with data.
+    arrays = load_hours(db_handler)
+    if not len(arrays.day):
+        yield "No volunteer hours logged.\n"
+        return
+    activities = [rolling_activity(arrays, window) for window in windows]
+    first_day = activities[0].first_day
+    days = np.arange(len(activities[0].active)) + first_day
+    month = month_numbers(days)
+    month_ends = np.flatnonzero(np.append(month[1:] != month[:-1], True))
+    headings = ''.join(f"{f'Active {w}d':>12}{f'Hours {w}d':>12}" for w in windows)
+    yield f"{'Date':<12}{headings}\n"
+    for end in month_ends:
+        columns = ''.join(f"{activity.active[end]:>12}{activity.hours[end]:>12.1f}" for activity in activities)
+        yield f"{date.fromordinal(int(days[end])).isoformat():<12}{columns}\n"
+
+
+def retention_report_lines(db_handler, months=RETENTION_MONTHS):
+    retention = retention_cohorts(load_hours(db_handler), months)
+    if not retention.cohorts:
+        yield "No volunteer hours logged.\n"
+        return
+    yield f"{'Cohort':<10}{'Size':>7}" + ''.join(f"{f'M{m}':>6}" for m in range(months + 1)) + "\n"
+    for label, size, rates in zip(retention.cohorts, retention.sizes, retention.rates):
+        cells = ''.join(f"{'':>6}" if np.isnan(rate) else f"{rate * 100:>5.0f}%" for rate in rates)
+        yield f"{label:<10}{size:>7}{cells}\n"
+
+
+def distribution_report_lines(db_handler, points=PERCENTILES):
+    arrays = load_hours(db_handler)
+    totals, shifts = volunteer_totals(arrays)
+    rows = [
+        ("Hours per shift", arrays.hours),
+        ("Hours per volunteer", totals),
+        ("Shifts per volunteer", shifts),
+    ]
+    yield f"{'':<22}{'Count':>9}{'Mean':>9}" + ''.join(f"{f'P{p}':>9}" for p in points) + "\n"
+    for label, values in rows:
+        mean = values.mean() if len(values) else float('nan')
+        cells = ''.join(f"{value:>9.1f}" for value in percentiles(values, points))
+        yield f"{label:<22}{len(values):>9}{mean:>9.1f}{cells}\n"
@@ -0,0 +1,482 @@
+import argparse
+import asyncio
+import json
+import re
+import sqlite3
+import sys
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from database_handler import DatabaseHandler, HISTORY_PAGE_SIZE, REPORT_PAGE_SIZE, SUMMARY_REPORT_SORTS
+from instrumentation import Instrumentation, SLOW_QUERY_MS
+from validation import validate_date, validate_email, validate_hours, validate_not_empty, MAX_SHIFT_HOURS
+from volunteer import Volunteer
+from volunteer_hours import VolunteerHours
+
+# HTTP/JSON access to the volunteer database for kiosks and scanners, using
+# only the standard library. The event loop parses requests and writes
+# responses; every job that touches the database (and its JSON encoding)
+# runs on a fixed-size thread pool sharing one DatabaseHandler, which gives
+# each pool thread its own sqlite connection. Connections are kept alive
+# and may pipeline: requests on one connection are read and run as they
+# arrive, up to PIPELINE_DEPTH at a time, and their responses are written
+# back in request order. Reads of one connection may run in parallel, but
+# never alongside a write sent before or after them on that connection, so
+# a client always sees its own writes.
+#
+#   GET    /health
+#   GET    /volunteers?sort=&descending=&after=&limit=    volunteer summary, one page
+#   POST   /volunteers                                    {id, name, email, contact_info, skills}
+#   GET    /volunteers/ID
+#   PUT    /volunteers/ID                                 {name, email, contact_info, skills}
+#   DELETE /volunteers/ID
+#   GET    /volunteers/ID/hours?after=&limit=&start=&end=
+#   POST   /volunteers/ID/hours                           {date, hours_worked, description}
+#   GET    /reports/hours?start=&end=&top=
+#   GET    /reports/skills?start=&end=&top=
+#   GET    /reports/months?start=&end=&volunteer=
+#   GET    /search?q=&limit=&start=&end=
+#   GET    /diagnostics                                   with --diagnostics only
+#
+# HEAD works wherever GET does and gets the same headers without the body.
+#
+# Paged lists return {"items": [...], "next": CURSOR}; pass CURSOR back as
+# ?after= for the next page. It is null on the last page.
+
+Request = namedtuple('Request', ['method', 'path', 'query', 'headers', 'body', 'keep_alive'])
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+# Requests of one connection that may be running or waiting to be written.
+PIPELINE_DEPTH = 16
+KEEP_ALIVE_TIMEOUT = 15.0
+MAX_HEADER_BYTES = 16384
+MAX_BODY_BYTES = 1048576
+MAX_PAGE_SIZE = 1000
+SEARCH_LIMIT = 20
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def encode_response(status, body=b'', keep_alive=True, send_body=True):
+    # send_body=False is for HEAD: Content-Length still gives the body's size.
+    head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+    if status != 204:
+        head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+    if not keep_alive:
+        head += "Connection: close\r\n"
+    return head.encode('latin-1') + b'\r\n' + (body if send_body else b'')
+
+
+def error_body(message):
+    return json.dumps({'error': message}).encode()
+
+
+async def read_request(reader):
+    # The next request on the connection, or None once the client has
+    # closed it between requests.
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise HttpError(400, "Incomplete request")
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, "Request headers are too large")
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+    if version not in ('HTTP/1.1', 'HTTP/1.0'):
+        raise HttpError(505, f"{version} is not supported")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, colon, value = line.partition(':')
+            if not colon:
+                raise HttpError(400, "Malformed header")
+            headers[name.strip().lower()] = value.strip()
+    if 'transfer-encoding' in headers:
+        raise HttpError(501, "Chunked request bodies are not supported")
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HttpError(400, "Malformed Content-Length")
+    if not 0 <= length <= MAX_BODY_BYTES:
+        raise HttpError(413, f"Request bodies are limited to {MAX_BODY_BYTES} bytes")
+    try:
+        body = await reader.readexactly(length) if length else b''
+    except asyncio.IncompleteReadError:
+        raise HttpError(400, "Incomplete request body")
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    url = urlsplit(target)
+    return Request(method, url.path, dict(parse_qsl(url.query)), headers, body, keep_alive)
+
+
+def json_body(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        raise HttpError(400, "Request body must be JSON")
+    if not isinstance(data, dict):
+        raise HttpError(400, "Request body must be a JSON object")
+    return data
+
+
+def query_int(request, name, default, maximum=None):
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise HttpError(400, f"{name} must be a whole number")
+    if value < 1 or (maximum is not None and value > maximum):
+        raise HttpError(400, f"{name} must be between 1 and {maximum}" if maximum else f"{name} must be positive")
+    return value
+
+
+def page_cursor(request):
+    # Cursors are the JSON (key, id) pair of the last row of a page.
+    value = request.query.get('after')
+    if value is None:
+        return None
+    try:
+        after = json.loads(value)
+    except ValueError:
+        after = None
+    if not isinstance(after, list) or len(after) != 2:
+        raise HttpError(400, "after must be the cursor of an earlier page")
+    return after
+
+
+def page(items, rows, limit, key):
+    return {'items': items, 'next': json.dumps(key(rows[-1])) if len(rows) == limit else None}
+
+
+def volunteer_json(volunteer):
+    return {'id': volunteer.id, 'name': volunteer.name, 'email': volunteer.email,
+            'contact_info': volunteer.contact_info, 'skills': list(volunteer.skills)}
+
+
+def volunteer_fields(data):
+    # Same rules as the app's forms: every field is required and the email
+    # must look like one. skills may be a list or a comma-separated string.
+    name, email, contact_info, skills = (data.get(field) for field in ('name', 'email', 'contact_info', 'skills'))
+    if isinstance(skills, str):
+        skills = skills.split(',')
+    if not all(isinstance(value, str) for value in (name, email, contact_info)) or \
+            not isinstance(skills, list) or not all(isinstance(skill, str) for skill in skills):
+        raise HttpError(400, "name, email and contact_info must be strings and skills a list of strings")
+    if not validate_not_empty(name, email, contact_info, skills):
+        raise HttpError(400, "All fields are required")
+    if not validate_email(email):
+        raise HttpError(400, "Invalid email format")
+    return name, email, contact_info, skills
+
+
+def existing_volunteer(db_handler, volunteer_id):
+    volunteer = db_handler.get_volunteer_by_id(volunteer_id)
+    if volunteer is None:
+        raise HttpError(404, f"No volunteer with id {volunteer_id!r}")
+    return volunteer
+
+
+# Jobs: run on the thread pool as job(db_handler, request, *path_parts) and
+# return (status, payload).
+
+def health(db_handler, request):
+    return 200, {'status': 'ok', 'site_id': db_handler.site_id}
+
+
+def list_volunteers(db_handler, request):
+    sort = request.query.get('sort', 'id')
+    if sort not in SUMMARY_REPORT_SORTS:
+        raise HttpError(400, f"sort must be one of {', '.join(SUMMARY_REPORT_SORTS)}")
+    limit = query_int(request, 'limit', REPORT_PAGE_SIZE, MAX_PAGE_SIZE)
+    rows = db_handler.volunteer_summary_page(sort, request.query.get('descending') in ('1', 'true'),
+                                             page_cursor(request), limit)
+    column = ('id', 'name', 'email').index(sort)
+    return 200, page([{'id': id, 'name': name, 'email': email, 'contact_info': contact_info,
+                       'skills': skills.split(',') if skills else []}
+                      for id, name, email, contact_info, skills in rows],
+                     rows, limit, lambda row: [row[column], row[0]])
+
+
+def create_volunteer(db_handler, request):
+    data = json_body(request)
+    volunteer_id = data.get('id')
+    if not isinstance(volunteer_id, str) or not volunteer_id:
+        raise HttpError(400, "id is required")
+    volunteer = Volunteer(volunteer_id, *volunteer_fields(data))
+    try:
+        db_handler.add_volunteer(volunteer)
+    except sqlite3.IntegrityError:
+        raise HttpError(409, f"A volunteer with id {volunteer_id!r} already exists")
+    return 201, volunteer_json(volunteer)
+
+
+def get_volunteer(db_handler, request, volunteer_id):
+    return 200, volunteer_json(existing_volunteer(db_handler, volunteer_id))
+
+
+def update_volunteer(db_handler, request, volunteer_id):
+    volunteer = Volunteer(volunteer_id, *volunteer_fields(json_body(request)))
+    existing_volunteer(db_handler, volunteer_id)
+    db_handler.update_volunteer(volunteer)
+    return 200, volunteer_json(volunteer)
+
+
+def delete_volunteer(db_handler, request, volunteer_id):
+    existing_volunteer(db_handler, volunteer_id)
+    db_handler.remove_volunteer(volunteer_id)
+    return 204, None
+
+
+def list_hours(db_handler, request, volunteer_id):
+    existing_volunteer(db_handler, volunteer_id)
+    limit = query_int(request, 'limit', HISTORY_PAGE_SIZE, MAX_PAGE_SIZE)
+    rows = db_handler.volunteer_hours_page(volunteer_id, page_cursor(request), limit,
+                                           request.query.get('start'), request.query.get('end'))
+    return 200, page([{'date': date, 'hours_worked': hours_worked, 'description': description}
+                      for id, date, hours_worked, description in rows],
+                     rows, limit, lambda row: [row[1], row[0]])
+
+
+def log_hours(db_handler, request, volunteer_id):
+    data = json_body(request)
+    date, description = data.get('date'), data.get('description')
+    if not isinstance(date, str) or not isinstance(description, str) or not validate_not_empty(date, description):
+        raise HttpError(400, "date and description are required")
+    if not validate_date(date):
+        raise HttpError(400, "date must be a real date written as YYYY-MM-DD")
+    try:
+        hours_worked = float(data.get('hours_worked'))
+    except (TypeError, ValueError):
+        raise HttpError(400, "hours_worked must be a number")
+    if not validate_hours(hours_worked):
+        raise HttpError(400, f"hours_worked must be more than 0 and at most {MAX_SHIFT_HOURS}")
+    hours = VolunteerHours(date, hours_worked, description)
+    existing_volunteer(db_handler, volunteer_id)
+    db_handler.add_volunteer_hours(volunteer_id, hours)
+    return 201, hours._asdict()
+
+
+def hours_report(db_handler, request):
+    rows = db_handler.hours_totals(request.query.get('start'), request.query.get('end'),
+                                   query_int(request, 'top', None))
+    return 200, [row._asdict() for row in rows]
+
+
+def skills_report(db_handler, request):
+    rows = db_handler.hours_by_skill(request.query.get('start'), request.query.get('end'),
+                                     query_int(request, 'top', None))
+    return 200, [row._asdict() for row in rows]
+
+
+def months_report(db_handler, request):
+    rows = db_handler.hours_by_month(request.query.get('start'), request.query.get('end'), request.query.get('volunteer'))
+    return 200, [row._asdict() for row in rows]
+
+
+def search(db_handler, request):
+    hits = db_handler.search(request.query.get('q', ''), query_int(request, 'limit', SEARCH_LIMIT, MAX_PAGE_SIZE),
+                             request.query.get('start'), request.query.get('end'))
+    return 200, [hit._asdict() for hit in hits]
+
+
+def diagnostics(db_handler, request):
+    if db_handler.instrumentation is None:
+        raise HttpError(404, "Start the server with --diagnostics to collect timings")
+    return 200, db_handler.instrumentation.snapshot()
+
+
+ROUTES = [(method, re.compile(pattern), job) for method, pattern, job in (
+    ('GET', r'/health', health),
+    ('GET', r'/volunteers', list_volunteers),
+    ('POST', r'/volunteers', create_volunteer),
+    ('GET', r'/volunteers/([^/]+)', get_volunteer),
+    ('PUT', r'/volunteers/([^/]+)', update_volunteer),
+    ('DELETE', r'/volunteers/([^/]+)', delete_volunteer),
+    ('GET', r'/volunteers/([^/]+)/hours', list_hours),
+    ('POST', r'/volunteers/([^/]+)/hours', log_hours),
+    ('GET', r'/reports/hours', hours_report),
+    ('GET', r'/reports/skills', skills_report),
+    ('GET', r'/reports/months', months_report),
+    ('GET', r'/search', search),
+    ('GET', r'/diagnostics', diagnostics),
+)]
+
+
+def route(request):
+    # (job, path parts) for the request; 404 for unknown paths and 405 for
+    # known paths with the wrong method. HEAD runs the GET job.
+    allowed = []
+    requested = 'GET' if request.method == 'HEAD' else request.method
+    for method, pattern, job in ROUTES:
+        match = pattern.fullmatch(request.path)
+        if match:
+            if method == requested:
+                return job, [unquote(part) for part in match.groups()]
+            allowed.append(method)
+    if allowed:
+        raise HttpError(405, f"Use {' or '.join(allowed)} for {request.path}")
+    raise HttpError(404, f"Nothing at {request.path}")
+
+
+def run_job(db_handler, job, request, args):
+    # Runs on a pool thread and returns (status, encoded body). A ValueError
+    # from the handler means it rejected the client's input.
+    try:
+        if db_handler.instrumentation is not None:
+            status, payload = db_handler.instrumentation.run_job(job, db_handler, request, *args)
+        else:
+            status, payload = job(db_handler, request, *args)
+    except HttpError as e:
+        return e.status, error_body(e.message)
+    except ValueError as e:
+        return 400, error_body(str(e))
+    return status, b'' if payload is None else json.dumps(payload).encode()
+
+
+class ApiServer:
+    # Serves one DatabaseHandler; start() with asyncio and close() when done.
+    def __init__(self, db_handler, workers=DEFAULT_WORKERS, pipeline_depth=PIPELINE_DEPTH,
+                 keep_alive_timeout=KEEP_ALIVE_TIMEOUT):
+        self.db_handler = db_handler
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-db')
+        self.pipeline_depth = pipeline_depth
+        self.keep_alive_timeout = keep_alive_timeout
+        self.server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        return self.server
+
+    async def respond(self, request, earlier=()):
+        # earlier: tasks of this connection that must finish first.
+        earlier = [task for task in earlier if task is not None and not task.done()]
+        if earlier:
+            await asyncio.wait(earlier)
+        try:
+            job, args = route(request)
+            status, body = await asyncio.get_running_loop().run_in_executor(
+                self.executor, run_job, self.db_handler, job, request, args)
+        except HttpError as e:
+            status, body = e.status, error_body(e.message)
+        except Exception:
+            traceback.print_exc()
+            status, body = 500, error_body("Internal server error")
+        return encode_response(status, body, request.keep_alive, request.method != 'HEAD')
+
+    async def handle_connection(self, reader, writer):
+        responses = asyncio.Queue(self.pipeline_depth)
+        sender = asyncio.create_task(self.send_responses(responses, writer))
+        last_task = last_write = None
+        since_write = []
+        try:
+            while True:
+                # The keep-alive timeout only runs while the connection is
+                # idle, not while its last request is still being answered.
+                idle = last_task is None or last_task.done()
+                try:
+                    async with asyncio.timeout(self.keep_alive_timeout if idle else None):
+                        request = await read_request(reader)
+                except HttpError as e:
+                    failed = asyncio.get_running_loop().create_future()
+                    failed.set_result(encode_response(e.status, error_body(e.message), keep_alive=False))
+                    await responses.put(failed)
+                    break
+                except (TimeoutError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                if request.method in SAFE_METHODS:
+                    task = asyncio.ensure_future(self.respond(request, [last_write]))
+                    since_write = [task for task in since_write if not task.done()] + [task]
+                else:
+                    task = asyncio.ensure_future(self.respond(request, [last_write, *since_write]))
+                    last_write, since_write = task, []
+                last_task = task
+                await responses.put(task)
+                if not request.keep_alive:
+                    break
+        finally:
+            await responses.put(None)
+            await sender
+            writer.close()
+
+    async def send_responses(self, responses, writer):
+        # Writes each response once it and all earlier ones are ready. While
+        # more responses are queued the writes are only buffered, so a
+        # pipelined batch goes out in as few packets as possible.
+        connected = True
+        while True:
+            response = await responses.get()
+            if response is None:
+                return
+            data = await response
+            if not connected:
+                continue
+            try:
+                writer.write(data)
+                if responses.empty():
+                    await writer.drain()
+            except ConnectionError:
+                connected = False
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown()
+
+
+async def serve(db_handler, host, port, workers):
+    api = ApiServer(db_handler, workers)
+    server = await api.start(host, port)
+    for sock in server.sockets:
+        print(f"Serving on http://{sock.getsockname()[0]}:{sock.getsockname()[1]}", file=sys.stderr)
+    try:
+        await server.serve_forever()
+    finally:
+        api.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the volunteer database as HTTP/JSON.")
+    parser.add_argument('--db', default='volunteers.db', help="database file (default: volunteers.db)")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"default: {DEFAULT_PORT}")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"threads running database work (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--diagnostics', action='store_true', help="time every database call; see GET /diagnostics")
+    parser.add_argument('--slow-query-ms', type=float, default=SLOW_QUERY_MS,
+                        help=f"with --diagnostics, log statements slower than this (default: {SLOW_QUERY_MS:g} ms)")
+    parser.add_argument('--slow-query-log', help="with --diagnostics, also append slow statements to this file")
+    args = parser.parse_args(argv)
+    instrumentation = Instrumentation(args.slow_query_ms, args.slow_query_log) if args.diagnostics else None
+
+    db_handler = DatabaseHandler(args.db, instrumentation=instrumentation)
+    try:
+        asyncio.run(serve(db_handler, args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db_handler.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hours_log import HoursLog
+from volunteer_hours import VolunteerHours
+
+# Measures the memory needed to hold a volunteer's shifts in memory, as a
+# list of the old dict-backed objects, as a list of VolunteerHours tuples and
+# as a HoursLog. Rows are built the way sqlite hands them back: every date
+# and description is a fresh string object.
+
+ACTIVITIES = ['food bank', 'shelter', 'kitchen', 'tutoring', 'cleanup', 'warehouse', 'event setup', 'driving']
+
+
+class DictHours:
+    def __init__(self, date, hours_worked, description):
+        self.date = date
+        self.hours_worked = hours_worked
+        self.description = description
+
+
+def generate_rows(count, seed):
+    rng = random.Random(seed)
+    start = date(2022, 1, 1)
+    for _ in range(count):
+        day = (start + timedelta(days=rng.randrange(3 * 365))).isoformat()
+        description = ' '.join(rng.sample(ACTIVITIES, 2))
+        yield day, description, rng.choice((1.0, 1.5, 2.0, 3.0, 4.0))
+
+
+def measure(build, count, seed):
+    # Rows are generated while tracing, so the strings a list keeps alive are
+    # counted and the ones HoursLog lets go of are not. Timing is a separate
+    # untraced run because tracemalloc slows every allocation down.
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    container = build(generate_rows(count, seed))
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del container
+    started = time.perf_counter()
+    container = build(generate_rows(count, seed))
+    elapsed = time.perf_counter() - started
+    return used, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare memory per million shifts for in-memory hours representations.")
+    parser.add_argument('--shifts', type=int, default=200000, help="shifts to build; results are scaled to a million")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    layouts = [
+        ('dict-backed objects', lambda rows: [DictHours(day, hours, text) for day, text, hours in rows]),
+        ('VolunteerHours tuples', lambda rows: [VolunteerHours(day, hours, text) for day, text, hours in rows]),
+        ('HoursLog', lambda rows: HoursLog(VolunteerHours(day, hours, text) for day, text, hours in rows)),
+    ]
+    results = {}
+    for name, build in layouts:
+        used, elapsed = measure(build, args.shifts, args.seed)
+        results[name] = used
+        per_million = used * 1000000 / args.shifts
+        print(f"{name:22} {per_million / 2 ** 20:8.1f} MiB per million shifts "
+              f"({used / args.shifts:6.1f} bytes/shift, {elapsed * 1000000 / args.shifts:.2f} s per million to build)")
+    if results['HoursLog'] >= results['VolunteerHours tuples']:
+        print("FAIL: HoursLog is not smaller than a list of tuples")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_handler import DatabaseHandler
+from instrumentation import Instrumentation
+from synthetic_data import populate
+from volunteer_app import VolunteerApp
+
+# Walks every screen of VolunteerApp, cached or not, many times over a small
+# synthetic database and checks that the number of live widgets is the same
+# after the last lap as after the first, i.e. that navigation reuses the
+# cached screens and destroys the report, diagnostics and analytics views it
+# leaves. Exits with status 1 on a leak, and also when there is no display or
+# NumPy (needed by the analytics reports) is missing, so that a CI job can
+# not pass without checking anything. On a headless machine give it a
+# virtual display:
+#   xvfb-run -a python benchmarks/bench_navigation.py
+
+DEFAULT_LAPS = 50
+VOLUNTEERS = 200
+SETTLE_TIMEOUT = 30.0
+
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+
+def settle(app):
+    # Lets the screen's database jobs finish and their results be drawn.
+    deadline = time.monotonic() + SETTLE_TIMEOUT
+    app.root.update()
+    while app.worker is not None and app.worker.outstanding:
+        if time.monotonic() > deadline:
+            raise RuntimeError("database jobs did not finish")
+        time.sleep(0.005)
+        app.root.update()
+
+
+def visit(app, show):
+    show()
+    settle(app)
+    app.create_main_menu()
+    settle(app)
+
+
+def lap(app):
+    visit(app, app.add_volunteer_menu)
+    visit(app, app.update_volunteer_menu)
+    visit(app, lambda: app.search_volunteer('V0000001'))
+    visit(app, app.remove_volunteer_menu)
+    visit(app, app.log_hours_menu)
+    visit(app, lambda: (app.search_menu(), app.run_search('food')))
+    visit(app, app.diagnostics_menu)
+    app.generate_reports_menu()
+    for report in (app.generate_hours_report, app.generate_summary_report, app.generate_activity_report,
+                   app.generate_retention_report, app.generate_distribution_report):
+        visit(app, report)
+        app.generate_reports_menu()
+    app.create_main_menu()
+    settle(app)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that moving between screens does not leak widgets.")
+    parser.add_argument('--laps', type=int, default=DEFAULT_LAPS, help="laps after the first (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    try:
+        import analytics
+    except ImportError:
+        print("FAIL: the analytics reports need NumPy; install it with: pip install numpy")
+        return 1
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"FAIL: no display ({e}); run it under a virtual display: xvfb-run -a python {sys.argv[0]}")
+        return 1
+
+    data_dir = tempfile.mkdtemp(prefix='volunteer-navigation-')
+    try:
+        db_path = os.path.join(data_dir, 'navigation.db')
+        db_handler = DatabaseHandler(db_path)
+        populate(db_handler, VOLUNTEERS)
+        db_handler.close()
+        app = VolunteerApp(root, db_file=db_path, instrumentation=Instrumentation())
+        try:
+            lap(app)
+            first = count_widgets(root)
+            started = time.perf_counter()
+            for _ in range(args.laps):
+                lap(app)
+            elapsed = time.perf_counter() - started
+            last = count_widgets(root)
+            cached = sorted(app.screens)
+        finally:
+            app.worker.close()
+            root.destroy()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"cached screens: {', '.join(cached)}")
+    print(f"widgets after the first lap: {first}, after {args.laps} more laps: {last}")
+    print(f"{elapsed / max(args.laps, 1) * 1000:.2f} ms per lap")
+    if last != first:
+        print("FAIL: navigation leaks widgets")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
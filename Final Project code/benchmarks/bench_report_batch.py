@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_batch import run_batch, SHARD_KINDS
+
+# Times the report batch against an existing database and prints the speedup
+# over the single-process baseline: one process aggregating the whole table
+# as one shard. Each shard kind then runs with 2, 4, ... workers and one
+# shard per worker, and once more with the same shards aggregated one after
+# another in a single process. That serial time is the total work the shards
+# do; when it stays close to the baseline, sharding adds no work and the
+# parallel time can only be limited by the cores available. Results must be
+# identical for every run.
+
+
+def timed_batch(db_path, shard_by, shards, workers):
+    started = time.perf_counter()
+    results = run_batch(db_path, shard_by=shard_by, shards=shards, workers=workers)
+    elapsed = time.perf_counter() - started
+    summary = {report: [(row[0], round(row.total_hours, 6), row.shift_count) for row in rows]
+               for report, rows in results.items()}
+    return elapsed, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how the report batch scales with worker processes.")
+    parser.add_argument('db', help="database file to read (it is opened read-only)")
+    parser.add_argument('--shard-by', choices=SHARD_KINDS, action='append',
+                        help="shard kind to time; repeat for several (default: all)")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+    db_path = os.path.abspath(args.db)
+
+    counts = [2]
+    while counts[-1] * 2 <= args.max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != args.max_workers and args.max_workers > 2:
+        counts.append(args.max_workers)
+
+    baseline, expected = timed_batch(db_path, SHARD_KINDS[0], 1, 1)
+    print(f"{os.cpu_count()} cores; single process, no shards: {baseline:7.2f} s")
+    for shard_by in args.shard_by or SHARD_KINDS:
+        for workers in counts:
+            elapsed, summary = timed_batch(db_path, shard_by, workers, workers)
+            serial, serial_summary = timed_batch(db_path, shard_by, workers, 1)
+            if summary != expected or serial_summary != expected:
+                print(f"FAIL: results sharded by {shard_by} with {workers} workers differ from the baseline")
+                return 1
+            print(f"{shard_by:>9} x {workers:<3} {elapsed:7.2f} s, speedup {baseline / elapsed:5.2f}x"
+                  f"  (shards in one process {serial:7.2f} s, {serial / baseline:5.2f}x the baseline work)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import build_database
+from database_handler import DatabaseHandler
+from synthetic_data import DEFAULT_SEED, DEFAULT_SHIFTS_PER_VOLUNTEER
+
+# Times DatabaseHandler.search() the way the Search screen calls it while a
+# user types, on a synthetic database of --shifts shifts (1M by default, with
+# a tenth as many volunteers), and exits with status 1 when the median of any
+# query is over --budget-ms. Every prefix of each word is a query of its
+# own, as search-as-you-type sends them, and some run within a date range.
+# The database is built by synthetic_data.py into --data-dir and reused by
+# later runs, or --db names an existing one; searches never change it.
+
+DEFAULT_SHIFTS = 1000000
+DEFAULT_BUDGET_MS = 50.0
+DEFAULT_REPEAT = 5
+TYPED = ('food bank', 'kitchen', 'garden shelter', 'smith', 'ann')
+DATE_RANGES = (
+    ('food', '2023-03-01', '2023-03-31'),
+    ('f', '2023-03-01', '2023-03-07'),
+    ('kitchen', '2022-01-01', '2024-12-31'),
+    ('garden', '2024-06-01', None),
+    ('shelter', None, '2022-02-01'),
+)
+
+
+def typed_queries(texts):
+    # 'food bank' -> 'f', 'fo', 'foo', 'food', 'food b', ..., 'food bank'
+    queries = []
+    for text in texts:
+        for end in range(1, len(text) + 1):
+            if text[end - 1] != ' ' and text[:end] not in queries:
+                queries.append(text[:end])
+    return queries
+
+
+def time_search(db_handler, query, start, end, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db_handler.search(query, start=start, end=end)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that search-as-you-type stays within its latency budget.")
+    parser.add_argument('--db', help="search this database instead of a generated one")
+    parser.add_argument('--shifts', type=int, default=DEFAULT_SHIFTS, help="shifts in the generated database (default: %(default)s)")
+    parser.add_argument('--data-dir', help="directory to keep the generated database in between runs")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="times each query runs (default: %(default)s)")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help="slowest median allowed for any query (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='volunteer-search-')
+    try:
+        path = args.db
+        if path is None:
+            path = os.path.join(data_dir, f"synthetic-{args.shifts}-{DEFAULT_SHIFTS_PER_VOLUNTEER}-{DEFAULT_SEED}.db")
+            if not os.path.exists(path):
+                print(f"Building {path} ...")
+                build_database(path + '.building', args.shifts, DEFAULT_SEED, DEFAULT_SHIFTS_PER_VOLUNTEER)
+                os.replace(path + '.building', path)
+        db_handler = DatabaseHandler(path, cache_size=0)
+        try:
+            shifts = db_handler.fetch_one('SELECT COUNT(*) FROM volunteer_hours')[0]
+            print(f"{shifts} shifts, budget {args.budget_ms:g} ms per query (median of {args.repeat})")
+            db_handler.search('warm up')
+            over = []
+            cases = [(query, None, None) for query in typed_queries(TYPED)] + list(DATE_RANGES)
+            for query, start, end in cases:
+                median = time_search(db_handler, query, start, end, args.repeat)
+                within = f" {start or ''}..{end or ''}" if start or end else ''
+                flag = ''
+                if median > args.budget_ms:
+                    over.append(query)
+                    flag = '  OVER BUDGET'
+                print(f"{query + within:36} {median:8.2f} ms{flag}")
+        finally:
+            db_handler.close()
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    if over:
+        print(f"FAIL: {len(over)} quer{'y' if len(over) == 1 else 'ies'} over {args.budget_ms:g} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
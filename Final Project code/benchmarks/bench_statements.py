@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_handler import DatabaseHandler
+from volunteer import Volunteer
+from volunteer_hours import VolunteerHours
+
+# Per-operation latency of the single-row DatabaseHandler calls used by the
+# intake screens: add, update, get (volunteer cache off, so every call goes
+# to sqlite) and log hours. Save a run with --save and compare a later one
+# against it with --compare to see the effect of a change.
+
+OPERATIONS = ('add', 'update', 'get', 'log')
+
+
+def volunteer(number, name='Volunteer'):
+    return Volunteer(f"V{number:06}", f"{name} {number}", f"v{number}@example.org", "555-0100", ['cooking', 'driving'])
+
+
+def run(count):
+    db_path = os.path.join(tempfile.mkdtemp(), 'statements.db')
+    db_handler = DatabaseHandler(db_path, cache_size=0)
+    calls = {
+        'add': lambda n: db_handler.add_volunteer(volunteer(n)),
+        'update': lambda n: db_handler.update_volunteer(volunteer(n, 'Renamed')),
+        'get': lambda n: db_handler.get_volunteer_by_id(f"V{n:06}"),
+        'log': lambda n: db_handler.add_volunteer_hours(f"V{n:06}", VolunteerHours('2024-05-01', 2.5, 'Food bank')),
+    }
+    results = {}
+    try:
+        for operation in OPERATIONS:
+            timings = []
+            for n in range(count):
+                started = time.perf_counter()
+                calls[operation](n)
+                timings.append(time.perf_counter() - started)
+            results[operation] = {
+                'mean_us': statistics.fmean(timings) * 1e6,
+                'median_us': statistics.median(timings) * 1e6,
+                'p95_us': statistics.quantiles(timings, n=20)[-1] * 1e6,
+            }
+    finally:
+        db_handler.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure per-operation latency of DatabaseHandler calls.")
+    parser.add_argument('--count', type=int, default=2000, help="calls per operation")
+    parser.add_argument('--save', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON file from an earlier --save to compare against")
+    args = parser.parse_args(argv)
+
+    results = run(args.count)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    for operation in OPERATIONS:
+        line = (f"{operation:7} median {results[operation]['median_us']:8.1f} us  "
+                f"mean {results[operation]['mean_us']:8.1f} us  p95 {results[operation]['p95_us']:8.1f} us")
+        if baseline and operation in baseline:
+            before = baseline[operation]['median_us']
+            line += f"  (median was {before:.1f} us, {results[operation]['median_us'] / before - 1:+.0%})"
+        print(line)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_handler import DatabaseHandler
+from volunteer import Volunteer
+from volunteer_hours import VolunteerHours
+from synthetic_data import generate_volunteers, populate, DEFAULT_SEED, DEFAULT_SHIFTS_PER_VOLUNTEER
+
+# Times the main DatabaseHandler calls against synthetic databases of
+# several sizes (SCALES counts shifts; there are shifts-per-volunteer times
+# fewer volunteers). Every scale runs on a fresh copy of a database built by
+# synthetic_data.py with a fixed seed, so two runs differ only in the code.
+# Results are written as JSON with --output; --compare reads an earlier file
+# and reports every median that got slower by more than --threshold, exiting
+# with status 1 if there is one.
+
+SCALES = (10000, 100000, 1000000)
+# Single-row calls are timed `count` times each, whole-table calls `repeat`
+# times each. The volunteer cache is off so every lookup reaches sqlite.
+CALLS = ('get_volunteer_by_id', 'add_volunteer', 'add_volunteer_hours')
+WHOLE_TABLE_CALLS = ('get_all_volunteers', 'generate_hours_report', 'generate_volunteer_summary')
+# add_volunteers_bulk adds --bulk-rows new volunteers in one call; its
+# rows_per_s is what the bulk import of volunteers sustains.
+OPERATIONS = ('bulk_load',) + WHOLE_TABLE_CALLS + CALLS + ('add_volunteers_bulk',)
+DEFAULT_BULK_ROWS = 50000
+DEFAULT_THRESHOLD = 0.2
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    p95 = statistics.quantiles(ordered, n=20)[-1] if len(ordered) >= 20 else ordered[-1]
+    return {'calls': len(ordered), 'median_us': statistics.median(ordered) * 1e6,
+            'mean_us': statistics.fmean(ordered) * 1e6, 'p95_us': p95 * 1e6}
+
+
+def time_calls(call, arguments):
+    timings = []
+    for argument in arguments:
+        started = time.perf_counter()
+        call(argument)
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def build_database(path, rows, seed, shifts_per_volunteer):
+    # Returns how long the bulk load took.
+    started = time.perf_counter()
+    db_handler = DatabaseHandler(path, profile='bulk')
+    try:
+        populate(db_handler, max(rows // shifts_per_volunteer, 1), seed, shifts_per_volunteer)
+    finally:
+        db_handler.close()
+    return time.perf_counter() - started
+
+
+def time_bulk_volunteers(db_handler, rows, seed):
+    # New ids, so none of them collide with the generated volunteers.
+    volunteers = [Volunteer(f"N{number:07}", v.name, v.email, v.contact_info, v.skills)
+                  for number, v in enumerate(generate_volunteers(rows, seed + 1), 1)]
+    started = time.perf_counter()
+    db_handler.add_volunteers_bulk(volunteers)
+    elapsed = time.perf_counter() - started
+    return dict(summarize([elapsed]), rows=rows, rows_per_s=rows / elapsed)
+
+
+def run_scale(data_dir, rows, seed, shifts_per_volunteer, count, repeat, bulk_rows=DEFAULT_BULK_ROWS):
+    # Databases in data_dir are reused between runs; the timed calls always
+    # work on a copy, because they add rows.
+    source = os.path.join(data_dir, f"synthetic-{rows}-{shifts_per_volunteer}-{seed}.db")
+    results = {}
+    if not os.path.exists(source):
+        building = source + '.building'
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(building + suffix):
+                os.remove(building + suffix)
+        load_time = build_database(building, rows, seed, shifts_per_volunteer)
+        os.replace(building, source)
+        results['bulk_load'] = summarize([load_time])
+    scratch = os.path.join(data_dir, 'scratch.db')
+    shutil.copyfile(source, scratch)
+
+    volunteers = max(rows // shifts_per_volunteer, 1)
+    rng = random.Random(seed)
+    existing = [f"V{rng.randrange(volunteers) + 1:07}" for _ in range(count)]
+    db_handler = DatabaseHandler(scratch, cache_size=0)
+    try:
+        for name in WHOLE_TABLE_CALLS:
+            results[name] = time_calls(lambda _: getattr(db_handler, name)(), range(repeat))
+        results['get_volunteer_by_id'] = time_calls(db_handler.get_volunteer_by_id, existing)
+        results['add_volunteer'] = time_calls(
+            lambda n: db_handler.add_volunteer(Volunteer(f"B{n:07}", f"Bench {n}", f"bench{n}@example.org",
+                                                         "555-0100", ['driving', 'cooking'])),
+            range(count))
+        results['add_volunteer_hours'] = time_calls(
+            lambda volunteer_id: db_handler.add_volunteer_hours(volunteer_id, VolunteerHours('2025-01-15', 2.0, 'bench shift')),
+            existing)
+        results['add_volunteers_bulk'] = time_bulk_volunteers(db_handler, bulk_rows, seed)
+    finally:
+        db_handler.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(scratch + suffix):
+                os.remove(scratch + suffix)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    # Prints one line per operation timed in both runs; returns the
+    # regressions.
+    regressions = []
+    for scale, operations in results.items():
+        for name, stats in operations.items():
+            before = baseline.get(scale, {}).get(name)
+            if not before:
+                continue
+            change = stats['median_us'] / before['median_us'] - 1
+            flag = ''
+            if change > threshold:
+                regressions.append((scale, name, change))
+                flag = '  REGRESSION'
+            print(f"{scale:>8} {name:28} {before['median_us']:12.1f} -> {stats['median_us']:12.1f} us  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseHandler on synthetic data at several scales.")
+    parser.add_argument('--scales', default=','.join(map(str, SCALES)),
+                        help=f"comma-separated numbers of shifts (default: {','.join(map(str, SCALES))})")
+    parser.add_argument('--shifts-per-volunteer', type=int, default=DEFAULT_SHIFTS_PER_VOLUNTEER)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--count', type=int, default=500, help="timed calls per single-row operation")
+    parser.add_argument('--repeat', type=int, default=5, help="timed calls per whole-table operation")
+    parser.add_argument('--bulk-rows', type=int, default=DEFAULT_BULK_ROWS,
+                        help="volunteers added by the timed add_volunteers_bulk call (default: %(default)s)")
+    parser.add_argument('--data-dir', help="keep the generated databases here and reuse them in later runs")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON file from an earlier --output to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown of a median that counts as a regression (default: 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    scales = [int(scale) for scale in args.scales.split(',')]
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='volunteer-bench-')
+    os.makedirs(data_dir, exist_ok=True)
+    results = {}
+    try:
+        for rows in scales:
+            started = time.perf_counter()
+            results[str(rows)] = run_scale(data_dir, rows, args.seed, args.shifts_per_volunteer, args.count, args.repeat,
+                                           args.bulk_rows)
+            for name in OPERATIONS:
+                stats = results[str(rows)].get(name)
+                if stats:
+                    rate = f"  {stats['rows_per_s']:10,.0f} rows/s" if 'rows_per_s' in stats else ''
+                    print(f"{rows:>8} {name:28} median {stats['median_us']:12.1f} us  p95 {stats['p95_us']:12.1f} us{rate}")
+            print(f"{rows:>8} finished in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'seed': args.seed,
+            'shifts_per_volunteer': args.shifts_per_volunteer,
+            'count': args.count,
+            'repeat': args.repeat,
+            'bulk_rows': args.bulk_rows,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {baseline['meta'].get('revision')} ({baseline['meta'].get('timestamp')}):")
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} median(s) slower by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+# Load test for api_server.py: many concurrent keep-alive clients send a mix
+# of volunteer lookups, searches and hours logging for a fixed time, and the
+# sustained requests/s, latency percentiles and status counts are printed.
+# Point it at a running server with --host/--port, or give --db to start
+# one on a free port for the length of the run (use a copy of a database:
+# the writes are real). With --pipeline N every client keeps N requests in
+# flight on its connection instead of waiting for each response.
+
+DEFAULT_CLIENTS = 64
+DEFAULT_DURATION = 10.0
+DEFAULT_WRITES = 0.1
+DEFAULT_SEARCHES = 0.1
+SEARCH_WORDS = ('food', 'shelter', 'kitchen', 'tutoring', 'cleanup', 'delivery', 'clinic', 'garden')
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api_server.py')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def encode_request(method, path, body=None):
+    head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+    if body is None:
+        return (head + "\r\n").encode()
+    data = json.dumps(body).encode()
+    return (head + f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n").encode() + data
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length) if length else b''
+    return status, body
+
+
+async def request(host, port, method, path, body=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(encode_request(method, path, body))
+        return await read_response(reader)
+    finally:
+        writer.close()
+
+
+class Workload:
+    # Picks the next request: a lookup of a random known volunteer, a search
+    # for a common word, or a shift logged for a random volunteer.
+    def __init__(self, volunteer_ids, writes, searches, seed):
+        self.volunteer_ids = volunteer_ids
+        self.writes = writes
+        self.searches = searches
+        self.rng = random.Random(seed)
+
+    def next(self):
+        roll = self.rng.random()
+        volunteer_id = self.rng.choice(self.volunteer_ids)
+        if roll < self.writes:
+            return 'log_hours', encode_request('POST', f'/volunteers/{volunteer_id}/hours', {
+                'date': f"2025-{self.rng.randint(1, 12):02}-{self.rng.randint(1, 28):02}",
+                'hours_worked': self.rng.choice((1.0, 2.0, 3.5)), 'description': 'load test shift'})
+        if roll < self.writes + self.searches:
+            return 'search', encode_request('GET', f'/search?q={self.rng.choice(SEARCH_WORDS)}&limit=10')
+        return 'get_volunteer', encode_request('GET', f'/volunteers/{volunteer_id}')
+
+
+async def client(host, port, workload, deadline, pipeline, results):
+    # Keeps `pipeline` requests in flight on one connection until the
+    # deadline; latencies are from sending a request to reading its response.
+    reader, writer = await asyncio.open_connection(host, port)
+    in_flight = []
+    try:
+        while time.perf_counter() < deadline or in_flight:
+            while len(in_flight) < pipeline and time.perf_counter() < deadline:
+                kind, data = workload.next()
+                writer.write(data)
+                in_flight.append((kind, time.perf_counter()))
+            await writer.drain()
+            status, _ = await read_response(reader)
+            kind, sent = in_flight.pop(0)
+            results['latencies'][kind].append(time.perf_counter() - sent)
+            results['statuses'][status] += 1
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        results['errors'][type(e).__name__] += 1
+    finally:
+        writer.close()
+
+
+def percentiles(latencies):
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100) if len(ordered) >= 100 else [ordered[-1]] * 99
+    return {'count': len(ordered), 'mean_ms': statistics.fmean(ordered) * 1000, 'p50_ms': statistics.median(ordered) * 1000,
+            'p95_ms': cuts[94] * 1000, 'p99_ms': cuts[98] * 1000, 'max_ms': ordered[-1] * 1000}
+
+
+async def run(host, port, clients, duration, pipeline, writes, searches, seed):
+    status, body = await request(host, port, 'GET', '/volunteers?limit=1000')
+    if status != 200:
+        raise SystemExit(f"GET /volunteers failed with {status}: {body.decode(errors='replace')}")
+    volunteer_ids = [volunteer['id'] for volunteer in json.loads(body)['items']]
+    if not volunteer_ids:
+        raise SystemExit("The database has no volunteers to ask for")
+
+    results = {'latencies': {'get_volunteer': [], 'search': [], 'log_hours': []},
+               'statuses': Counter(), 'errors': Counter()}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client(host, port, Workload(volunteer_ids, writes, searches, f"{seed}-{number}"),
+                                  deadline, pipeline, results)
+                           for number in range(clients)))
+    elapsed = time.perf_counter() - started
+    every = [latency for latencies in results['latencies'].values() for latency in latencies]
+    return {
+        'clients': clients,
+        'pipeline': pipeline,
+        'duration_s': elapsed,
+        'requests': len(every),
+        'requests_per_s': len(every) / elapsed,
+        'statuses': {str(status): count for status, count in sorted(results['statuses'].items())},
+        'errors': dict(results['errors']),
+        'latency': percentiles(every) if every else None,
+        'by_request': {kind: percentiles(latencies) for kind, latencies in results['latencies'].items() if latencies},
+    }
+
+
+def start_server(db, port, workers):
+    server = subprocess.Popen([sys.executable, SERVER, '--db', os.path.abspath(db), '--port', str(port),
+                               '--workers', str(workers)])
+    for _ in range(100):
+        try:
+            if asyncio.run(request('127.0.0.1', port, 'GET', '/health'))[0] == 200:
+                return server
+        except OSError:
+            pass
+        if server.poll() is not None:
+            raise SystemExit(f"api_server.py exited with status {server.returncode}")
+        time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("api_server.py did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the volunteer HTTP API with concurrent keep-alive clients.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--db', help="start api_server.py on this database (and a free port) for the run")
+    parser.add_argument('--workers', type=int, default=4, help="with --db, the server's database threads")
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS, help=f"concurrent connections (default: {DEFAULT_CLIENTS})")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="seconds to run (default: %(default)s)")
+    parser.add_argument('--pipeline', type=int, default=1, help="requests in flight per connection (default: 1)")
+    parser.add_argument('--writes', type=float, default=DEFAULT_WRITES, help="share of requests that log hours (default: %(default)s)")
+    parser.add_argument('--searches', type=float, default=DEFAULT_SEARCHES, help="share of requests that search (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    server = None
+    host, port = args.host, args.port
+    if args.db:
+        host, port = '127.0.0.1', free_port()
+        server = start_server(args.db, port, args.workers)
+    try:
+        report = asyncio.run(run(host, port, args.clients, args.duration, args.pipeline, args.writes, args.searches, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{report['requests']} requests from {args.clients} clients (pipeline {args.pipeline}) "
+          f"in {report['duration_s']:.1f} s: {report['requests_per_s']:.0f} requests/s")
+    print(f"statuses {report['statuses']}" + (f", errors {report['errors']}" if report['errors'] else ''))
+    for kind, stats in [('all', report['latency'])] + list(report['by_request'].items()):
+        if stats:
+            print(f"{kind:14} {stats['count']:>8}  p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  "
+                  f"p99 {stats['p99_ms']:7.2f} ms  max {stats['max_ms']:7.2f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import git_revision
+
+# Cold-start time of the app: every run is a fresh interpreter, so module
+# imports, the first Tk frame and the first database call are all paid again.
+# Each run reports
+#   process_ms     the whole child process, interpreter start to exit
+#   import_ms      importing main.py and everything it pulls in
+#   first_frame_ms building VolunteerApp until the main menu is drawn
+#                  (needs a display; left out when Tk cannot open one)
+#   open_db_ms     DatabaseHandler() on an existing, up-to-date database
+#   first_query_ms the first get_volunteer_by_id() after that
+# The database is a copy of one built by synthetic_data.py, or of --db, opened
+# once beforehand so every timed run finds its schema current.
+# The script exits with status 1 when
+#   - importing main.py pulled in one of DEFERRED_MODULES, which the app only
+#     imports on its database worker thread once the first frame is up;
+#   - a median is over its budget in BUDGETS_MS (change one with
+#     --budget PHASE=MS, or drop it with PHASE=0);
+#   - like bench_suite.py, with --compare, a median got slower than in an
+#     earlier --output run by more than --threshold.
+
+DEFAULT_RUNS = 15
+DEFAULT_VOLUNTEERS = 10000
+DEFAULT_THRESHOLD = 0.2
+PHASES = ('process_ms', 'import_ms', 'first_frame_ms', 'open_db_ms', 'first_query_ms')
+# Loose enough for a slow laptop; the app takes a fraction of each.
+BUDGETS_MS = {'import_ms': 150, 'first_frame_ms': 1000, 'open_db_ms': 50, 'first_query_ms': 20}
+DEFERRED_MODULES = ('sqlite3', 'database_handler', 'migrations', 'db_worker')
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child. Times are from just after the interpreter started.
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {code_dir!r})
+timings = {{}}
+import main
+timings['import_ms'] = (time.perf_counter() - started) * 1000
+timings['eager_modules'] = [name for name in {deferred!r} if name in sys.modules]
+import tkinter as tk
+from volunteer_app import VolunteerApp
+try:
+    root = tk.Tk()
+except tk.TclError:
+    root = None
+if root is not None:
+    building = time.perf_counter()
+    app = VolunteerApp(root, db_file={db!r})
+    root.update()
+    timings['first_frame_ms'] = (time.perf_counter() - building) * 1000
+    app.exit_app()
+    root.destroy()
+from database_handler import DatabaseHandler
+opening = time.perf_counter()
+db_handler = DatabaseHandler({db!r}, cache_size=0)
+timings['open_db_ms'] = (time.perf_counter() - opening) * 1000
+querying = time.perf_counter()
+db_handler.get_volunteer_by_id('V0000001')
+timings['first_query_ms'] = (time.perf_counter() - querying) * 1000
+db_handler.close()
+print(json.dumps(timings))
+'''
+
+
+def cold_start(db):
+    started = time.perf_counter()
+    child = subprocess.run([sys.executable, '-c', CHILD.format(code_dir=CODE_DIR, db=db, deferred=DEFERRED_MODULES)],
+                           capture_output=True, text=True, check=True)
+    timings = json.loads(child.stdout.splitlines()[-1])
+    timings['process_ms'] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def summarize(runs):
+    summary = {}
+    for phase in PHASES:
+        timings = sorted(run[phase] for run in runs if phase in run)
+        if timings:
+            summary[phase] = {'runs': len(timings), 'median_ms': statistics.median(timings),
+                              'min_ms': timings[0], 'max_ms': timings[-1]}
+    return summary
+
+
+def prepare_database(data_dir, source, volunteers):
+    path = os.path.join(data_dir, 'startup.db')
+    if source:
+        shutil.copyfile(source, path)
+    else:
+        from database_handler import DatabaseHandler
+        from synthetic_data import populate
+        db_handler = DatabaseHandler(path, profile='bulk')
+        try:
+            populate(db_handler, volunteers)
+        finally:
+            db_handler.close()
+    # Brings the copy up to date, so the timed runs never migrate.
+    from database_handler import DatabaseHandler
+    DatabaseHandler(path).close()
+    return path
+
+
+def parse_budget(text):
+    phase, _, limit = text.partition('=')
+    if phase not in PHASES:
+        raise argparse.ArgumentTypeError(f"unknown phase {phase!r}; choose from {', '.join(PHASES)}")
+    try:
+        return phase, float(limit)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"budget must look like PHASE=MS, not {text!r}")
+
+
+def over_budget(summary, budgets):
+    over = []
+    for phase, limit in budgets.items():
+        stats = summary.get(phase)
+        if limit and stats and stats['median_ms'] > limit:
+            over.append(phase)
+            print(f"{phase:16} median {stats['median_ms']:9.2f} ms  over its budget of {limit:g} ms")
+    return over
+
+
+def compare(summary, baseline, threshold):
+    regressions = []
+    for phase, stats in summary.items():
+        before = baseline.get(phase)
+        if not before:
+            continue
+        change = stats['median_ms'] / before['median_ms'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append((phase, change))
+            flag = '  REGRESSION'
+        print(f"{phase:16} {before['median_ms']:9.2f} -> {stats['median_ms']:9.2f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time cold starts of the volunteer app in fresh interpreters.")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help="cold starts to time (default: %(default)s)")
+    parser.add_argument('--db', help="copy this database instead of generating one")
+    parser.add_argument('--volunteers', type=int, default=DEFAULT_VOLUNTEERS,
+                        help="volunteers in the generated database (default: %(default)s)")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON file from an earlier --output to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown of a median that counts as a regression (default: 0.2 = 20%%)")
+    parser.add_argument('--budget', type=parse_budget, action='append', default=[], metavar='PHASE=MS',
+                        help="fail when PHASE's median is over MS; 0 drops the budget (repeatable)")
+    args = parser.parse_args(argv)
+    budgets = dict(BUDGETS_MS, **dict(args.budget))
+
+    data_dir = tempfile.mkdtemp(prefix='volunteer-startup-')
+    try:
+        db = prepare_database(data_dir, args.db and os.path.abspath(args.db), args.volunteers)
+        cold_start(db)
+        runs = [cold_start(db) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    summary = summarize(runs)
+    for phase in PHASES:
+        stats = summary.get(phase)
+        if stats:
+            print(f"{phase:16} median {stats['median_ms']:9.2f} ms  min {stats['min_ms']:9.2f} ms  max {stats['max_ms']:9.2f} ms")
+        else:
+            print(f"{phase:16} not measured (no display)")
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'runs': args.runs,
+            'volunteers': None if args.db else args.volunteers,
+        },
+        'results': summary,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    status = 0
+    eager = sorted({name for run in runs for name in run['eager_modules']})
+    if eager:
+        print(f"\nImporting main.py also imported {', '.join(eager)}")
+        status = 1
+    if over_budget(summary, budgets):
+        status = 1
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {baseline['meta'].get('revision')} ({baseline['meta'].get('timestamp')}):")
+        regressions = compare(summary, baseline['results'], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} median(s) slower by more than {args.threshold:.0%}")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_handler import DatabaseHandler
+from volunteer import Volunteer
+from volunteer_hours import VolunteerHours
+
+# Seeded generator of synthetic volunteers and shifts. The same seed and
+# settings always produce the same rows, so benchmark databases built on
+# different machines or commits hold identical data. Skills are drawn with
+# Zipf-like weights: the first skill in SKILLS is the most common.
+
+FIRST_NAMES = ['Ann', 'Ben', 'Chloe', 'Dev', 'Eve', 'Farah', 'Gus', 'Hana', 'Ivan', 'Jo', 'Kai', 'Lena',
+               'Malik', 'Nia', 'Omar', 'Pia', 'Quinn', 'Rosa', 'Sam', 'Tariq', 'Uma', 'Vic', 'Wen', 'Yusuf']
+LAST_NAMES = ['Smith', 'Garcia', 'Nguyen', 'Okafor', 'Kowalski', 'Haddad', 'Larsen', 'Tanaka', 'Silva',
+              'Murphy', 'Rossi', 'Novak', 'Patel', 'Cohen', 'Dubois', 'Moreau']
+SKILLS = ['driving', 'cooking', 'first aid', 'tutoring', 'lifting', 'sorting', 'translation', 'carpentry',
+          'fundraising', 'photography', 'web design', 'accounting', 'sign language', 'nursing', 'plumbing',
+          'electrical', 'gardening', 'childcare', 'music', 'counselling']
+ACTIVITIES = ['food bank', 'shelter', 'kitchen', 'tutoring', 'cleanup', 'warehouse', 'event setup', 'delivery',
+              'reception', 'fundraiser', 'clinic', 'garden']
+SHIFT_LENGTHS = (1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 6.0, 8.0)
+
+DEFAULT_SEED = 2024
+DEFAULT_SHIFTS_PER_VOLUNTEER = 10
+DEFAULT_SKILLS_PER_VOLUNTEER = 2
+DEFAULT_SKILL_SKEW = 1.0
+DEFAULT_START = date(2022, 1, 1)
+DEFAULT_DAYS = 3 * 365
+
+
+def skill_weights(skew, skills=SKILLS):
+    # Zipf weights 1/rank**skew; skew 0 makes every skill equally likely.
+    return [1 / rank ** skew for rank in range(1, len(skills) + 1)]
+
+
+def generate_volunteers(count, seed=DEFAULT_SEED, skills_per_volunteer=DEFAULT_SKILLS_PER_VOLUNTEER,
+                        skill_skew=DEFAULT_SKILL_SKEW):
+    # Ids are V0000001, V0000002, ... Each volunteer gets between 0 and
+    # 2 * skills_per_volunteer skills.
+    rng = random.Random(f"{seed}-volunteers")
+    weights = skill_weights(skill_skew)
+    for number in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        wanted = rng.randint(0, 2 * skills_per_volunteer)
+        skills = list(dict.fromkeys(rng.choices(SKILLS, weights, k=wanted)))
+        yield Volunteer(f"V{number:07}", f"{first} {last}", f"{first.lower()}.{last.lower()}{number}@example.org",
+                        f"555-{number % 10000:04}", skills)
+
+
+def generate_shifts(volunteer_count, seed=DEFAULT_SEED, shifts_per_volunteer=DEFAULT_SHIFTS_PER_VOLUNTEER,
+                    start=DEFAULT_START, days=DEFAULT_DAYS):
+    # (volunteer_id, VolunteerHours) pairs, volunteer_count * shifts_per_volunteer
+    # of them, in date order like a real log. Every volunteer has a
+    # Pareto-distributed activity level, so a few regulars log many shifts
+    # and some volunteers none.
+    rng = random.Random(f"{seed}-shifts")
+    total = volunteer_count * shifts_per_volunteer
+    activity = list(accumulate(rng.paretovariate(1.5) for _ in range(volunteer_count)))
+    picks = rng.choices(range(volunteer_count), cum_weights=activity, k=total)
+    dates = [(start + timedelta(days=day)).isoformat() for day in range(days)]
+    descriptions = [f"{a} {b}" for a in ACTIVITIES for b in ACTIVITIES if a != b]
+    for day, volunteer in zip(sorted(rng.randrange(days) for _ in range(total)), picks):
+        yield f"V{volunteer + 1:07}", VolunteerHours(dates[day], rng.choice(SHIFT_LENGTHS), rng.choice(descriptions))
+
+
+def populate(db_handler, volunteers, seed=DEFAULT_SEED, shifts_per_volunteer=DEFAULT_SHIFTS_PER_VOLUNTEER,
+             skills_per_volunteer=DEFAULT_SKILLS_PER_VOLUNTEER, skill_skew=DEFAULT_SKILL_SKEW,
+             start=DEFAULT_START, days=DEFAULT_DAYS):
+    # Bulk-loads a generated data set; returns (volunteers, shifts) inserted.
+    added = db_handler.add_volunteers_bulk(generate_volunteers(volunteers, seed, skills_per_volunteer, skill_skew))
+    logged = db_handler.add_volunteer_hours_bulk(generate_shifts(volunteers, seed, shifts_per_volunteer, start, days))
+    return added.inserted, logged.inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a database full of seeded synthetic volunteers and shifts.")
+    parser.add_argument('db', help="database file to create (must not exist)")
+    parser.add_argument('--volunteers', type=int, default=10000)
+    parser.add_argument('--shifts-per-volunteer', type=int, default=DEFAULT_SHIFTS_PER_VOLUNTEER)
+    parser.add_argument('--skills-per-volunteer', type=int, default=DEFAULT_SKILLS_PER_VOLUNTEER,
+                        help="average number of skills per volunteer")
+    parser.add_argument('--skill-skew', type=float, default=DEFAULT_SKILL_SKEW,
+                        help="Zipf exponent of the skill distribution (0 = uniform)")
+    parser.add_argument('--start', type=date.fromisoformat, default=DEFAULT_START, help="first shift date (YYYY-MM-DD)")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help="number of days shifts are spread over")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args = parser.parse_args(argv)
+    if os.path.exists(args.db):
+        print(f"{args.db} already exists")
+        return 1
+
+    started = time.perf_counter()
+    db_handler = DatabaseHandler(os.path.abspath(args.db), profile='bulk')
+    try:
+        volunteers, shifts = populate(db_handler, args.volunteers, args.seed, args.shifts_per_volunteer,
+                                      args.skills_per_volunteer, args.skill_skew, args.start, args.days)
+    finally:
+        db_handler.close()
+    print(f"{volunteers} volunteers and {shifts} shifts written in {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import functools
+import sqlite3
+import threading
+import time
+
+from statements import STATEMENT_CACHE_SIZE
+
+# PRAGMA sets applied to every new connection. With WAL, synchronous=NORMAL
+# cannot corrupt the file; at worst the last transactions before a power cut
+# are lost. 'safe' syncs every commit, 'bulk' trades memory for import speed
+# and lets the WAL grow to about 40 MB between checkpoints, so index pages
+# that every chunk of an import rewrites are copied back to the file less
+# often. A negative cache_size is in KiB.
+PRAGMA_PROFILES = {
+    'default': {'synchronous': 'NORMAL', 'cache_size': -20000, 'mmap_size': 268435456, 'temp_store': 'MEMORY'},
+    'safe': {'synchronous': 'FULL', 'cache_size': -20000, 'mmap_size': 0, 'temp_store': 'DEFAULT'},
+    'bulk': {'synchronous': 'NORMAL', 'cache_size': -200000, 'mmap_size': 1073741824, 'temp_store': 'MEMORY',
+             'wal_autocheckpoint': 10000},
+}
+
+BUSY_TIMEOUT = 5.0
+BUSY_RETRIES = 3
+RETRY_DELAY = 0.05
+
+
+def is_busy(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class ConnectionPool:
+    # One connection per thread to the same database file, all in WAL mode so
+    # readers and a writer do not block each other. A thread's connection is
+    # created the first time that thread asks for it and must only be used by
+    # that thread. profile is a PRAGMA_PROFILES name or a dict of PRAGMAs to
+    # apply on top of the default profile.
+    def __init__(self, db_path, profile='default', timeout=BUSY_TIMEOUT, retries=BUSY_RETRIES, retry_delay=RETRY_DELAY):
+        self.db_path = db_path
+        self.pragmas = dict(PRAGMA_PROFILES['default'])
+        self.pragmas.update(PRAGMA_PROFILES[profile] if isinstance(profile, str) else profile)
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.connect()
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def connect(self):
+        # check_same_thread is off only so close_all() can close connections
+        # opened by other threads; each is still used by one thread.
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def run(self, fn, *args, **kwargs):
+        # Calls fn, and if the database stays locked past the busy timeout (or
+        # sqlite gives up at once, e.g. when a read transaction cannot be
+        # upgraded to a write), rolls back and tries again with a growing
+        # delay. Any other error rolls back too: a failed statement leaves its
+        # transaction open, and with it the write lock every other thread's
+        # connection is waiting for.
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                self.connection().rollback()
+                if not is_busy(e) or attempt == self.retries:
+                    raise
+                time.sleep(self.retry_delay * 2 ** attempt)
+            except Exception:
+                self.connection().rollback()
+                raise
+
+    def close(self):
+        # Closes the calling thread's connection.
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+            with self.lock:
+                self.connections.remove(conn)
+
+    def close_all(self):
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            conn.close()
+        self.local = threading.local()
+
+
+def retry_on_busy(method):
+    # For DatabaseHandler methods that write and commit: the whole method is
+    # re-run if the database is busy, so it must not have side effects
+    # outside its own transaction.
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.pool.run(method, self, *args, **kwargs)
+    return wrapper
@@ -1,106 +1,1052 @@
 import sqlite3
+import json
 import os
-from volunteer import Volunteer
-from volunteer_hours import VolunteerHours
+import re
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import count, islice
+from volunteer import Volunteer, clean_skills
+from volunteer_cache import VolunteerCache
+from hours_log import HoursHistory, date_ordinal, NO_ORDINAL
+from connection_pool import ConnectionPool, retry_on_busy
+from statements import canonical, register
+from sync import Change, HybridClock, SyncResult
+from migrations import (migrate, rebuild_rollups, rebuild_search_index, insert_volunteer_skills, ROLLUP_MONTH,
+                        DAY_TEXT, TEXT_DAY, BAD_DATE)
+
+BulkResult = namedtuple('BulkResult', ['inserted', 'failures'])
+RollupMismatch = namedtuple('RollupMismatch', ['table', 'volunteer_id', 'month', 'expected_hours', 'expected_shifts',
+                                               'actual_hours', 'actual_shifts'])
+
+# Errors caused by the contents of a single row (ValueError: a date that
+# does not parse); anything else (disk full, locked database, ...) aborts
+# the whole bulk insert.
+ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError, ValueError)
+
+HoursTotal = namedtuple('HoursTotal', ['volunteer_id', 'name', 'total_hours', 'shift_count'])
+SkillHours = namedtuple('SkillHours', ['skill', 'volunteers', 'total_hours', 'shift_count'])
+SearchHit = namedtuple('SearchHit', ['kind', 'volunteer_id', 'name', 'date', 'text', 'rank'])
+Shift = namedtuple('Shift', ['id', 'volunteer_id', 'date', 'hours_worked', 'description'])
+MonthTotal = namedtuple('MonthTotal', ['month', 'total_hours', 'shift_count'])
+QuarantinedShift = namedtuple('QuarantinedShift', ['id', 'volunteer_id', 'date', 'hours_worked', 'description',
+                                                   'reason', 'quarantined_at'])
+
+DEFAULT_CHUNK_SIZE = 50000
+# FTS5's own automerge setting, and the pages of index a bulk load's closing
+# merge may write.
+FTS_AUTOMERGE = 4
+FTS_MERGE_PAGES = 2000
+REPORT_BATCH_SIZE = 1000
+REPORT_PAGE_SIZE = 200
+HISTORY_PAGE_SIZE = 100
+# Full-text matches are ranked among only this many most recent candidates
+# per index: a common word matches a large part of the hours log, and
+# ranking all of it would make search-as-you-type lag. Older shifts are
+# found by narrowing the words or the date range.
+SEARCH_CANDIDATES = 500
+SEARCH_WORD = re.compile(r'\w+')
+# Volunteers kept by get_volunteer_by_id; 0 disables the cache.
+VOLUNTEER_CACHE_SIZE = 1024
+
+# Comma-joined skills of volunteer `{volunteer}` in the order they were given.
+SKILLS_SQL = '''(
+    SELECT group_concat(name, ',') FROM (
+        SELECT s.name FROM volunteer_skills vs JOIN skills s ON s.id = vs.skill_id
+        WHERE vs.volunteer_id = {volunteer} ORDER BY vs.position
+    )
+)'''
+VOLUNTEER_COLUMNS = f"v.id, v.name, v.email, v.contact_info, {SKILLS_SQL.format(volunteer='v.id')} AS skills"
+
+INSERT_VOLUNTEER = register('insert_volunteer', '''
+    INSERT INTO volunteers (id, name, email, contact_info)
+    VALUES (?, ?, ?, ?)
+''')
+UPDATE_VOLUNTEER = register('update_volunteer', '''
+    UPDATE volunteers
+    SET name=?, email=?, contact_info=?
+    WHERE id=?
+''')
+DELETE_VOLUNTEER_SKILLS = register('delete_volunteer_skills', 'DELETE FROM volunteer_skills WHERE volunteer_id=?')
+DELETE_VOLUNTEER = register('delete_volunteer', 'DELETE FROM volunteers WHERE id=?')
+INSERT_HOURS = register('insert_hours', '''
+    INSERT INTO volunteer_hours (volunteer_id, day, hours_worked, description, sync_hlc, sync_site)
+    VALUES (?, ?, ?, ?, ?, ?)
+''')
+SELECT_VOLUNTEER = register('select_volunteer', f'SELECT {VOLUNTEER_COLUMNS} FROM volunteers v WHERE v.id=?')
+SELECT_ALL_VOLUNTEERS = register('select_all_volunteers', f'SELECT {VOLUNTEER_COLUMNS} FROM volunteers v')
+SELECT_VOLUNTEER_KEYS = register('select_volunteer_keys', 'SELECT id, name, email FROM volunteers')
+BEGIN_DEFERRED_ROLLUPS = register('begin_deferred_rollups', 'INSERT INTO rollup_deferred (active) VALUES (1)')
+END_DEFERRED_ROLLUPS = register('end_deferred_rollups', 'DELETE FROM rollup_deferred')
+SELECT_DEFERRED_ROLLUPS = register('select_deferred_rollups', 'SELECT 1 FROM rollup_deferred LIMIT 1')
+INDEX_NEW_VOLUNTEERS = register('index_new_volunteers', '''
+    INSERT INTO volunteers_fts (rowid, name, email, contact_info)
+    SELECT rowid, name, email, contact_info FROM volunteers WHERE rowid > ?
+''')
+ADD_NEW_VOLUNTEER_TOTALS = register('add_new_volunteer_totals', '''
+    INSERT OR IGNORE INTO volunteer_hours_totals (volunteer_id, total_hours, shift_count)
+    SELECT id, 0, 0 FROM volunteers WHERE rowid > ?
+''')
+INDEX_NEW_HOURS = register('index_new_hours', '''
+    INSERT INTO volunteer_hours_fts (rowid, description)
+    SELECT id, description FROM volunteer_hours WHERE id > ?
+''')
+# A bulk chunk of shifts, and what it adds to each volunteer's months, are
+# staged in temporary tables and then moved with one statement each. Every
+# statement on a table with triggers or foreign keys opens a statement
+# journal, so one INSERT ... SELECT per chunk costs far less than one INSERT
+# per row.
+CREATE_STAGED_VOLUNTEERS = register('create_staged_volunteers', '''
+    CREATE TEMP TABLE IF NOT EXISTS staged_volunteers (id TEXT, name TEXT, email TEXT, contact_info TEXT)
+''')
+STAGE_VOLUNTEER = register('stage_volunteer', 'INSERT INTO staged_volunteers VALUES (?, ?, ?, ?)')
+INSERT_STAGED_VOLUNTEERS = register('insert_staged_volunteers', '''
+    INSERT INTO volunteers (id, name, email, contact_info)
+    SELECT id, name, email, contact_info FROM staged_volunteers ORDER BY rowid
+''')
+CLEAR_STAGED_VOLUNTEERS = register('clear_staged_volunteers', 'DELETE FROM staged_volunteers')
+CREATE_STAGED_HOURS = register('create_staged_hours', '''
+    CREATE TEMP TABLE IF NOT EXISTS staged_hours (
+        volunteer_id TEXT, day INTEGER, hours_worked REAL, description TEXT, sync_hlc INTEGER, sync_site TEXT
+    )
+''')
+STAGE_HOURS = register('stage_hours', 'INSERT INTO staged_hours VALUES (?, ?, ?, ?, ?, ?)')
+INSERT_STAGED_HOURS = register('insert_staged_hours', '''
+    INSERT INTO volunteer_hours (volunteer_id, day, hours_worked, description, sync_hlc, sync_site)
+    SELECT volunteer_id, day, hours_worked, description, sync_hlc, sync_site FROM staged_hours
+''')
+CLEAR_STAGED_HOURS = register('clear_staged_hours', 'DELETE FROM staged_hours')
+CREATE_STAGED_ROLLUPS = register('create_staged_rollups', '''
+    CREATE TEMP TABLE IF NOT EXISTS staged_rollups (
+        volunteer_id TEXT, month TEXT, total_hours REAL, shift_count INTEGER
+    )
+''')
+# A row with a NULL month is added to the volunteer's totals.
+STAGE_ROLLUP = register('stage_rollup', 'INSERT INTO staged_rollups VALUES (?, ?, ?, ?)')
+ADD_STAGED_TO_TOTALS = register('add_staged_to_totals', '''
+    INSERT INTO volunteer_hours_totals (volunteer_id, total_hours, shift_count)
+    SELECT volunteer_id, total_hours, shift_count FROM staged_rollups WHERE month IS NULL
+    ON CONFLICT (volunteer_id) DO UPDATE SET
+        total_hours = total_hours + excluded.total_hours,
+        shift_count = shift_count + excluded.shift_count
+''')
+ADD_STAGED_TO_MONTHLY = register('add_staged_to_monthly', '''
+    INSERT INTO volunteer_hours_monthly (volunteer_id, month, total_hours, shift_count)
+    SELECT volunteer_id, month, total_hours, shift_count FROM staged_rollups WHERE month IS NOT NULL
+    ON CONFLICT (volunteer_id, month) DO UPDATE SET
+        total_hours = total_hours + excluded.total_hours,
+        shift_count = shift_count + excluded.shift_count
+''')
+CLEAR_STAGED_ROLLUPS = register('clear_staged_rollups', 'DELETE FROM staged_rollups')
+# A bulk chunk of volunteers is finished from their ids and cleaned skills,
+# staged as JSON arrays: new skill names are added in the order they were
+# given, so the first spelling of a name wins as it does for a single
+# volunteer, the links look every name up in the NOCASE unique index on
+# skills.name, and the change log entries are written with a block of HLC
+# values reserved for the chunk.
+CREATE_STAGED_SKILLS = register('create_staged_skills', '''
+    CREATE TEMP TABLE IF NOT EXISTS staged_skills (volunteer_id TEXT, skills TEXT)
+''')
+STAGE_SKILLS = register('stage_skills', 'INSERT INTO staged_skills VALUES (?, ?)')
+ADD_STAGED_SKILL_NAMES = register('add_staged_skill_names', '''
+    INSERT OR IGNORE INTO skills (name)
+    SELECT skill.value FROM staged_skills st, json_each(st.skills) skill ORDER BY st.rowid, skill.key
+''')
+LINK_STAGED_SKILLS = register('link_staged_skills', '''
+    INSERT INTO volunteer_skills (skill_id, volunteer_id, position)
+    SELECT s.id, st.volunteer_id, skill.key
+    FROM staged_skills st, json_each(st.skills) skill CROSS JOIN skills s ON s.name = skill.value
+''')
+LOG_STAGED_VOLUNTEERS = register('log_staged_volunteers', '''
+    INSERT INTO change_log (hlc, site_id, entity, entity_id, op, data)
+    SELECT ?1 + st.rowid - (SELECT MIN(rowid) FROM staged_skills), ?2, 'volunteer', v.id, 'put',
+           json_object('name', v.name, 'email', v.email, 'contact_info', v.contact_info, 'skills', json(st.skills))
+    FROM staged_skills st JOIN volunteers v ON v.id = st.volunteer_id
+    ORDER BY st.rowid
+''')
+CLEAR_STAGED_SKILLS = register('clear_staged_skills', 'DELETE FROM staged_skills')
+# FTS5 merges index segments as rows are added. Bulk chunks turn that off
+# while they add theirs, and a bulk load ends with one merge instead. The
+# setting is restored before every commit, so a crash never leaves it off.
+SUSPEND_HOURS_INDEX_MERGES = register('suspend_hours_index_merges', '''
+    INSERT INTO volunteer_hours_fts (volunteer_hours_fts, rank) VALUES ('automerge', 0)
+''')
+RESUME_HOURS_INDEX_MERGES = register('resume_hours_index_merges', f'''
+    INSERT INTO volunteer_hours_fts (volunteer_hours_fts, rank) VALUES ('automerge', {FTS_AUTOMERGE})
+''')
+MERGE_HOURS_INDEX = register('merge_hours_index', f'''
+    INSERT INTO volunteer_hours_fts (volunteer_hours_fts, rank) VALUES ('merge', {FTS_MERGE_PAGES})
+''')
+SELECT_IMPORT_CHECKPOINT = register('select_import_checkpoint', 'SELECT checkpoint FROM import_checkpoints WHERE name = ?')
+SAVE_IMPORT_CHECKPOINT = register('save_import_checkpoint', '''
+    INSERT INTO import_checkpoints (name, checkpoint) VALUES (?, ?)
+    ON CONFLICT (name) DO UPDATE SET checkpoint = excluded.checkpoint
+''')
+
+# Change log (see sync.py).
+SELECT_SITE_ID = register('select_site_id', 'SELECT site_id FROM sync_site')
+SET_SITE_ID = register('set_site_id', 'UPDATE sync_site SET site_id = ?')
+SELECT_LATEST_HLC = register('select_latest_hlc', 'SELECT MAX(hlc) FROM change_log')
+INSERT_CHANGE = register('insert_change', '''
+    INSERT INTO change_log (hlc, site_id, entity, entity_id, op, data)
+    VALUES (?, ?, ?, ?, ?, ?)
+''')
+ADD_CHANGE = register('add_change', '''
+    INSERT OR IGNORE INTO change_log (hlc, site_id, entity, entity_id, op, data)
+    VALUES (?, ?, ?, ?, ?, ?)
+''')
+# Incoming changes are staged in a temporary table so the unseen ones can be
+# picked out with one query.
+CREATE_INCOMING_CHANGES = register('create_incoming_changes', '''
+    CREATE TEMP TABLE IF NOT EXISTS incoming_changes (
+        hlc INTEGER, site_id TEXT, entity TEXT, entity_id TEXT, op TEXT, data TEXT
+    )
+''')
+STAGE_CHANGE = register('stage_change', 'INSERT INTO incoming_changes VALUES (?, ?, ?, ?, ?, ?)')
+CLEAR_INCOMING_CHANGES = register('clear_incoming_changes', 'DELETE FROM incoming_changes')
+SELECT_UNSEEN_CHANGES = register('select_unseen_changes', '''
+    SELECT DISTINCT i.hlc, i.site_id, i.entity, i.entity_id, i.op, i.data FROM incoming_changes i
+    WHERE NOT EXISTS (SELECT 1 FROM change_log c WHERE c.hlc = i.hlc AND c.site_id = i.site_id)
+''')
+LOG_NEW_HOURS = register('log_new_hours', f'''
+    INSERT INTO change_log (hlc, site_id, entity, entity_id, op, data)
+    SELECT sync_hlc, sync_site, 'hours', volunteer_id, 'put',
+           json_object('date', {DAY_TEXT.format(day='day')}, 'hours_worked', hours_worked, 'description', description)
+    FROM volunteer_hours WHERE id > ?
+''')
+SELECT_VERSION_VECTOR = register('select_version_vector', 'SELECT site_id, MAX(hlc) FROM change_log GROUP BY site_id')
+SELECT_SITE_CHANGES = register('select_site_changes', '''
+    SELECT hlc, site_id, entity, entity_id, op, data FROM change_log
+    WHERE site_id = ? AND hlc > ?
+    ORDER BY hlc
+''')
+SELECT_LATEST_VOLUNTEER_CHANGE = register('select_latest_volunteer_change', '''
+    SELECT op, data FROM change_log
+    WHERE entity = 'volunteer' AND entity_id = ?
+    ORDER BY hlc DESC, site_id DESC
+    LIMIT 1
+''')
+SELECT_LAST_REMOVAL = register('select_last_removal', '''
+    SELECT MAX(hlc) FROM change_log
+    WHERE entity = 'volunteer' AND entity_id = ? AND op = 'delete'
+''')
+UPSERT_VOLUNTEER = register('upsert_volunteer', '''
+    INSERT INTO volunteers (id, name, email, contact_info)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        name = excluded.name, email = excluded.email, contact_info = excluded.contact_info
+''')
+DELETE_HOURS_BEFORE = register('delete_hours_before', '''
+    DELETE FROM volunteer_hours
+    WHERE volunteer_id = ? AND (sync_hlc IS NULL OR sync_hlc < ?)
+''')
+# Shift changes are replayed from the log; INSERT OR IGNORE skips shifts
+# already present, which the unique (sync_hlc, sync_site) index detects.
+# The log keeps dates as text, and a shift whose date does not parse (one
+# logged before dates were checked) goes to the quarantine instead.
+CHANGED_DAY = TEXT_DAY.format(text="json_extract(c.data, '$.date')")
+REPLAY_HOURS = f'''
+    INSERT OR IGNORE INTO volunteer_hours (volunteer_id, day, hours_worked, description, sync_hlc, sync_site)
+    SELECT c.entity_id, {CHANGED_DAY}, json_extract(c.data, '$.hours_worked'),
+           json_extract(c.data, '$.description'), c.hlc, c.site_id
+    FROM change_log c
+    WHERE c.entity = 'hours' AND {CHANGED_DAY} IS NOT NULL AND {{where}}
+'''
+QUARANTINE_HOURS = f'''
+    INSERT OR IGNORE INTO volunteer_hours_quarantine
+        (volunteer_id, date, hours_worked, description, sync_hlc, sync_site, reason, quarantined_at)
+    SELECT c.entity_id, json_extract(c.data, '$.date'), json_extract(c.data, '$.hours_worked'),
+           json_extract(c.data, '$.description'), c.hlc, c.site_id, '{BAD_DATE}', (julianday('now') - 2440587.5) * 86400
+    FROM change_log c
+    WHERE c.entity = 'hours' AND {CHANGED_DAY} IS NULL AND {{where}}
+'''
+VOLUNTEER_HOURS_CHANGES = 'c.entity_id = ? AND c.hlc > ?'
+NEW_HOURS_CHANGE = '''
+    c.hlc = ? AND c.site_id = ?
+    AND EXISTS (SELECT 1 FROM volunteers WHERE id = c.entity_id)
+    AND NOT EXISTS (SELECT 1 FROM change_log d
+                    WHERE d.entity = 'volunteer' AND d.entity_id = c.entity_id AND d.op = 'delete' AND d.hlc > c.hlc)
+'''
+REPLAY_VOLUNTEER_HOURS = register('replay_volunteer_hours', REPLAY_HOURS.format(where=VOLUNTEER_HOURS_CHANGES))
+REPLAY_NEW_HOURS = register('replay_new_hours', REPLAY_HOURS.format(where=NEW_HOURS_CHANGE))
+QUARANTINE_VOLUNTEER_HOURS = register('quarantine_volunteer_hours', QUARANTINE_HOURS.format(where=VOLUNTEER_HOURS_CHANGES))
+QUARANTINE_NEW_HOURS = register('quarantine_new_hours', QUARANTINE_HOURS.format(where=NEW_HOURS_CHANGE))
+# Rollup additions for every shift inserted after rowid ?, for bulk inserts
+# that are easier to aggregate in SQL than in Python.
+ADD_NEW_HOURS_TO_TOTALS = register('add_new_hours_to_totals', '''
+    INSERT INTO volunteer_hours_totals (volunteer_id, total_hours, shift_count)
+    SELECT volunteer_id, SUM(COALESCE(hours_worked, 0)), COUNT(*)
+    FROM volunteer_hours WHERE id > ? GROUP BY volunteer_id
+    ON CONFLICT (volunteer_id) DO UPDATE SET
+        total_hours = total_hours + excluded.total_hours,
+        shift_count = shift_count + excluded.shift_count
+''')
+ADD_NEW_HOURS_TO_MONTHLY = register('add_new_hours_to_monthly', f'''
+    INSERT INTO volunteer_hours_monthly (volunteer_id, month, total_hours, shift_count)
+    SELECT volunteer_id, {ROLLUP_MONTH.format(row='volunteer_hours')}, SUM(COALESCE(hours_worked, 0)), COUNT(*)
+    FROM volunteer_hours WHERE id > ? GROUP BY 1, 2
+    ON CONFLICT (volunteer_id, month) DO UPDATE SET
+        total_hours = total_hours + excluded.total_hours,
+        shift_count = shift_count + excluded.shift_count
+''')
+
+# Lowest and highest id of the shifts on days [?, ?] (either may be NULL for
+# an open end). One index seek per day, clamped to the days that have
+# shifts, instead of reading every shift in the range.
+SHIFT_IDS_BETWEEN = register('shift_ids_between', '''
+    WITH RECURSIVE
+        span (first_day, last_day) AS (
+            SELECT MAX(COALESCE(?1, first), first), MIN(COALESCE(?2, last), last)
+            FROM (SELECT (SELECT MIN(day) FROM volunteer_hours) AS first,
+                         (SELECT MAX(day) FROM volunteer_hours) AS last)
+        ),
+        days (day) AS (
+            SELECT first_day FROM span
+            UNION ALL
+            SELECT day + 1 FROM days, span WHERE day < last_day
+        )
+    SELECT MIN((SELECT MIN(id) FROM volunteer_hours WHERE day = days.day)),
+           MAX((SELECT MAX(id) FROM volunteer_hours WHERE day = days.day))
+    FROM days
+''')
+
+HOURS_REPORT_SORTS = ('id', 'name', 'total_hours')
+SUMMARY_REPORT_SORTS = ('id', 'name', 'email')
+
+
+def day_number(date):
+    # The volunteer_hours.day value of a YYYY-MM-DD date.
+    ordinal = date_ordinal(date)
+    if ordinal == NO_ORDINAL:
+        raise ValueError(f"{date!r} is not a real date written as YYYY-MM-DD")
+    return ordinal
+
+
+def valid_change_date(change):
+    date = json.loads(change.data).get('date')
+    return isinstance(date, str) and date_ordinal(date) != NO_ORDINAL
+
+
+def date_range_filter(column, start=None, end=None):
+    # Inclusive range of YYYY-MM-DD dates on a day-number column; either end
+    # may be left open.
+    clauses = []
+    params = []
+    if start is not None:
+        clauses.append(f'{column} >= ?')
+        params.append(day_number(start))
+    if end is not None:
+        clauses.append(f'{column} <= ?')
+        params.append(day_number(end))
+    return ' AND '.join(clauses) or '1', params
+
+
+def fts_query(text):
+    # Turns free text into an FTS5 query where every word is a quoted prefix
+    # term, so operators or stray quotes typed by a user cannot break it.
+    return ' '.join(f'"{word}"*' for word in SEARCH_WORD.findall(text))
+
+
+def split_skills(skills):
+    return skills.split(',') if skills else []
+
+
+def volunteer_data(volunteer):
+    # What the change log records for an added or updated volunteer.
+    return {'name': volunteer.name, 'email': volunteer.email, 'contact_info': volunteer.contact_info,
+            'skills': clean_skills(volunteer.skills)}
+
+
+def hours_data(hours):
+    return {'date': hours.date, 'hours_worked': hours.hours_worked, 'description': hours.description}
+
+
+def volunteer_from_row(row):
+    id, name, email, contact_info, skills = row
+    return Volunteer(id, name, email, contact_info, split_skills(skills))
+
 
 class DatabaseHandler:
-    def __init__(self, db_file='volunteers.db'):
+    # Safe to share between threads: every thread gets its own connection
+    # from the pool, so self.conn is always the calling thread's.
+    # instrumentation, if given, is an instrumentation.Instrumentation that
+    # times every method and statement of this handler.
+    def __init__(self, db_file='volunteers.db', cache_size=VOLUNTEER_CACHE_SIZE, profile='default', pool=None,
+                 instrumentation=None):
         script_dir = os.path.dirname(os.path.abspath(__file__))
         self.db_path = os.path.join(script_dir, db_file)
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
+        self.volunteer_cache = VolunteerCache(cache_size)
+        self.pool = pool or ConnectionPool(self.db_path, profile)
+        self.instrumentation = instrumentation
+        if instrumentation is not None:
+            instrumentation.attach(self)
         self.create_tables()
+        self.recover_deferred_rollups()
+        self.site_id = self.fetch_one(SELECT_SITE_ID)[0]
+        self.clock = HybridClock(self.fetch_one(SELECT_LATEST_HLC)[0] or 0)
+
+    @property
+    def conn(self):
+        return self.pool.connection()
 
     def create_tables(self):
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS volunteers (
-                id TEXT PRIMARY KEY,
-                name TEXT,
-                email TEXT,
-                contact_info TEXT,
-                skills TEXT
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS volunteer_hours (
-                volunteer_id TEXT,
-                date TEXT,
-                hours_worked REAL,
-                description TEXT,
-                FOREIGN KEY (volunteer_id) REFERENCES volunteers(id)
-            )
-        ''')
+        migrate(self.conn)
+
+    def recover_deferred_rollups(self):
+        # A committed rollup_deferred row is always left over from a bulk
+        # chunk that failed without rolling back: while it is there every
+        # insert skips the rollup and search triggers. Clear it and rebuild
+        # what those triggers would have maintained.
+        if self.fetch_one(SELECT_DEFERRED_ROLLUPS) is None:
+            return
+        with self.new_cursor() as cursor:
+            cursor.execute(END_DEFERRED_ROLLUPS)
+            rebuild_rollups(cursor)
+            rebuild_search_index(cursor)
         self.conn.commit()
 
+    @contextmanager
+    def new_cursor(self):
+        cursor = self.conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    # Every statement runs through the helpers below, on a cursor of its own
+    # that is closed as soon as its rows are read. conn.execute() makes that
+    # cursor in C, which is cheaper than keeping one shared cursor around.
+    @contextmanager
+    def statement(self, sql, params=()):
+        cursor = self.conn.execute(canonical(sql), params)
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(canonical(sql), params).rowcount
+
+    def executemany(self, sql, seq_of_params):
+        return self.conn.executemany(canonical(sql), seq_of_params).rowcount
+
+    def fetch_one(self, sql, params=()):
+        cursor = self.conn.execute(canonical(sql), params)
+        row = cursor.fetchone()
+        cursor.close()
+        return row
+
+    def fetch_all(self, sql, params=()):
+        return self.conn.execute(canonical(sql), params).fetchall()
+
+    @retry_on_busy
     def add_volunteer(self, volunteer):
-        self.cursor.execute('''
-            INSERT INTO volunteers (id, name, email, contact_info, skills)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (volunteer.id, volunteer.name, volunteer.email, volunteer.contact_info, ','.join(volunteer.skills)))
+        self.execute(INSERT_VOLUNTEER, (volunteer.id, volunteer.name, volunteer.email, volunteer.contact_info))
+        self.insert_skills([(volunteer.id, volunteer.skills)])
+        self.record_change('volunteer', volunteer.id, 'put', volunteer_data(volunteer))
         self.conn.commit()
 
+    def insert_skills(self, volunteers):
+        with self.new_cursor() as cursor:
+            insert_volunteer_skills(cursor, volunteers)
+
+    def record_change(self, entity, entity_id, op, data=None, hlc=None):
+        # Appends a change made here to change_log, inside the caller's
+        # transaction.
+        self.execute(INSERT_CHANGE, (hlc or self.clock.now(), self.site_id, entity, entity_id, op,
+                                     None if data is None else json.dumps(data)))
+
+    def add_volunteers_bulk(self, volunteers, chunk_size=DEFAULT_CHUNK_SIZE, before_commit=None):
+        return self.insert_many(INSERT_VOLUNTEER, volunteers, lambda v: (v.id, v.name, v.email, v.contact_info), chunk_size,
+            before_chunk=lambda: self.begin_bulk_chunk('volunteers'), after_items=self.finish_volunteers_chunk,
+            insert_rows=self.insert_staged_volunteers, before_commit=before_commit)
+
+    def insert_staged_volunteers(self, rows):
+        self.execute(CREATE_STAGED_VOLUNTEERS)
+        self.executemany(STAGE_VOLUNTEER, rows)
+        self.execute(INSERT_STAGED_VOLUNTEERS)
+        self.execute(CLEAR_STAGED_VOLUNTEERS)
+
+    def begin_bulk_chunk(self, table):
+        # While rollup_deferred has a row, the per-row rollup and search index
+        # insert triggers are skipped for this transaction; the finish_*_chunk
+        # methods do that work for the whole chunk before it commits. New rows
+        # get rowids above the current maximum, which is remembered here.
+        self.execute(BEGIN_DEFERRED_ROLLUPS)
+        self.chunk_start_rowid = self.fetch_one(f'SELECT COALESCE(MAX(rowid), 0) FROM {table}')[0]
+
+    def finish_volunteers_chunk(self, volunteers):
+        self.execute(CREATE_STAGED_SKILLS)
+        self.executemany(STAGE_SKILLS, ((v.id, json.dumps(clean_skills(v.skills))) for v in volunteers))
+        self.execute(ADD_STAGED_SKILL_NAMES)
+        self.execute(LINK_STAGED_SKILLS)
+        self.execute(LOG_STAGED_VOLUNTEERS, (self.clock.reserve(len(volunteers)), self.site_id))
+        self.execute(CLEAR_STAGED_SKILLS)
+        self.execute(INDEX_NEW_VOLUNTEERS, (self.chunk_start_rowid,))
+        self.execute(ADD_NEW_VOLUNTEER_TOTALS, (self.chunk_start_rowid,))
+        self.execute(END_DEFERRED_ROLLUPS)
+
+    @retry_on_busy
     def update_volunteer(self, volunteer):
-        self.cursor.execute('''
-            UPDATE volunteers 
-            SET name=?, email=?, contact_info=?, skills=?
-            WHERE id=?
-        ''', (volunteer.name, volunteer.email, volunteer.contact_info, ','.join(volunteer.skills), volunteer.id))
+        # The cache is invalidated only once the change is committed, or
+        # another thread could reload and cache the old row in between.
+        if self.execute(UPDATE_VOLUNTEER, (volunteer.name, volunteer.email, volunteer.contact_info, volunteer.id)):
+            self.execute(DELETE_VOLUNTEER_SKILLS, (volunteer.id,))
+            self.insert_skills([(volunteer.id, volunteer.skills)])
+            self.record_change('volunteer', volunteer.id, 'put', volunteer_data(volunteer))
         self.conn.commit()
+        self.volunteer_cache.invalidate(volunteer.id)
 
+    @retry_on_busy
     def remove_volunteer(self, volunteer_id):
-        self.cursor.execute('''
-            DELETE FROM volunteers
-            WHERE id=?
-        ''', (volunteer_id,))
+        if self.execute(DELETE_VOLUNTEER, (volunteer_id,)):
+            self.record_change('volunteer', volunteer_id, 'delete')
         self.conn.commit()
+        self.volunteer_cache.invalidate(volunteer_id)
 
+    @retry_on_busy
     def add_volunteer_hours(self, volunteer_id, hours):
-        self.cursor.execute('''
-            INSERT INTO volunteer_hours (volunteer_id, date, hours_worked, description)
-            VALUES (?, ?, ?, ?)
-        ''', (volunteer_id, hours.date, hours.hours_worked, hours.description))
+        # Raises ValueError unless hours.date is a real YYYY-MM-DD date.
+        day = day_number(hours.date)
+        hlc = self.clock.now()
+        self.execute(INSERT_HOURS, (volunteer_id, day, hours.hours_worked, hours.description, hlc, self.site_id))
+        self.record_change('hours', volunteer_id, 'put', hours_data(hours), hlc)
+        self.conn.commit()
+        self.forget_loaded_hours([volunteer_id])
+
+    def add_volunteer_hours_bulk(self, entries, chunk_size=DEFAULT_CHUNK_SIZE, before_commit=None):
+        # Each chunk takes a block of chunk_size HLC values up front rather
+        # than asking the clock once per shift.
+        def begin_chunk():
+            self.begin_bulk_chunk('volunteer_hours')
+            self.execute(SUSPEND_HOURS_INDEX_MERGES)
+            self.chunk_hlcs = count(self.clock.reserve(chunk_size))
+
+        result = self.insert_many(INSERT_HOURS, entries, lambda entry: (entry[0], day_number(entry[1].date), entry[1].hours_worked,
+                                                                        entry[1].description, next(self.chunk_hlcs), self.site_id),
+                                  chunk_size, before_chunk=begin_chunk, after_items=self.finish_hours_chunk,
+                                  insert_rows=self.insert_staged_hours, before_commit=before_commit)
+        if result.inserted:
+            self.execute(MERGE_HOURS_INDEX)
+            self.conn.commit()
+        return result
+
+    def insert_staged_hours(self, rows):
+        self.execute(CREATE_STAGED_HOURS)
+        self.executemany(STAGE_HOURS, rows)
+        self.execute(INSERT_STAGED_HOURS)
+        self.execute(CLEAR_STAGED_HOURS)
+
+    def finish_hours_chunk(self, entries):
+        # Mirrors the volunteer_hours rollup and search index insert triggers
+        # for a whole chunk, and logs the new shifts.
+        totals = {}
+        monthly = {}
+        for volunteer_id, hours in entries:
+            hours_worked = hours.hours_worked or 0
+            total = totals.setdefault(volunteer_id, [0.0, 0])
+            total[0] += hours_worked
+            total[1] += 1
+            total = monthly.setdefault((volunteer_id, hours.date[:7]), [0.0, 0])
+            total[0] += hours_worked
+            total[1] += 1
+        self.forget_loaded_hours(totals)
+        self.execute(CREATE_STAGED_ROLLUPS)
+        self.executemany(STAGE_ROLLUP, ((volunteer_id, None, hours, shifts) for volunteer_id, (hours, shifts) in totals.items()))
+        self.executemany(STAGE_ROLLUP, ((volunteer_id, month, hours, shifts)
+                                        for (volunteer_id, month), (hours, shifts) in monthly.items()))
+        self.execute(ADD_STAGED_TO_TOTALS)
+        self.execute(ADD_STAGED_TO_MONTHLY)
+        self.execute(CLEAR_STAGED_ROLLUPS)
+        self.execute(INDEX_NEW_HOURS, (self.chunk_start_rowid,))
+        self.execute(RESUME_HOURS_INDEX_MERGES)
+        self.execute(LOG_NEW_HOURS, (self.chunk_start_rowid,))
+        self.execute(END_DEFERRED_ROLLUPS)
+
+    def insert_many(self, sql, items, to_params, chunk_size=DEFAULT_CHUNK_SIZE, before_chunk=None, after_items=None,
+                    insert_rows=None, before_commit=None):
+        # Each chunk is one transaction. If executemany rejects a chunk, the
+        # chunk is replayed row by row so only the offending rows are skipped.
+        # insert_rows(params), if given, inserts a whole chunk in its place.
+        # before_chunk() runs at the start of each transaction and
+        # after_items(items) with the items that were inserted, before commit.
+        # The caller's before_commit(inserted, failures) runs last, with the
+        # chunk's count and failures, so it can record progress in the same
+        # transaction as the rows.
+        # Any other error rolls the chunk back before it propagates, so the
+        # rollup_deferred marker never outlives its transaction.
+        inserted = 0
+        failures = []
+        items = iter(items)
+        start = 0
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                break
+            try:
+                inserted += self.insert_chunk(sql, chunk, start, to_params, failures, before_chunk, after_items,
+                                              insert_rows, before_commit)
+            except BaseException:
+                self.conn.rollback()
+                raise
+            start += len(chunk)
+        return BulkResult(inserted, failures)
+
+    def insert_chunk(self, sql, chunk, start, to_params, failures, before_chunk, after_items, insert_rows=None,
+                     before_commit=None):
+        # Returns how many of the chunk's items were inserted.
+        try:
+            if before_chunk:
+                before_chunk()
+            if insert_rows:
+                insert_rows(map(to_params, chunk))
+            else:
+                self.executemany(sql, map(to_params, chunk))
+            if after_items:
+                after_items(chunk)
+            if before_commit:
+                before_commit(len(chunk), [])
+            self.conn.commit()
+            return len(chunk)
+        except ROW_ERRORS:
+            self.conn.rollback()
+        if before_chunk:
+            before_chunk()
+        accepted = []
+        rejected = []
+        for offset, item in enumerate(chunk):
+            try:
+                self.execute(sql, to_params(item))
+                accepted.append(item)
+            except ROW_ERRORS as e:
+                rejected.append((start + offset, str(e)))
+        if after_items:
+            after_items(accepted)
+        if before_commit:
+            before_commit(len(accepted), rejected)
         self.conn.commit()
+        failures.extend(rejected)
+        return len(accepted)
 
     def get_all_volunteers(self):
-        self.cursor.execute('SELECT * FROM volunteers')
-        rows = self.cursor.fetchall()
-        volunteers = []
-        for row in rows:
-            id, name, email, contact_info, skills = row
-            volunteer = Volunteer(id, name, email, contact_info, skills.split(','))
-            volunteers.append(volunteer)
-        return volunteers
+        return [self.stored_volunteer(row) for row in self.fetch_all(SELECT_ALL_VOLUNTEERS)]
 
     def get_volunteer_by_id(self, volunteer_id):
-        self.cursor.execute('SELECT * FROM volunteers WHERE id=?', (volunteer_id,))
-        row = self.cursor.fetchone()
+        # Repeated lookups of the same volunteer return the cached object, so
+        # callers must not modify it.
+        return self.volunteer_cache.get(volunteer_id, self.load_volunteer)
+
+    def load_volunteer(self, volunteer_id):
+        row = self.fetch_one(SELECT_VOLUNTEER, (volunteer_id,))
         if row:
-            id, name, email, contact_info, skills = row
-            return Volunteer(id, name, email, contact_info, skills.split(','))
+            return self.stored_volunteer(row)
         return None
 
+    def iter_volunteer_keys(self):
+        # (id, name, email) for every volunteer, for the in-memory picker index.
+        return self.iter_rows(SELECT_VOLUNTEER_KEYS)
+
+    def stored_volunteer(self, row):
+        volunteer = volunteer_from_row(row)
+        volunteer.hours = HoursHistory(volunteer.id, self.volunteer_hours_page, self.count_volunteer_hours,
+                                       page_size=HISTORY_PAGE_SIZE)
+        return volunteer
+
+    def volunteer_hours_page(self, volunteer_id, after=None, limit=HISTORY_PAGE_SIZE, start=None, end=None):
+        # One volunteer's shifts ordered by (date, id), starting after the
+        # (date, id) key `after`.
+        where, params = date_range_filter('day', start, end)
+        if after is not None:
+            where += ' AND (day, id) > (?, ?)'
+            params += [day_number(after[0]), after[1]]
+        return self.fetch_all(f'''
+            SELECT id, {DAY_TEXT.format(day='day')}, hours_worked, description FROM volunteer_hours
+            WHERE volunteer_id = ? AND {where}
+            ORDER BY day, id
+            LIMIT ?
+        ''', [volunteer_id, *params, limit])
+
+    def count_volunteer_hours(self, volunteer_id, start=None, end=None):
+        where, params = date_range_filter('day', start, end)
+        return self.fetch_one(f'SELECT COUNT(*) FROM volunteer_hours WHERE volunteer_id = ? AND {where}',
+                              [volunteer_id, *params])[0]
+
+    def hours_between(self, start=None, end=None):
+        # Yields every shift dated in [start, end] (YYYY-MM-DD, either end
+        # may be left open) as a Shift, by date and then id, straight off
+        # the day index.
+        where, params = date_range_filter('day', start, end)
+        sql = f'''
+            SELECT id, volunteer_id, {DAY_TEXT.format(day='day')}, hours_worked, description
+            FROM volunteer_hours WHERE {where}
+            ORDER BY day, id
+        '''
+        return (Shift(*row) for row in self.iter_rows(sql, params))
+
+    def hours_by_month(self, start=None, end=None, volunteer_id=None):
+        # One MonthTotal per month with shifts, oldest first, for everyone or
+        # for one volunteer. Without a date range the totals come from the
+        # monthly rollup; with one they are summed from a range scan of the
+        # day index, so the range may start or end in the middle of a month.
+        # Rows are grouped by day first so the month is worked out once per
+        # day rather than once per shift.
+        if start is None and end is None:
+            where, params = ('volunteer_id = ?', [volunteer_id]) if volunteer_id is not None else ('1', [])
+            sql = f'''
+                SELECT month, SUM(total_hours), SUM(shift_count) FROM volunteer_hours_monthly
+                WHERE {where} GROUP BY month ORDER BY month
+            '''
+        else:
+            where, params = date_range_filter('day', start, end)
+            if volunteer_id is not None:
+                where += ' AND volunteer_id = ?'
+                params.append(volunteer_id)
+            sql = f'''
+                SELECT {ROLLUP_MONTH.format(row='days')}, SUM(hours), SUM(shifts) FROM (
+                    SELECT day, SUM(COALESCE(hours_worked, 0)) AS hours, COUNT(*) AS shifts
+                    FROM volunteer_hours WHERE {where} GROUP BY day
+                ) AS days GROUP BY 1 ORDER BY 1
+            '''
+        return [MonthTotal(*row) for row in self.fetch_all(sql, params)]
+
+    def quarantined_hours(self):
+        # Shifts set aside by an upgrade because their volunteer did not exist
+        # or their date could not be read; see migrations.index_volunteer_hours
+        # and migrations.store_days_as_ordinals.
+        return [QuarantinedShift(*row) for row in self.fetch_all('''
+            SELECT id, volunteer_id, date, hours_worked, description, reason, quarantined_at
+            FROM volunteer_hours_orphans
+            UNION ALL
+            SELECT id, volunteer_id, date, hours_worked, description, reason, quarantined_at
+            FROM volunteer_hours_quarantine
+            ORDER BY quarantined_at, id
+        ''')]
+
+    def import_checkpoint(self, name):
+        row = self.fetch_one(SELECT_IMPORT_CHECKPOINT, (name,))
+        return json.loads(row[0]) if row else None
+
+    def save_import_checkpoint(self, name, checkpoint, commit=True):
+        # With commit=False the checkpoint joins the caller's transaction.
+        self.execute(SAVE_IMPORT_CHECKPOINT, (name, json.dumps(checkpoint)))
+        if commit:
+            self.conn.commit()
+
+    def forget_loaded_hours(self, volunteer_ids):
+        # Cached volunteers may have pages of their history loaded already.
+        for volunteer_id in volunteer_ids:
+            volunteer = self.volunteer_cache.peek(volunteer_id)
+            if volunteer is not None and isinstance(volunteer.hours, HoursHistory):
+                volunteer.hours.invalidate()
+
+    def find_volunteers_by_skills(self, all_of=(), any_of=()):
+        # Volunteers having every skill in all_of and at least one in any_of
+        # (skill names are case-insensitive). Each skill is an index range
+        # scan on volunteer_skills; the id sets are combined with INTERSECT.
+        all_of = clean_skills(all_of)
+        any_of = clean_skills(any_of)
+        if not all_of and not any_of:
+            raise ValueError("Give at least one skill to search for")
+        sets = ['SELECT vs.volunteer_id FROM volunteer_skills vs JOIN skills s ON s.id = vs.skill_id WHERE s.name = ?'] * len(all_of)
+        params = list(all_of)
+        if any_of:
+            placeholders = ', '.join('?' * len(any_of))
+            sets.append(f'SELECT vs.volunteer_id FROM volunteer_skills vs JOIN skills s ON s.id = vs.skill_id WHERE s.name IN ({placeholders})')
+            params.extend(any_of)
+        rows = self.fetch_all(f'''
+            SELECT {VOLUNTEER_COLUMNS} FROM volunteers v
+            WHERE v.id IN ({' INTERSECT '.join(sets)})
+            ORDER BY v.name, v.id
+        ''', params)
+        return [self.stored_volunteer(row) for row in rows]
+
+    def iter_rows(self, sql, params=(), batch_size=REPORT_BATCH_SIZE):
+        with self.statement(sql, params) as cursor:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+
+    def hours_totals(self, start=None, end=None, top=None):
+        # Yields one HoursTotal per volunteer, grouped by volunteer id.
+        # Without a date range totals come straight from the rollup table,
+        # which has a row for every volunteer; with one, only volunteers who
+        # logged hours in [start, end] are listed, using the date index.
+        # top=N returns the N volunteers with the most hours, otherwise rows
+        # are ordered by name.
+        if start is None and end is None:
+            sql = '''
+                SELECT v.id, v.name, t.total_hours, t.shift_count
+                FROM volunteers v
+                JOIN volunteer_hours_totals t ON t.volunteer_id = v.id
+            '''
+            params = []
+        else:
+            where, params = date_range_filter('vh.day', start, end)
+            sql = f'''
+                SELECT v.id, v.name, SUM(vh.hours_worked), COUNT(*)
+                FROM volunteer_hours vh
+                JOIN volunteers v ON v.id = vh.volunteer_id
+                WHERE {where}
+                GROUP BY v.id
+            '''
+        if top is None:
+            sql += ' ORDER BY 2, 1'
+        else:
+            sql += ' ORDER BY 3 DESC, 1 LIMIT ?'
+            params.append(top)
+        return (HoursTotal(*row) for row in self.iter_rows(sql, params))
+
+    def hours_by_skill(self, start=None, end=None, top=None):
+        # One SkillHours row per skill: how many volunteers with that skill
+        # logged hours, and their combined hours and shifts.
+        if start is None and end is None:
+            source = 'SELECT volunteer_id, total_hours, shift_count FROM volunteer_hours_totals WHERE shift_count > 0'
+            params = []
+        else:
+            where, params = date_range_filter('day', start, end)
+            source = f'''
+                SELECT volunteer_id, SUM(hours_worked) AS total_hours, COUNT(*) AS shift_count
+                FROM volunteer_hours WHERE {where} GROUP BY volunteer_id
+            '''
+        sql = f'''
+            SELECT s.name, COUNT(*), SUM(h.total_hours), SUM(h.shift_count)
+            FROM ({source}) h
+            JOIN volunteer_skills vs ON vs.volunteer_id = h.volunteer_id
+            JOIN skills s ON s.id = vs.skill_id
+            GROUP BY s.id
+            ORDER BY 3 DESC, 1
+        '''
+        if top is not None:
+            sql += ' LIMIT ?'
+            params.append(top)
+        return [SkillHours(*row) for row in self.iter_rows(sql, params)]
+
+    def search(self, query, limit=20, start=None, end=None):
+        # Ranked matches across volunteer name/email/contact and shift
+        # descriptions. start/end restrict the shift matches to a date range.
+        match = fts_query(query)
+        if not match:
+            return []
+        # Each index picks its best `limit` matches before anything is
+        # joined; shift matches are only joined to their rows early when a
+        # date range has to be checked. The range is first turned into the
+        # span of shift ids logged on its days, read from the day index, so
+        # the shift index only walks matches inside that span.
+        in_range = ''
+        params = []
+        if start is not None or end is not None:
+            where, params = date_range_filter('vh.day', start, end)
+            first_id, last_id = self.fetch_one(SHIFT_IDS_BETWEEN, (start and day_number(start), end and day_number(end)))
+            in_range = (f'JOIN volunteer_hours vh ON vh.id = volunteer_hours_fts.rowid AND {where} '
+                        'AND volunteer_hours_fts.rowid BETWEEN ? AND ?')
+            params = [*params, first_id, last_id]
+        rows = self.fetch_all(f'''
+            SELECT 'volunteer', v.id, v.name, NULL, v.email, m.rank
+            FROM (
+                SELECT rowid, rank FROM (
+                    SELECT rowid, bm25(volunteers_fts) AS rank FROM volunteers_fts
+                    WHERE volunteers_fts MATCH ? ORDER BY rowid DESC LIMIT ?
+                ) ORDER BY rank LIMIT ?
+            ) m
+            JOIN volunteers v ON v.rowid = m.rowid
+            UNION ALL
+            SELECT 'hours', vh.volunteer_id, v.name, {DAY_TEXT.format(day='vh.day')}, vh.description, m.rank
+            FROM (
+                SELECT rowid, rank FROM (
+                    SELECT volunteer_hours_fts.rowid, bm25(volunteer_hours_fts) AS rank
+                    FROM volunteer_hours_fts {in_range}
+                    WHERE volunteer_hours_fts MATCH ? ORDER BY volunteer_hours_fts.rowid DESC LIMIT ?
+                ) ORDER BY rank LIMIT ?
+            ) m
+            JOIN volunteer_hours vh ON vh.id = m.rowid
+            JOIN volunteers v ON v.id = vh.volunteer_id
+            ORDER BY 6
+            LIMIT ?
+        ''', [match, SEARCH_CANDIDATES, limit, *params, match, SEARCH_CANDIDATES, limit, limit])
+        return [SearchHit(*row) for row in rows]
+
+    def rebuild_search_index(self):
+        with self.new_cursor() as cursor:
+            rebuild_search_index(cursor)
+        self.conn.commit()
+
+    def iter_volunteer_summary(self):
+        return self.iter_rows(SELECT_ALL_VOLUNTEERS)
+
+    def keyset_page(self, sql, sort, descending=False, after=None, limit=REPORT_PAGE_SIZE, params=()):
+        # One page of `sql` ordered by (sort, id). `after` is the (sort, id)
+        # pair of the last row already shown, so each page is an index range
+        # scan rather than an OFFSET that re-reads every earlier row.
+        order = 'DESC' if descending else 'ASC'
+        query = f'SELECT * FROM ({sql})'
+        params = list(params)
+        if sort == 'id':
+            # id is unique by itself, so it is the whole key; `after` is
+            # still a (sort, id) pair, of which only the id is needed.
+            key, marker, order_by = 'id', '?', f'id {order}'
+            after = None if after is None else after[-1:]
+        else:
+            key, marker, order_by = f'({sort}, id)', '(?, ?)', f'{sort} {order}, id {order}'
+        if after is not None:
+            query += f" WHERE {key} {'<' if descending else '>'} {marker}"
+            params.extend(after)
+        query += f' ORDER BY {order_by} LIMIT ?'
+        params.append(limit)
+        return self.fetch_all(query, params)
+
+    def hours_report_page(self, sort='name', descending=False, after=None, limit=REPORT_PAGE_SIZE):
+        if sort not in HOURS_REPORT_SORTS:
+            raise ValueError(f"Cannot sort hours report by {sort!r}")
+        # Every volunteer has a totals row, so a plain join works; the
+        # sorted column's table leads it, letting its (sort, id) index serve
+        # both the range and the order.
+        if sort == 'total_hours':
+            sql = '''
+                SELECT t.volunteer_id AS id, v.name AS name, t.total_hours AS total_hours
+                FROM volunteer_hours_totals t
+                JOIN volunteers v ON v.id = t.volunteer_id
+            '''
+        else:
+            sql = '''
+                SELECT v.id AS id, v.name AS name, t.total_hours AS total_hours
+                FROM volunteers v
+                JOIN volunteer_hours_totals t ON t.volunteer_id = v.id
+            '''
+        return self.keyset_page(sql, sort, descending, after, limit)
+
+    def volunteer_summary_page(self, sort='id', descending=False, after=None, limit=REPORT_PAGE_SIZE):
+        if sort not in SUMMARY_REPORT_SORTS:
+            raise ValueError(f"Cannot sort volunteer summary by {sort!r}")
+        return self.keyset_page(f'SELECT {VOLUNTEER_COLUMNS} FROM volunteers v',
+                                sort, descending, after, limit)
+
+    def hours_report_lines(self):
+        yield "Volunteer Hours Report:\n"
+        for row in self.hours_totals():
+            yield f"{row.name}: {row.total_hours} hours\n"
+
+    def volunteer_summary_lines(self):
+        yield "Volunteer Summary Report:\n"
+        for id, name, email, contact_info, skills in self.iter_volunteer_summary():
+            yield f"ID: {id}, Name: {name}, Email: {email}, Contact: {contact_info}, Skills: {skills}\n"
+
     def generate_hours_report(self):
-        self.cursor.execute('''
-            SELECT v.name, SUM(vh.hours_worked) AS total_hours
-            FROM volunteers v
-            LEFT JOIN volunteer_hours vh ON v.id = vh.volunteer_id
-            GROUP BY v.name
-        ''')
-        rows = self.cursor.fetchall()
-        report = "Volunteer Hours Report:\n"
-        for row in rows:
-            name, total_hours = row
-            report += f"{name}: {total_hours} hours\n"
-        return report
+        return ''.join(self.hours_report_lines())
 
     def generate_volunteer_summary(self):
-        self.cursor.execute('SELECT * FROM volunteers')
-        rows = self.cursor.fetchall()
-        report = "Volunteer Summary Report:\n"
-        for row in rows:
-            id, name, email, contact_info, skills = row
-            report += f"ID: {id}, Name: {name}, Email: {email}, Contact: {contact_info}, Skills: {skills}\n"
-        return report
+        return ''.join(self.volunteer_summary_lines())
+
+    def rebuild_rollups(self):
+        with self.new_cursor() as cursor:
+            rebuild_rollups(cursor)
+        self.conn.commit()
+
+    def check_rollups(self, tolerance=1e-6):
+        # Compares the rollup tables with totals recomputed from
+        # volunteer_hours and returns one RollupMismatch per differing row.
+        mismatches = []
+        for table, key, expected_sql in (
+            ('volunteer_hours_totals', ['volunteer_id'], '''
+                SELECT v.id AS volunteer_id, NULL AS month,
+                       COALESCE(SUM(vh.hours_worked), 0) AS total_hours, COUNT(vh.id) AS shift_count
+                FROM volunteers v LEFT JOIN volunteer_hours vh ON vh.volunteer_id = v.id
+                GROUP BY v.id
+            '''),
+            ('volunteer_hours_monthly', ['volunteer_id', 'month'], f'''
+                SELECT volunteer_id, {ROLLUP_MONTH.format(row='volunteer_hours')} AS month,
+                       SUM(COALESCE(hours_worked, 0)) AS total_hours, COUNT(*) AS shift_count
+                FROM volunteer_hours GROUP BY 1, 2
+            '''),
+        ):
+            join = ' AND '.join(f'r.{column} = e.{column}' for column in key)
+            month = 'r.month' if 'month' in key else 'NULL'
+            rows = self.fetch_all(f'''
+                SELECT e.volunteer_id, e.month, e.total_hours, e.shift_count, r.total_hours, r.shift_count
+                FROM ({expected_sql}) e
+                LEFT JOIN {table} r ON {join}
+                WHERE r.shift_count IS NULL OR r.shift_count != e.shift_count
+                   OR ABS(r.total_hours - e.total_hours) > ? * MAX(1, ABS(e.total_hours))
+                UNION ALL
+                SELECT r.volunteer_id, {month}, NULL, NULL, r.total_hours, r.shift_count
+                FROM {table} r
+                WHERE NOT EXISTS (SELECT 1 FROM ({expected_sql}) e WHERE {join})
+            ''', (tolerance,))
+            mismatches.extend(RollupMismatch(table, *row) for row in rows)
+        return mismatches
+
+    def set_site_id(self, site_id):
+        self.execute(SET_SITE_ID, (site_id,))
+        self.conn.commit()
+        self.site_id = site_id
+
+    def version_vector(self):
+        # {site_id: newest HLC held from that site}
+        return dict(self.fetch_all(SELECT_VERSION_VECTOR))
+
+    def iter_changes(self, since):
+        # Changes newer than the version vector `since`, site by site.
+        for site_id in sorted(self.version_vector()):
+            yield from self.iter_rows(SELECT_SITE_CHANGES, (site_id, since.get(site_id, 0)))
+
+    @retry_on_busy
+    def apply_changes(self, changes):
+        # Adds the changes this copy has not seen to change_log and rebuilds
+        # what they touch, all in one transaction. Volunteers with a new put
+        # or removal are rebuilt from their latest change; a new shift is
+        # added if its volunteer exists and was not removed after the shift
+        # was logged.
+        self.execute(CREATE_INCOMING_CHANGES)
+        try:
+            self.executemany(STAGE_CHANGE, changes)
+            new = [Change(*row) for row in self.fetch_all(SELECT_UNSEEN_CHANGES)]
+            self.execute(CLEAR_INCOMING_CHANGES)
+            self.executemany(ADD_CHANGE, new)
+            own = [change for change in new if change.site_id == self.site_id]
+            if own:
+                raise ValueError(f"{len(own)} incoming change(s) carry this database's site id {self.site_id} but were "
+                                 "not made here; give every copy its own id with: db_tools.py sync-site --new")
+            rebuilt = {change.entity_id for change in new if change.entity == 'volunteer'}
+            for volunteer_id in sorted(rebuilt):
+                self.rebuild_volunteer(volunteer_id)
+            self.begin_bulk_chunk('volunteer_hours')
+            new_hours = [change for change in new if change.entity == 'hours' and change.entity_id not in rebuilt]
+            self.executemany(REPLAY_NEW_HOURS, ((change.hlc, change.site_id) for change in new_hours))
+            self.executemany(QUARANTINE_NEW_HOURS, ((change.hlc, change.site_id) for change in new_hours
+                                                    if not valid_change_date(change)))
+            self.execute(ADD_NEW_HOURS_TO_TOTALS, (self.chunk_start_rowid,))
+            self.execute(ADD_NEW_HOURS_TO_MONTHLY, (self.chunk_start_rowid,))
+            self.execute(INDEX_NEW_HOURS, (self.chunk_start_rowid,))
+            self.execute(END_DEFERRED_ROLLUPS)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.volunteer_cache.clear()
+        if changes:
+            self.clock.observe(max(change.hlc for change in changes))
+        return SyncResult(len(changes), len(new), len(rebuilt))
+
+    def rebuild_volunteer(self, volunteer_id):
+        op, data = self.fetch_one(SELECT_LATEST_VOLUNTEER_CHANGE, (volunteer_id,))
+        if op == 'delete':
+            self.execute(DELETE_VOLUNTEER, (volunteer_id,))
+            return
+        fields = json.loads(data)
+        self.execute(UPSERT_VOLUNTEER, (volunteer_id, fields['name'], fields['email'], fields['contact_info']))
+        self.execute(DELETE_VOLUNTEER_SKILLS, (volunteer_id,))
+        self.insert_skills([(volunteer_id, fields['skills'])])
+        removed = self.fetch_one(SELECT_LAST_REMOVAL, (volunteer_id,))[0]
+        if removed is not None:
+            self.execute(DELETE_HOURS_BEFORE, (volunteer_id, removed))
+        self.execute(REPLAY_VOLUNTEER_HOURS, (volunteer_id, removed or 0))
+        self.execute(QUARANTINE_VOLUNTEER_HOURS, (volunteer_id, removed or 0))
+
+    def set_cache_size(self, cache_size):
+        self.volunteer_cache.resize(cache_size)
+
+    def cache_stats(self):
+        return self.volunteer_cache.stats()
 
     def close(self):
-        self.conn.close()
+        self.pool.close_all()
@@ -0,0 +1,139 @@
+import argparse
+import os
+import sys
+import time
+
+from database_handler import DatabaseHandler
+from report_batch import run_batch, batch_report_lines, REPORTS, SHARD_KINDS
+from report_writers import write_report
+from migrations import new_site_id
+from sync import export_changes, import_changes, read_header
+from instrumentation import Instrumentation
+
+
+def check_rollups(db_handler, args):
+    mismatches = db_handler.check_rollups()
+    for m in mismatches:
+        where = m.volunteer_id if m.month is None else f"{m.volunteer_id} {m.month}"
+        print(f"{m.table} {where}: expected {m.expected_hours} hours / {m.expected_shifts} shifts, "
+              f"found {m.actual_hours} hours / {m.actual_shifts} shifts")
+    print(f"{len(mismatches)} rollup mismatches")
+    return 1 if mismatches else 0
+
+
+def rebuild_rollups(db_handler, args):
+    db_handler.rebuild_rollups()
+    print("Rollup tables rebuilt")
+    return 0
+
+
+def rebuild_search_index(db_handler, args):
+    db_handler.rebuild_search_index()
+    print("Search index rebuilt")
+    return 0
+
+
+def quarantine(db_handler, args):
+    shifts = db_handler.quarantined_hours()
+    for shift in shifts:
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(shift.quarantined_at))
+        print(f"#{shift.id} {shift.volunteer_id} date={shift.date!r} {shift.hours_worked} hours "
+              f"{shift.description!r}: {shift.reason} ({when})")
+    print(f"{len(shifts)} quarantined shifts")
+    return 0
+
+
+def report_batch(db_handler, args):
+    reports = args.reports.split(',') if args.reports else REPORTS
+    unknown = [report for report in reports if report not in REPORTS]
+    if unknown:
+        print(f"Unknown report(s): {', '.join(unknown)}; choose from {', '.join(REPORTS)}")
+        return 2
+    started = time.perf_counter()
+    results = run_batch(db_handler.db_path, reports, shard_by=args.shard_by, shards=args.shards, workers=args.workers)
+    for report in reports:
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            path = os.path.join(args.output_dir, f"{report}.txt")
+            write_report(batch_report_lines(report, results[report]), path)
+            print(f"{report}: {len(results[report])} rows written to {path}")
+        else:
+            sys.stdout.writelines(batch_report_lines(report, results[report]))
+            print()
+    print(f"Finished in {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    return 0
+
+
+def sync_site(db_handler, args):
+    if args.new or args.set:
+        db_handler.set_site_id(args.set or new_site_id())
+    print(db_handler.site_id)
+    return 0
+
+
+def sync_export(db_handler, args):
+    try:
+        since = read_header(args.since)['vector'] if args.since else None
+    except ValueError as e:
+        print(e)
+        return 1
+    count = export_changes(db_handler, args.path, since)
+    print(f"{count} changes written to {args.path}")
+    return 0
+
+
+def sync_import(db_handler, args):
+    started = time.perf_counter()
+    try:
+        result = import_changes(db_handler, args.paths)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"{result.received} changes read, {result.new} new, {result.volunteers_rebuilt} volunteers rebuilt "
+          f"in {time.perf_counter() - started:.2f} s")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintenance commands for the volunteer database.")
+    parser.add_argument('--db', default='volunteers.db', help="database file (default: volunteers.db next to this script)")
+    parser.add_argument('--diagnostics', metavar='FILE', help="time the command's database calls and write them to FILE as JSON")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('check-rollups', help="compare the hours rollup tables with volunteer_hours").set_defaults(run=check_rollups)
+    commands.add_parser('rebuild-rollups', help="recompute the hours rollup tables from volunteer_hours").set_defaults(run=rebuild_rollups)
+    commands.add_parser('rebuild-search', help="rebuild the full-text search indexes (e.g. after VACUUM)").set_defaults(run=rebuild_search_index)
+    commands.add_parser('quarantine', help="list shifts set aside because their volunteer or date was missing").set_defaults(run=quarantine)
+    batch = commands.add_parser('report-batch', help="compute the year-end hours reports in parallel worker processes")
+    batch.add_argument('--reports', help=f"comma-separated subset of {','.join(REPORTS)} (default: all)")
+    batch.add_argument('--shard-by', choices=SHARD_KINDS, default='volunteer',
+                       help="split shifts into ranges of volunteer id (default) or of shift id")
+    batch.add_argument('--shards', type=int, help="number of shards (default: one per worker)")
+    batch.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    batch.add_argument('--output-dir', help="write one REPORT.txt per report here instead of printing")
+    batch.set_defaults(run=report_batch)
+    site = commands.add_parser('sync-site', help="show or change this copy's site id; every copy needs its own")
+    site.add_argument('--new', action='store_true', help="switch to a fresh random site id (do this after copying the file)")
+    site.add_argument('--set', metavar='SITE_ID', help="switch to the given site id")
+    site.set_defaults(run=sync_site)
+    export = commands.add_parser('sync-export', help="write the change log to a file for another copy to import")
+    export.add_argument('path', help="change file to write")
+    export.add_argument('--since', metavar='FILE',
+                        help="only changes the copy that exported FILE had not seen (e.g. its last change file)")
+    export.set_defaults(run=sync_export)
+    merge = commands.add_parser('sync-import', help="merge change files exported by other copies")
+    merge.add_argument('paths', nargs='+', help="change files to merge")
+    merge.set_defaults(run=sync_import)
+    args = parser.parse_args(argv)
+
+    instrumentation = Instrumentation() if args.diagnostics else None
+    db_handler = DatabaseHandler(args.db, instrumentation=instrumentation)
+    try:
+        return args.run(db_handler, args)
+    finally:
+        db_handler.close()
+        if instrumentation is not None:
+            instrumentation.dump(args.diagnostics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
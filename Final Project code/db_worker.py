@@ -0,0 +1,132 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class DatabaseWorker:
+    # Runs database jobs on one dedicated thread that owns its own
+    # DatabaseHandler (and so its own sqlite connection). Jobs are functions
+    # called as fn(db_handler, *args); their results are handed back on the Tk
+    # thread by polling with root.after, because Tk must not be touched from
+    # the worker thread. A cancelled job calls neither on_success nor
+    # on_error, only on_cancel. fn may also be the name of a DatabaseHandler
+    # method, and without a handler_factory the worker opens a default
+    # DatabaseHandler, so database_handler (and sqlite3) is imported on the
+    # worker thread rather than by whoever starts the app.
+    def __init__(self, root, handler_factory=None, poll_interval=20, on_busy=None):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.on_busy = on_busy
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.outstanding = set()
+        self.polling = False
+        self.lock = threading.Lock()
+        self.current = None
+        self.connection = None
+        self.thread = threading.Thread(target=self.run, args=(handler_factory,), name="DatabaseWorker", daemon=True)
+        self.thread.start()
+
+    def run(self, handler_factory):
+        try:
+            if handler_factory is None:
+                from database_handler import DatabaseHandler
+                handler_factory = DatabaseHandler
+            handler = handler_factory()
+            self.connection = handler.conn
+        except Exception as e:
+            handler = None
+            startup_error = e
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            future, fn, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            if handler is None:
+                future.set_exception(startup_error)
+                continue
+            if isinstance(fn, str):
+                fn = getattr(type(handler), fn)
+            with self.lock:
+                self.current = future
+            try:
+                if handler.instrumentation is not None:
+                    result = handler.instrumentation.run_job(fn, handler, *args)
+                else:
+                    result = fn(handler, *args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self.lock:
+                    self.current = None
+        if handler is not None:
+            handler.close()
+
+    def submit(self, fn, *args, on_success=None, on_error=None, on_cancel=None):
+        future = Future()
+        future.cancel_requested = False
+        future.add_done_callback(lambda f: self.results.put((f, on_success, on_error, on_cancel)))
+        self.outstanding.add(future)
+        if len(self.outstanding) == 1 and self.on_busy:
+            self.on_busy(True)
+        self.jobs.put((future, fn, args))
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_interval, self.poll)
+        return future
+
+    def poll(self):
+        while True:
+            try:
+                future, on_success, on_error, on_cancel = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.outstanding.discard(future)
+            if future.cancelled() or future.cancel_requested:
+                if on_cancel:
+                    on_cancel()
+                continue
+            error = future.exception()
+            if error is not None:
+                if on_error:
+                    on_error(error)
+                else:
+                    self.report_error(error)
+            elif on_success:
+                on_success(future.result())
+        if self.outstanding:
+            self.root.after(self.poll_interval, self.poll)
+        else:
+            self.polling = False
+            if self.on_busy:
+                self.on_busy(False)
+
+    def report_error(self, error):
+        from tkinter import messagebox
+        messagebox.showerror("Error", f"Database error: {error}")
+
+    def cancel(self, future):
+        future.cancel_requested = True
+        if future.cancel():
+            return True
+        with self.lock:
+            if future is self.current:
+                # Aborts the statement that is running on the worker's
+                # connection; the job then fails with "interrupted" and its
+                # callbacks are skipped.
+                self.connection.interrupt()
+                return True
+        return False
+
+    def cancel_all(self):
+        for future in list(self.outstanding):
+            self.cancel(future)
+
+    def close(self, timeout=5):
+        self.cancel_all()
+        self.jobs.put(None)
+        self.thread.join(timeout)
@@ -0,0 +1,153 @@
+from array import array
+from datetime import date
+from functools import lru_cache
+
+from volunteer_hours import VolunteerHours
+
+# Stored in place of an ordinal for dates that are not canonical YYYY-MM-DD
+# (legacy free-text rows); the original text is kept in HoursLog.odd_dates.
+NO_ORDINAL = 0
+
+
+@lru_cache(maxsize=4096)
+def date_ordinal(text):
+    try:
+        parsed = date.fromisoformat(text)
+    except (TypeError, ValueError):
+        return NO_ORDINAL
+    # fromisoformat also accepts forms like 20240105; only dates that come
+    # back out unchanged are packed, so iterating gives the original text.
+    return parsed.toordinal() if parsed.isoformat() == text else NO_ORDINAL
+
+
+class HoursLog:
+    # Column-wise list of shifts: hours in an array of doubles, dates as
+    # packed day ordinals and descriptions as indexes into a table of unique
+    # strings. Items are handed back as VolunteerHours tuples.
+    __slots__ = ('ordinals', 'hours', 'description_ids', 'descriptions', 'description_index', 'odd_dates')
+
+    def __init__(self, entries=()):
+        self.ordinals = array('i')
+        self.hours = array('d')
+        self.description_ids = array('I')
+        self.descriptions = []
+        self.description_index = {}
+        self.odd_dates = {}
+        self.extend(entries)
+
+    def append(self, volunteer_hours):
+        day, hours_worked, description = volunteer_hours
+        ordinal = date_ordinal(day)
+        if ordinal == NO_ORDINAL:
+            self.odd_dates[len(self.ordinals)] = day
+        description_id = self.description_index.get(description)
+        if description_id is None:
+            description_id = self.description_index[description] = len(self.descriptions)
+            self.descriptions.append(description)
+        self.ordinals.append(ordinal)
+        self.hours.append(hours_worked)
+        self.description_ids.append(description_id)
+
+    def extend(self, entries):
+        for volunteer_hours in entries:
+            self.append(volunteer_hours)
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        ordinal = self.ordinals[index]
+        day = date.fromordinal(ordinal).isoformat() if ordinal != NO_ORDINAL else self.odd_dates[index]
+        return VolunteerHours(day, self.hours[index], self.descriptions[self.description_ids[index]])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def total_hours(self):
+        return sum(self.hours)
+
+
+class HoursHistory:
+    # Read-only view of one stored volunteer's shifts, oldest first, that
+    # DatabaseHandler puts on Volunteer.hours. Nothing is read until the view
+    # is used; rows then arrive a page at a time via
+    # fetch_page(volunteer_id, after, limit, start, end), which returns
+    # (id, date, hours_worked, description) rows after the (date, id) key
+    # `after`.
+    __slots__ = ('volunteer_id', 'fetch_page', 'count', 'start', 'end', 'page_size', 'loaded', 'last_key', 'exhausted')
+
+    def __init__(self, volunteer_id, fetch_page, count, start=None, end=None, page_size=100):
+        self.volunteer_id = volunteer_id
+        self.fetch_page = fetch_page
+        self.count = count
+        self.start = start
+        self.end = end
+        self.page_size = page_size
+        self.invalidate()
+
+    def invalidate(self):
+        # Drops what has been loaded so the next read goes to the database.
+        self.loaded = HoursLog()
+        self.last_key = None
+        self.exhausted = False
+
+    def between(self, start=None, end=None):
+        return HoursHistory(self.volunteer_id, self.fetch_page, self.count, start, end, self.page_size)
+
+    def load_page(self):
+        if self.exhausted:
+            return False
+        rows = self.fetch_page(self.volunteer_id, self.last_key, self.page_size, self.start, self.end)
+        for _, day, hours_worked, description in rows:
+            self.loaded.append(VolunteerHours(day, hours_worked, description))
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if rows:
+            self.last_key = (rows[-1][1], rows[-1][0])
+        return bool(rows)
+
+    def load_all(self):
+        while self.load_page():
+            pass
+        return self.loaded
+
+    def pages(self):
+        # Yields the shifts one page (list of VolunteerHours) at a time.
+        index = 0
+        while index < len(self.loaded) or self.load_page():
+            page = self.loaded[index:index + self.page_size]
+            index += len(page)
+            yield page
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or index < 0:
+            return self.load_all()[index]
+        while index >= len(self.loaded) and self.load_page():
+            pass
+        return self.loaded[index]
+
+    def __len__(self):
+        if self.exhausted:
+            return len(self.loaded)
+        return self.count(self.volunteer_id, self.start, self.end)
+
+    def __bool__(self):
+        return len(self.loaded) > 0 or self.load_page()
+
+    def append(self, volunteer_hours):
+        raise TypeError("shifts of a stored volunteer are added with DatabaseHandler.add_volunteer_hours")
+
+    def total_hours(self):
+        return self.load_all().total_hours()
@@ -0,0 +1,214 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from database_handler import DatabaseHandler, DEFAULT_CHUNK_SIZE
+from volunteer import Volunteer
+from volunteer_hours import VolunteerHours
+from validation import validate_not_empty, validate_email, validate_date, validate_hours, MAX_SHIFT_HOURS
+
+VOLUNTEER_FIELDS = ['id', 'name', 'email', 'contact_info', 'skills']
+HOURS_FIELDS = ['volunteer_id', 'date', 'hours_worked', 'description']
+
+
+class OffsetLineReader:
+    # Yields decoded lines from a binary file and remembers the byte offset
+    # just past the last line handed out. csv.reader only pulls the lines it
+    # needs for the next record, so after each record this is exactly where a
+    # resumed import has to seek to.
+    def __init__(self, f, offset):
+        self.f = f
+        self.offset = offset
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.f.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode('utf-8')
+
+
+def read_csv(f, offset):
+    f.seek(0)
+    header_reader = OffsetLineReader(f, 0)
+    header = next(csv.reader(header_reader), None)
+    if header is None:
+        return
+    fieldnames = [name.strip().lstrip('\ufeff') for name in header]
+    offset = max(offset, header_reader.offset)
+    f.seek(offset)
+    lines = OffsetLineReader(f, offset)
+    for values in csv.reader(lines):
+        if not values:
+            continue
+        yield dict(zip(fieldnames, values)), lines.offset
+
+
+def read_jsonl(f, offset):
+    f.seek(offset)
+    lines = OffsetLineReader(f, offset)
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            record = ValueError(f"Invalid JSON: {e}")
+        yield record, lines.offset
+
+
+def field_text(record, field):
+    # A missing field or JSON null is empty; any other value, 0 included,
+    # keeps its text.
+    value = record.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def parse_volunteer(record):
+    id, name, email, contact_info, skills = (field_text(record, field) for field in VOLUNTEER_FIELDS)
+    if not validate_not_empty(id, name, email, contact_info, skills):
+        raise ValueError("All fields are required!")
+    if not validate_email(email):
+        raise ValueError("Invalid email format!")
+    return Volunteer(id, name, email, contact_info, skills.split(','))
+
+
+def parse_hours(record):
+    volunteer_id, date, hours, description = (field_text(record, field) for field in HOURS_FIELDS)
+    if not validate_not_empty(volunteer_id, date, hours, description):
+        raise ValueError("All fields are required!")
+    if not validate_date(date):
+        raise ValueError("Date must be a real date written as YYYY-MM-DD!")
+    try:
+        hours_worked = float(hours)
+    except ValueError:
+        raise ValueError("Hours worked must be a number!")
+    if not validate_hours(hours_worked):
+        raise ValueError(f"Hours worked must be more than 0 and at most {MAX_SHIFT_HOURS}!")
+    return volunteer_id, VolunteerHours(date, hours_worked, description)
+
+
+def load_checkpoint(db_handler, name, source):
+    checkpoint = db_handler.import_checkpoint(name)
+    if checkpoint is not None and checkpoint.get('source') != source:
+        raise SystemExit(f"Checkpoint {name} belongs to {checkpoint.get('source')}; use --restart to ignore it")
+    return checkpoint
+
+
+def report_progress(checkpoint, size, started):
+    elapsed = max(time.monotonic() - started, 1e-9)
+    percent = 100.0 * checkpoint['offset'] / size if size else 100.0
+    sys.stderr.write(f"\r{checkpoint['records']} records, {checkpoint['inserted']} inserted, "
+                     f"{checkpoint['rejected']} rejected, {percent:5.1f}%, "
+                     f"{checkpoint['records_this_run'] / elapsed:,.0f} records/s")
+    sys.stderr.flush()
+
+
+def import_file(db_handler, kind, path, file_format, chunk_size, checkpoint_name, rejects, restart=False):
+    # The checkpoint lives in the database and is saved in the same
+    # transaction as each batch, so a crash can never commit a batch without
+    # moving the offset past it, and a resumed import never inserts it twice.
+    source = os.path.abspath(path)
+    checkpoint_name = checkpoint_name or source
+    size = os.path.getsize(path)
+    checkpoint = None if restart else load_checkpoint(db_handler, checkpoint_name, source)
+    if checkpoint is None:
+        checkpoint = {'source': source, 'kind': kind, 'offset': 0, 'records': 0, 'inserted': 0, 'rejected': 0, 'done': False}
+    if checkpoint['done']:
+        sys.stderr.write(f"{path} was already imported (checkpoint {checkpoint_name}); use --restart to import it again\n")
+        return checkpoint
+    checkpoint['records_this_run'] = 0
+
+    if kind == 'volunteers':
+        parse, insert = parse_volunteer, db_handler.add_volunteers_bulk
+    else:
+        parse, insert = parse_hours, db_handler.add_volunteer_hours_bulk
+    read = read_csv if file_format == 'csv' else read_jsonl
+
+    def flush(batch, batch_records, offset):
+        # A non-empty batch is one chunk, so save() runs exactly once, just
+        # before the batch commits.
+        def save(inserted, failures, commit=False):
+            for index, message in failures:
+                reject(batch[index][0], message)
+            checkpoint['records'] += batch_records
+            checkpoint['records_this_run'] += batch_records
+            checkpoint['inserted'] += inserted
+            checkpoint['offset'] = offset
+            db_handler.save_import_checkpoint(checkpoint_name, checkpoint, commit=commit)
+
+        if batch:
+            insert((item for _, item in batch), chunk_size=len(batch), before_commit=save)
+        else:
+            save(0, [], commit=True)
+        report_progress(checkpoint, size, started)
+
+    def reject(record_number, message):
+        checkpoint['rejected'] += 1
+        if rejects:
+            rejects.write(json.dumps({'record': record_number, 'error': message}) + '\n')
+
+    started = time.monotonic()
+    with open(path, 'rb') as f:
+        batch = []
+        batch_records = 0
+        offset = checkpoint['offset']
+        record_number = checkpoint['records']
+        for record, offset in read(f, checkpoint['offset']):
+            record_number += 1
+            batch_records += 1
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                if not isinstance(record, dict):
+                    raise ValueError("Record must be an object")
+                batch.append((record_number, parse(record)))
+            except ValueError as e:
+                reject(record_number, str(e))
+            if batch_records >= chunk_size:
+                flush(batch, batch_records, offset)
+                batch = []
+                batch_records = 0
+        flush(batch, batch_records, offset)
+
+    checkpoint['done'] = True
+    db_handler.save_import_checkpoint(checkpoint_name, checkpoint)
+    sys.stderr.write("\n")
+    return checkpoint
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream volunteers or volunteer hours from CSV or JSON-lines into the database.")
+    parser.add_argument('kind', choices=['volunteers', 'hours'])
+    parser.add_argument('path', help="CSV file with a header row, or a JSON-lines file")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="defaults to the file extension")
+    parser.add_argument('--db', default='volunteers.db', help="database file (default: volunteers.db next to this script)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="records per transaction and checkpoint")
+    parser.add_argument('--checkpoint', help="name the import's checkpoint is kept under in the database "
+                                             "(default: the file's absolute path)")
+    parser.add_argument('--restart', action='store_true', help="ignore an existing checkpoint and start from the beginning")
+    parser.add_argument('--rejects', help="write rejected records as JSON lines to this file")
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ('csv' if args.path.lower().endswith('.csv') else 'jsonl')
+    db_handler = DatabaseHandler(args.db, profile='bulk')
+    rejects = open(args.rejects, 'a') if args.rejects else None
+    try:
+        checkpoint = import_file(db_handler, args.kind, args.path, file_format, max(args.chunk_size, 1),
+                                 args.checkpoint, rejects, restart=args.restart)
+    finally:
+        if rejects:
+            rejects.close()
+        db_handler.close()
+    print(f"{checkpoint['records']} records read, {checkpoint['inserted']} inserted, {checkpoint['rejected']} rejected")
+    return 1 if checkpoint['rejected'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import functools
+import inspect
+import json
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+from statements import canonical, statement_name
+
+# Opt-in timing of DatabaseHandler. attach() replaces the handler's public
+# methods and its SQL helpers (execute, fetch_all, ...) with timed wrappers
+# on that one instance, so an uninstrumented handler pays nothing. Every
+# method and statement gets a call count, a row count and a latency
+# histogram; statements slower than the threshold also go to the slow-query
+# log together with their EXPLAIN QUERY PLAN. Statements are keyed by their
+# registered name (see statements.py) or else by their canonical SQL.
+# Times are inclusive: a method's time covers the statements it ran. For
+# generator methods only the time spent inside the generator is counted,
+# not the time the caller spends between rows. DatabaseWorker jobs are
+# timed as a whole too, since the app often submits unbound methods
+# (DatabaseHandler.add_volunteer) that the per-instance wrappers never see.
+
+SlowQuery = namedtuple('SlowQuery', ['timestamp', 'statement', 'sql', 'elapsed_ms', 'rows', 'plan'])
+
+SLOW_QUERY_MS = 100.0
+SLOW_LOG_SIZE = 200
+# Histogram bucket i counts calls that took from 2**i up to 2**(i+1)
+# microseconds; the last bucket takes everything slower.
+BUCKETS = 26
+SQL_HELPERS = ('execute', 'executemany', 'fetch_one', 'fetch_all')
+NOT_TIMED = SQL_HELPERS + ('statement', 'new_cursor', 'conn')
+
+
+def bucket(elapsed):
+    return min(max(int(elapsed * 1e6), 1).bit_length() - 1, BUCKETS - 1)
+
+
+class Stats:
+    __slots__ = ('calls', 'rows', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * BUCKETS
+
+    def add(self, elapsed, rows):
+        self.calls += 1
+        self.rows += rows or 0
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.histogram[bucket(elapsed)] += 1
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the given fraction of calls, in ms.
+        wanted = fraction * self.calls
+        seen = 0
+        for number, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= wanted:
+                return min(2 ** (number + 1) / 1000, self.max * 1000)
+        return 0.0
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'rows': self.rows,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total * 1000 / self.calls if self.calls else 0.0,
+            'max_ms': self.max * 1000,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'histogram_us': {f"<{2 ** (number + 1)}": count for number, count in enumerate(self.histogram) if count},
+        }
+
+
+class Instrumentation:
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_log_path=None, slow_log_size=SLOW_LOG_SIZE):
+        self.slow_query_ms = slow_query_ms
+        self.slow_log_path = slow_log_path
+        self.lock = threading.Lock()
+        self.plans = {}
+        self.slow_log_size = slow_log_size
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.jobs = {}
+            self.methods = {}
+            self.statements = {}
+            self.slow_queries = deque(maxlen=self.slow_log_size)
+
+    def record(self, table, key, elapsed, rows=None):
+        with self.lock:
+            stats = table.get(key)
+            if stats is None:
+                stats = table[key] = Stats()
+            stats.add(elapsed, rows)
+
+    def record_statement(self, db_handler, sql, params, elapsed, rows, many=False):
+        sql = canonical(sql)
+        self.record(self.statements, statement_name(sql) or sql, elapsed, rows)
+        if elapsed * 1000 >= self.slow_query_ms:
+            self.log_slow_query(db_handler, sql, None if many else params, elapsed, rows)
+
+    def log_slow_query(self, db_handler, sql, params, elapsed, rows):
+        entry = SlowQuery(time.time(), statement_name(sql), sql, elapsed * 1000, rows,
+                          self.query_plan(db_handler, sql, params))
+        with self.lock:
+            self.slow_queries.append(entry)
+            if self.slow_log_path:
+                with open(self.slow_log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry._asdict()) + '\n')
+
+    def query_plan(self, db_handler, sql, params):
+        # One plan per statement is enough; params are needed only so the
+        # placeholders bind. executemany() batches are not explained.
+        if sql in self.plans or params is None:
+            return self.plans.get(sql)
+        try:
+            rows = db_handler.conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+        except sqlite3.Error:
+            return None
+        depth = {0: -1}
+        plan = []
+        for id, parent, _, detail in rows:
+            depth[id] = depth.get(parent, -1) + 1
+            plan.append('  ' * depth[id] + detail)
+        self.plans[sql] = plan
+        return plan
+
+    def run_job(self, fn, db_handler, *args):
+        started = time.perf_counter()
+        try:
+            return fn(db_handler, *args)
+        finally:
+            self.record(self.jobs, getattr(fn, '__qualname__', repr(fn)), time.perf_counter() - started)
+
+    def attach(self, db_handler):
+        for name, member in inspect.getmembers(type(db_handler), inspect.isfunction):
+            if name.startswith('_') or name in NOT_TIMED:
+                continue
+            setattr(db_handler, name, self.timed_method(name, getattr(db_handler, name), inspect.isgeneratorfunction(member)))
+        self.attach_sql_helpers(db_handler)
+        return db_handler
+
+    def timed_method(self, name, method, generator):
+        if generator:
+            @functools.wraps(method)
+            def timed_generator(*args, **kwargs):
+                elapsed = 0.0
+                rows = 0
+                items = method(*args, **kwargs)
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            break
+                        finally:
+                            elapsed += time.perf_counter() - started
+                        rows += 1
+                        yield item
+                finally:
+                    items.close()
+                    self.record(self.methods, name, elapsed, rows)
+            return timed_generator
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(self.methods, name, time.perf_counter() - started)
+        return timed
+
+    def attach_sql_helpers(self, db_handler):
+        execute, executemany = db_handler.execute, db_handler.executemany
+        fetch_one, fetch_all, statement = db_handler.fetch_one, db_handler.fetch_all, db_handler.statement
+
+        def timed_execute(sql, params=()):
+            started = time.perf_counter()
+            rowcount = execute(sql, params)
+            self.record_statement(db_handler, sql, params, time.perf_counter() - started, max(rowcount, 0))
+            return rowcount
+
+        def timed_executemany(sql, seq_of_params):
+            started = time.perf_counter()
+            rowcount = executemany(sql, seq_of_params)
+            self.record_statement(db_handler, sql, None, time.perf_counter() - started, max(rowcount, 0), many=True)
+            return rowcount
+
+        def timed_fetch_one(sql, params=()):
+            started = time.perf_counter()
+            row = fetch_one(sql, params)
+            self.record_statement(db_handler, sql, params, time.perf_counter() - started, 0 if row is None else 1)
+            return row
+
+        def timed_fetch_all(sql, params=()):
+            started = time.perf_counter()
+            rows = fetch_all(sql, params)
+            self.record_statement(db_handler, sql, params, time.perf_counter() - started, len(rows))
+            return rows
+
+        @contextmanager
+        def timed_statement(sql, params=()):
+            # Only the time to the first row is known here; how long the
+            # caller takes to read the rest is up to the caller.
+            started = time.perf_counter()
+            with statement(sql, params) as cursor:
+                self.record_statement(db_handler, sql, params, time.perf_counter() - started, None)
+                yield cursor
+
+        db_handler.execute = timed_execute
+        db_handler.executemany = timed_executemany
+        db_handler.fetch_one = timed_fetch_one
+        db_handler.fetch_all = timed_fetch_all
+        db_handler.statement = timed_statement
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'started': self.started,
+                'elapsed_s': time.time() - self.started,
+                'slow_query_ms': self.slow_query_ms,
+                'jobs': {name: stats.snapshot() for name, stats in self.jobs.items()},
+                'methods': {name: stats.snapshot() for name, stats in self.methods.items()},
+                'statements': {key: stats.snapshot() for key, stats in self.statements.items()},
+                'slow_queries': [entry._asdict() for entry in self.slow_queries],
+            }
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+def diagnostics_lines(snapshot, top=20):
+    # A readable version of snapshot() for the Diagnostics screen.
+    yield f"Instrumented for {snapshot['elapsed_s']:.0f} s; slow query threshold {snapshot['slow_query_ms']:g} ms\n\n"
+    for title, key in (("Worker jobs", 'jobs'), ("Methods", 'methods'), ("Statements", 'statements')):
+        entries = sorted(snapshot[key].items(), key=lambda item: -item[1]['total_ms'])[:top]
+        yield f"{title} by total time (top {top})\n"
+        yield f"{'Calls':>8}{'Rows':>10}{'Total ms':>11}{'Mean ms':>10}{'p95 ms':>10}{'Max ms':>10}  Name\n"
+        for name, stats in entries:
+            yield (f"{stats['calls']:>8}{stats['rows']:>10}{stats['total_ms']:>11.1f}{stats['mean_ms']:>10.2f}"
+                   f"{stats['p95_ms']:>10.2f}{stats['max_ms']:>10.2f}  {name[:100]}\n")
+        yield "\n"
+    yield f"Slow queries ({len(snapshot['slow_queries'])}, newest first)\n"
+    for entry in reversed(snapshot['slow_queries']):
+        when = time.strftime('%H:%M:%S', time.localtime(entry['timestamp']))
+        yield f"{when}  {entry['elapsed_ms']:.1f} ms  {entry['statement'] or entry['sql'][:100]}\n"
+        for step in entry['plan'] or ["(no plan)"]:
+            yield f"    {step}\n"
@@ -1,9 +1,25 @@
+import argparse
 import tkinter as tk
 from volunteer_app import VolunteerApp
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Volunteer Tracking System")
+    parser.add_argument('--diagnostics', action='store_true',
+                        help="time every database call; see the Diagnostics screen")
+    parser.add_argument('--slow-query-ms', type=float,
+                        help="with --diagnostics, log statements slower than this (default: 100 ms)")
+    parser.add_argument('--slow-query-log', help="with --diagnostics, also append slow statements to this file")
+    args = parser.parse_args(argv)
+    instrumentation = None
+    if args.diagnostics:
+        # Only imported when asked for; it is not needed to draw the first
+        # frame otherwise.
+        from instrumentation import Instrumentation, SLOW_QUERY_MS
+        slow_query_ms = SLOW_QUERY_MS if args.slow_query_ms is None else args.slow_query_ms
+        instrumentation = Instrumentation(slow_query_ms, args.slow_query_log)
+
     root = tk.Tk()
-    app = VolunteerApp(root)
+    app = VolunteerApp(root, instrumentation=instrumentation)
     root.mainloop()
 
 if __name__ == "__main__":
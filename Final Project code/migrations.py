@@ -0,0 +1,525 @@
+import os
+import time
+
+from volunteer import clean_skills
+
+
+def create_base_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS volunteers (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            contact_info TEXT,
+            skills TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS volunteer_hours (
+            volunteer_id TEXT,
+            date TEXT,
+            hours_worked REAL,
+            description TEXT,
+            FOREIGN KEY (volunteer_id) REFERENCES volunteers(id)
+        )
+    ''')
+
+
+# volunteer_hours_orphans.reason for shifts whose volunteer does not exist.
+NO_VOLUNTEER = "volunteer does not exist"
+
+
+def create_orphans_table(cursor):
+    # Also a step of its own (9) for files upgraded to version 2 before
+    # orphans were kept; their orphans are gone, but the table must exist.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS volunteer_hours_orphans (
+            id INTEGER PRIMARY KEY,
+            volunteer_id TEXT,
+            date TEXT,
+            hours_worked REAL,
+            description TEXT,
+            reason TEXT NOT NULL,
+            quarantined_at REAL NOT NULL
+        )
+    ''')
+
+
+def index_volunteer_hours(cursor):
+    # SQLite cannot add a primary key or change a foreign key action with
+    # ALTER TABLE, so only volunteer_hours is rebuilt; volunteers is untouched.
+    # The old rowid becomes the surrogate key. Rows whose volunteer was
+    # already removed (or never existed) would break the enforced foreign
+    # key; they move, unchanged, to volunteer_hours_orphans instead of being
+    # lost, and are listed with the quarantined shifts.
+    create_orphans_table(cursor)
+    cursor.execute('''
+        INSERT INTO volunteer_hours_orphans (id, volunteer_id, date, hours_worked, description, reason, quarantined_at)
+        SELECT vh.rowid, vh.volunteer_id, vh.date, vh.hours_worked, vh.description, ?, ?
+        FROM volunteer_hours vh
+        WHERE NOT EXISTS (SELECT 1 FROM volunteers v WHERE v.id = vh.volunteer_id)
+    ''', (NO_VOLUNTEER, time.time()))
+    cursor.execute('''
+        CREATE TABLE volunteer_hours_new (
+            id INTEGER PRIMARY KEY,
+            volunteer_id TEXT NOT NULL REFERENCES volunteers(id) ON DELETE CASCADE,
+            date TEXT,
+            hours_worked REAL,
+            description TEXT
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO volunteer_hours_new (id, volunteer_id, date, hours_worked, description)
+        SELECT vh.rowid, vh.volunteer_id, vh.date, vh.hours_worked, vh.description
+        FROM volunteer_hours vh
+        JOIN volunteers v ON v.id = vh.volunteer_id
+    ''')
+    cursor.execute('DROP TABLE volunteer_hours')
+    cursor.execute('ALTER TABLE volunteer_hours_new RENAME TO volunteer_hours')
+    cursor.execute('CREATE INDEX idx_volunteer_hours_volunteer_date ON volunteer_hours (volunteer_id, date)')
+    cursor.execute('CREATE INDEX idx_volunteer_hours_date ON volunteer_hours (date)')
+
+
+def index_volunteer_sort_keys(cursor):
+    # Keyset pagination orders by (column, id), so index exactly that.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_volunteers_name ON volunteers (name, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_volunteers_email ON volunteers (email, id)')
+
+
+def create_hours_rollups(cursor):
+    # Per-volunteer and per-volunteer-per-month totals kept up to date by
+    # triggers, so reports read one row per volunteer instead of summing
+    # every shift. Deleting a volunteer cascades to both tables.
+    cursor.execute('''
+        CREATE TABLE volunteer_hours_totals (
+            volunteer_id TEXT PRIMARY KEY REFERENCES volunteers(id) ON DELETE CASCADE,
+            total_hours REAL NOT NULL,
+            shift_count INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE volunteer_hours_monthly (
+            volunteer_id TEXT NOT NULL REFERENCES volunteers(id) ON DELETE CASCADE,
+            month TEXT NOT NULL,
+            total_hours REAL NOT NULL,
+            shift_count INTEGER NOT NULL,
+            PRIMARY KEY (volunteer_id, month)
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_hours_totals_total ON volunteer_hours_totals (total_hours, volunteer_id)')
+    cursor.execute('CREATE INDEX idx_hours_monthly_month ON volunteer_hours_monthly (month)')
+    # While a row exists here the insert trigger is skipped; bulk inserts
+    # set it inside their own transaction and add whole chunks to the
+    # rollups at once, which is much cheaper than one upsert pair per row.
+    cursor.execute('CREATE TABLE rollup_deferred (active INTEGER)')
+    create_rollup_triggers(cursor, TEXT_ROLLUP_MONTH, 'date')
+    rebuild_rollups(cursor, TEXT_ROLLUP_MONTH)
+
+
+ROLLUP_ADD = '''
+    INSERT INTO volunteer_hours_totals (volunteer_id, total_hours, shift_count)
+    VALUES (NEW.volunteer_id, COALESCE(NEW.hours_worked, 0), 1)
+    ON CONFLICT (volunteer_id) DO UPDATE SET
+        total_hours = total_hours + excluded.total_hours,
+        shift_count = shift_count + 1;
+    INSERT INTO volunteer_hours_monthly (volunteer_id, month, total_hours, shift_count)
+    VALUES (NEW.volunteer_id, {month}, COALESCE(NEW.hours_worked, 0), 1)
+    ON CONFLICT (volunteer_id, month) DO UPDATE SET
+        total_hours = total_hours + excluded.total_hours,
+        shift_count = shift_count + 1;
+'''
+
+ROLLUP_SUBTRACT = '''
+    UPDATE volunteer_hours_totals
+    SET total_hours = total_hours - COALESCE(OLD.hours_worked, 0), shift_count = shift_count - 1
+    WHERE volunteer_id = OLD.volunteer_id;
+    UPDATE volunteer_hours_monthly
+    SET total_hours = total_hours - COALESCE(OLD.hours_worked, 0), shift_count = shift_count - 1
+    WHERE volunteer_id = OLD.volunteer_id AND month = {month};
+    DELETE FROM volunteer_hours_monthly WHERE volunteer_id = OLD.volunteer_id AND month = {month} AND shift_count <= 0;
+'''
+
+# Since version 8 volunteer_hours.day holds the shift's date as a
+# date.toordinal() day number (0001-01-01 is day 1). sqlite's julianday()
+# counts the same days from a point 1721424.5 days earlier.
+# DAY_TEXT turns a day number back into 'YYYY-MM-DD'; TEXT_DAY turns text
+# into a day number, or NULL unless the text is exactly a real YYYY-MM-DD
+# date. Only the round trip catches days that do not exist: julianday()
+# reads 2024-02-30 as 2024-03-01.
+DAY_TEXT = "date({day} + 1721424.5)"
+TEXT_DAY = ("CASE WHEN date(julianday({text})) = {text} AND {text} >= '0001-01-01' "
+            "THEN CAST(julianday({text}) - 1721424.5 AS INTEGER) END")
+
+# SQL expression turning a volunteer_hours row into the 'YYYY-MM' month key
+# of volunteer_hours_monthly, and the same for the text dates before
+# version 8.
+ROLLUP_MONTH = "strftime('%Y-%m', {row}.day + 1721424.5)"
+TEXT_ROLLUP_MONTH = "COALESCE(substr({row}.date, 1, 7), '')"
+
+
+def create_rollup_triggers(cursor, month=ROLLUP_MONTH, day_column='day'):
+    add = ROLLUP_ADD.format(month=month.format(row='NEW'))
+    subtract = ROLLUP_SUBTRACT.format(month=month.format(row='OLD'))
+    cursor.execute('DROP TRIGGER IF EXISTS volunteer_hours_rollup_insert')
+    cursor.execute('DROP TRIGGER IF EXISTS volunteer_hours_rollup_delete')
+    cursor.execute('DROP TRIGGER IF EXISTS volunteer_hours_rollup_update')
+    cursor.execute(f'''
+        CREATE TRIGGER volunteer_hours_rollup_insert AFTER INSERT ON volunteer_hours
+        WHEN NOT EXISTS (SELECT 1 FROM rollup_deferred)
+        BEGIN {add} END
+    ''')
+    cursor.execute(f'CREATE TRIGGER volunteer_hours_rollup_delete AFTER DELETE ON volunteer_hours BEGIN {subtract} END')
+    cursor.execute(f'''
+        CREATE TRIGGER volunteer_hours_rollup_update
+        AFTER UPDATE OF volunteer_id, {day_column}, hours_worked ON volunteer_hours
+        BEGIN {subtract} {add} END
+    ''')
+
+
+def rebuild_rollups(cursor, month=ROLLUP_MONTH):
+    month = month.format(row='volunteer_hours')
+    cursor.execute('DELETE FROM volunteer_hours_totals')
+    cursor.execute('DELETE FROM volunteer_hours_monthly')
+    cursor.execute('''
+        INSERT INTO volunteer_hours_totals (volunteer_id, total_hours, shift_count)
+        SELECT volunteer_id, SUM(COALESCE(hours_worked, 0)), COUNT(*)
+        FROM volunteer_hours
+        GROUP BY volunteer_id
+    ''')
+    add_empty_totals(cursor)
+    cursor.execute(f'''
+        INSERT INTO volunteer_hours_monthly (volunteer_id, month, total_hours, shift_count)
+        SELECT volunteer_id, {month}, SUM(COALESCE(hours_worked, 0)), COUNT(*)
+        FROM volunteer_hours
+        GROUP BY volunteer_id, {month}
+    ''')
+
+
+def add_empty_totals(cursor):
+    cursor.execute('''
+        INSERT OR IGNORE INTO volunteer_hours_totals (volunteer_id, total_hours, shift_count)
+        SELECT id, 0, 0 FROM volunteers
+    ''')
+
+
+def total_every_volunteer(cursor):
+    # The hours report pages by (total_hours, id) through
+    # idx_hours_totals_total, which only works if every volunteer has a
+    # totals row; a LEFT JOIN with COALESCE must scan and sort them all.
+    # Volunteers without shifts get a zero row, added by a trigger on
+    # volunteers (standing down during bulk inserts like the others) and no
+    # longer deleted when their last shift goes.
+    create_rollup_triggers(cursor)
+    cursor.execute('''
+        CREATE TRIGGER volunteers_totals_insert AFTER INSERT ON volunteers
+        WHEN NOT EXISTS (SELECT 1 FROM rollup_deferred)
+        BEGIN
+            INSERT OR IGNORE INTO volunteer_hours_totals (volunteer_id, total_hours, shift_count)
+            VALUES (NEW.id, 0, 0);
+        END
+    ''')
+    add_empty_totals(cursor)
+
+
+def normalize_skills(cursor):
+    # Moves the comma-joined volunteers.skills column into a skills table and
+    # a volunteer_skills junction keyed (skill_id, volunteer_id), so "who has
+    # skill X" is an index range scan. position keeps the original order.
+    cursor.execute('''
+        CREATE TABLE skills (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE volunteer_skills (
+            skill_id INTEGER NOT NULL REFERENCES skills(id),
+            volunteer_id TEXT NOT NULL REFERENCES volunteers(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (skill_id, volunteer_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX idx_volunteer_skills_volunteer ON volunteer_skills (volunteer_id, position)')
+    volunteers = cursor.connection.cursor()
+    volunteers.execute('SELECT id, skills FROM volunteers')
+    for volunteer_id, skills in volunteers:
+        insert_volunteer_skills(cursor, [(volunteer_id, (skills or '').split(','))])
+    volunteers.close()
+    cursor.execute('ALTER TABLE volunteers DROP COLUMN skills')
+
+
+def insert_volunteer_skills(cursor, volunteers):
+    # volunteers is a list of (volunteer_id, skills) pairs.
+    links = [(volunteer_id, position, skill)
+             for volunteer_id, skills in volunteers
+             for position, skill in enumerate(clean_skills(skills))]
+    cursor.executemany('INSERT OR IGNORE INTO skills (name) VALUES (?)', ((skill,) for _, _, skill in links))
+    cursor.executemany('''
+        INSERT INTO volunteer_skills (skill_id, volunteer_id, position)
+        SELECT id, ?, ? FROM skills WHERE name = ?
+    ''', links)
+
+
+def create_search_index(cursor):
+    # External-content FTS5 indexes: the text lives only in volunteers and
+    # volunteer_hours, the indexes are kept in sync by triggers. volunteers has
+    # no INTEGER PRIMARY KEY, so its index is keyed by the implicit rowid;
+    # run rebuild_search_index() after a VACUUM, which may renumber rowids.
+    # Like the rollup trigger, the insert triggers stand down while
+    # rollup_deferred has a row; bulk inserts index whole chunks instead.
+    create_search_tables(cursor, '2 3')
+    for table in SEARCHED_COLUMNS:
+        create_search_triggers(cursor, table)
+    rebuild_search_index(cursor)
+
+
+def create_search_tables(cursor, prefix):
+    # prefix lists the prefix lengths FTS5 indexes ahead of time; a prefix
+    # query of any other length merges every matching word's postings.
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE volunteers_fts USING fts5(
+            name, email, contact_info,
+            content='volunteers', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2', prefix='{prefix}'
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE volunteer_hours_fts USING fts5(
+            description,
+            content='volunteer_hours', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='{prefix}'
+        )
+    ''')
+
+
+def index_one_letter_prefixes(cursor):
+    # Search-as-you-type sends a one-letter prefix with every new word, and
+    # merging the postings of every word starting with that letter took
+    # most of the search time budget. The search triggers name the tables
+    # only in their bodies, so they carry on working once these are rebuilt.
+    cursor.execute('DROP TABLE volunteers_fts')
+    cursor.execute('DROP TABLE volunteer_hours_fts')
+    create_search_tables(cursor, '1 2 3')
+    rebuild_search_index(cursor)
+
+
+# Indexed table -> (its rowid column, the columns in its search index).
+SEARCHED_COLUMNS = {
+    'volunteers': ('rowid', ['name', 'email', 'contact_info']),
+    'volunteer_hours': ('id', ['description']),
+}
+
+
+def create_search_triggers(cursor, table):
+    key, columns = SEARCHED_COLUMNS[table]
+    fts = f'{table}_fts'
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    insert = f"INSERT INTO {fts} (rowid, {names}) VALUES (new.{key}, {new_values});"
+    delete = f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.{key}, {old_values});"
+    cursor.execute(f'''
+        CREATE TRIGGER {fts}_insert AFTER INSERT ON {table}
+        WHEN NOT EXISTS (SELECT 1 FROM rollup_deferred)
+        BEGIN {insert} END
+    ''')
+    cursor.execute(f'CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END')
+    cursor.execute(f'CREATE TRIGGER {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN {delete} {insert} END')
+
+
+def rebuild_search_index(cursor):
+    cursor.execute("INSERT INTO volunteers_fts (volunteers_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO volunteer_hours_fts (volunteer_hours_fts) VALUES ('rebuild')")
+
+
+def create_change_log(cursor):
+    # Append-only log of every volunteer and hours change, for merging copies
+    # of the database kept at different sites. A change is identified by its
+    # hybrid logical clock value and the id of the site that made it. Shifts
+    # remember the change that logged them; shifts from before the log
+    # (sync_hlc NULL) are the baseline every site started from. sync_site
+    # holds this copy's site id, which must be changed (db_tools.py sync-site
+    # --new) whenever the file is copied to another laptop.
+    cursor.execute('CREATE TABLE sync_site (site_id TEXT NOT NULL)')
+    cursor.execute('INSERT INTO sync_site (site_id) VALUES (?)', (new_site_id(),))
+    cursor.execute('''
+        CREATE TABLE change_log (
+            hlc INTEGER NOT NULL,
+            site_id TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            op TEXT NOT NULL,
+            data TEXT,
+            PRIMARY KEY (hlc, site_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX idx_change_log_site ON change_log (site_id, hlc)')
+    cursor.execute('CREATE INDEX idx_change_log_entity ON change_log (entity, entity_id, hlc)')
+    cursor.execute('ALTER TABLE volunteer_hours ADD COLUMN sync_hlc INTEGER')
+    cursor.execute('ALTER TABLE volunteer_hours ADD COLUMN sync_site TEXT')
+    cursor.execute('CREATE UNIQUE INDEX idx_volunteer_hours_sync ON volunteer_hours (sync_hlc, sync_site)')
+
+
+def new_site_id():
+    # 48 random bits, like the first 12 hex digits of a uuid4, without
+    # importing uuid (and platform) on every start.
+    return os.urandom(6).hex()
+
+
+# volunteer_hours_quarantine.reason for shifts quarantined for their date.
+BAD_DATE = "date is not a real YYYY-MM-DD date"
+
+
+def store_days_as_ordinals(cursor):
+    # Replaces the free-text volunteer_hours.date with day, an INTEGER day
+    # number (see DAY_TEXT), so date ranges are integer range scans of an
+    # index. Shifts whose date is not a real YYYY-MM-DD date cannot be
+    # placed in any range; they move, unchanged, to
+    # volunteer_hours_quarantine for someone to correct and log again.
+    # SQLite cannot change a column's type, so volunteer_hours is rebuilt
+    # and its indexes and triggers recreated; the rollups and the shift
+    # search index are rebuilt without the quarantined shifts.
+    cursor.execute('''
+        CREATE TABLE volunteer_hours_quarantine (
+            id INTEGER PRIMARY KEY,
+            volunteer_id TEXT NOT NULL REFERENCES volunteers(id) ON DELETE CASCADE,
+            date TEXT,
+            hours_worked REAL,
+            description TEXT,
+            sync_hlc INTEGER,
+            sync_site TEXT,
+            reason TEXT NOT NULL,
+            quarantined_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX idx_hours_quarantine_sync ON volunteer_hours_quarantine (sync_hlc, sync_site)')
+    day = TEXT_DAY.format(text='date')
+    cursor.execute(f'''
+        INSERT INTO volunteer_hours_quarantine
+            (id, volunteer_id, date, hours_worked, description, sync_hlc, sync_site, reason, quarantined_at)
+        SELECT id, volunteer_id, date, hours_worked, description, sync_hlc, sync_site, ?, ?
+        FROM volunteer_hours WHERE {day} IS NULL
+    ''', (BAD_DATE, time.time()))
+    cursor.execute('''
+        CREATE TABLE volunteer_hours_new (
+            id INTEGER PRIMARY KEY,
+            volunteer_id TEXT NOT NULL REFERENCES volunteers(id) ON DELETE CASCADE,
+            day INTEGER NOT NULL,
+            hours_worked REAL,
+            description TEXT,
+            sync_hlc INTEGER,
+            sync_site TEXT
+        )
+    ''')
+    cursor.execute(f'''
+        INSERT INTO volunteer_hours_new (id, volunteer_id, day, hours_worked, description, sync_hlc, sync_site)
+        SELECT id, volunteer_id, {day}, hours_worked, description, sync_hlc, sync_site
+        FROM volunteer_hours WHERE {day} IS NOT NULL
+    ''')
+    cursor.execute('DROP TABLE volunteer_hours')
+    cursor.execute('ALTER TABLE volunteer_hours_new RENAME TO volunteer_hours')
+    cursor.execute('CREATE INDEX idx_volunteer_hours_volunteer_day ON volunteer_hours (volunteer_id, day)')
+    cursor.execute('CREATE INDEX idx_volunteer_hours_day ON volunteer_hours (day)')
+    cursor.execute('CREATE UNIQUE INDEX idx_volunteer_hours_sync ON volunteer_hours (sync_hlc, sync_site)')
+    create_rollup_triggers(cursor)
+    rebuild_rollups(cursor)
+    create_search_triggers(cursor, 'volunteer_hours')
+    cursor.execute("INSERT INTO volunteer_hours_fts (volunteer_hours_fts) VALUES ('rebuild')")
+
+
+def create_import_checkpoints(cursor):
+    # Progress of resumable imports (import_data.py), as JSON. A checkpoint
+    # is saved in the same transaction as the rows it accounts for.
+    cursor.execute('''
+        CREATE TABLE import_checkpoints (
+            name TEXT PRIMARY KEY,
+            checkpoint TEXT NOT NULL
+        )
+    ''')
+
+
+def cover_volunteer_hours(cursor):
+    # Rebuilds the (volunteer_id, day) index as (volunteer_id, day, id,
+    # hours_worked): the same order, so a volunteer's history still pages by
+    # (day, id) straight off it, but per-volunteer totals can be summed from
+    # the index alone. The report batch shards by ranges of volunteer id,
+    # and each shard then reads only its own slice of this index.
+    cursor.execute('DROP INDEX idx_volunteer_hours_volunteer_day')
+    cursor.execute('CREATE INDEX idx_volunteer_hours_volunteer_day ON volunteer_hours (volunteer_id, day, id, hours_worked)')
+
+
+# Ordered list of (version, description, step). Steps receive a cursor and run
+# inside the upgrade transaction together with the schema_version bookkeeping.
+# Never edit a released step; append a new one instead.
+MIGRATIONS = [
+    (1, "volunteers and volunteer_hours tables", create_base_tables),
+    (2, "surrogate key, indexes and enforced foreign key on volunteer_hours", index_volunteer_hours),
+    (3, "name and email indexes for paginated reports", index_volunteer_sort_keys),
+    (4, "incrementally maintained hours rollup tables", create_hours_rollups),
+    (5, "skills and volunteer_skills tables replace the comma-joined skills column", normalize_skills),
+    (6, "full-text search over volunteers and shift descriptions", create_search_index),
+    (7, "change log for merging copies of the database from different sites", create_change_log),
+    (8, "shift dates stored as integer day numbers; unparsable ones quarantined", store_days_as_ordinals),
+    (9, "table of shifts whose volunteer did not exist, for files upgraded before it was kept", create_orphans_table),
+    (10, "import checkpoints kept in the database, committed with the imported rows", create_import_checkpoints),
+    (11, "a zero hours_totals row for every volunteer without shifts", total_every_volunteer),
+    (12, "one-letter prefixes in the search indexes", index_one_letter_prefixes),
+    (13, "hours_worked covered by the volunteer and day index", cover_volunteer_hours),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at REAL
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def migrate(conn):
+    # PRAGMA user_version mirrors the newest applied step. It lives in the
+    # file header, so an up-to-date database is recognised with one read and
+    # no DDL; files upgraded before it was kept get it set here once.
+    if conn.execute('PRAGMA user_version').fetchone()[0] == LATEST_VERSION:
+        return LATEST_VERSION
+    version = current_version(conn)
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    if not pending:
+        if version == LATEST_VERSION:
+            conn.execute(f'PRAGMA user_version={version}')
+            conn.commit()
+        return version
+
+    isolation_level = conn.isolation_level
+    foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+    conn.commit()
+    conn.isolation_level = None
+    # Foreign keys must be off while tables are rebuilt. All pending steps run
+    # in one transaction and are verified with foreign_key_check before commit,
+    # so a failed upgrade leaves the file exactly as it was.
+    conn.execute('PRAGMA foreign_keys=OFF')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        try:
+            for version, description, step in pending:
+                step(cursor)
+                cursor.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                               (version, description, time.time()))
+            if cursor.execute('PRAGMA foreign_key_check').fetchone():
+                raise RuntimeError(f"Migration to version {version} left dangling foreign keys")
+            cursor.execute(f'PRAGMA user_version={version}')
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+    finally:
+        conn.execute(f'PRAGMA foreign_keys={"ON" if foreign_keys else "OFF"}')
+        conn.isolation_level = isolation_level
+    return version
@@ -0,0 +1,176 @@
+import os
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from urllib.request import pathname2url
+
+from migrations import ROLLUP_MONTH, DAY_TEXT
+
+# Runs the year-end aggregations over volunteer_hours in parallel. The table
+# is split into shards, either by ranges of volunteer id or by ranges of
+# shift id; either way a shard reads one contiguous slice of an index or of
+# the table. Every shard is aggregated in its own process over a read-only
+# connection and the partial results are merged here. All aggregates are
+# sums, counts, minima and maxima, so they merge the same way whichever way
+# the table was sharded. Hours by skill are derived from the merged
+# per-volunteer totals instead of a second pass over the shifts.
+
+Shard = namedtuple('Shard', ['kind', 'low', 'high'])
+VolunteerTotal = namedtuple('VolunteerTotal', ['volunteer_id', 'name', 'total_hours', 'shift_count', 'first_date', 'last_date'])
+GroupTotal = namedtuple('GroupTotal', ['key', 'total_hours', 'shift_count'])
+
+SHARD_KINDS = ('volunteer', 'rowid')
+SHARD_COLUMNS = {'volunteer': 'vh.volunteer_id', 'rowid': 'vh.id'}
+REPORTS = ('volunteers', 'months', 'skills')
+
+# Per-shard queries. Grouped by volunteer, they read the covering
+# (volunteer_id, day, id, hours_worked) index in order and need no sort.
+AGGREGATIONS = {
+    'volunteers': f'''
+        SELECT vh.volunteer_id, TOTAL(vh.hours_worked), COUNT(*),
+               {DAY_TEXT.format(day='MIN(vh.day)')}, {DAY_TEXT.format(day='MAX(vh.day)')}
+        FROM volunteer_hours vh WHERE {{where}} GROUP BY vh.volunteer_id
+    ''',
+    'months': f'''
+        SELECT {ROLLUP_MONTH.format(row='vh')}, TOTAL(vh.hours_worked), COUNT(*)
+        FROM volunteer_hours vh WHERE {{where}} GROUP BY 1
+    ''',
+}
+
+
+def connect_read_only(db_path):
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+
+
+def volunteer_shards(conn, count):
+    # Splits volunteer ids into ranges holding about the same number of
+    # shifts, counted from the rollup table. No volunteer is in two shards,
+    # so their per-volunteer partials never need merging.
+    total = conn.execute('SELECT TOTAL(shift_count) FROM volunteer_hours_totals').fetchone()[0]
+    bounds = []
+    seen = 0
+    for volunteer_id, shifts in conn.execute(
+            'SELECT volunteer_id, shift_count FROM volunteer_hours_totals WHERE shift_count > 0 ORDER BY volunteer_id'):
+        if len(bounds) < count - 1 and seen >= total * (len(bounds) + 1) / count:
+            bounds.append(volunteer_id)
+        seen += shifts
+    return edges_to_shards('volunteer', bounds)
+
+
+def rowid_shards(conn, count):
+    # Splits the shift id range into equal spans, each a slice of the
+    # table's own b-tree. A volunteer's shifts land in several shards, so
+    # every shard returns a row for most volunteers and more merging is
+    # left for the parent than with volunteer shards.
+    low, high = conn.execute('SELECT MIN(id), MAX(id) FROM volunteer_hours').fetchone()
+    bounds = [] if low is None else sorted({low + (high - low + 1) * number // count for number in range(1, count)})
+    return edges_to_shards('rowid', bounds)
+
+
+def edges_to_shards(kind, bounds):
+    edges = [None] + bounds + [None]
+    return [Shard(kind, low, high) for low, high in zip(edges, edges[1:])]
+
+
+def shard_filter(shard):
+    column = SHARD_COLUMNS[shard.kind]
+    clauses = []
+    params = []
+    if shard.low is not None:
+        clauses.append(f'{column} >= ?')
+        params.append(shard.low)
+    if shard.high is not None:
+        clauses.append(f'{column} < ?')
+        params.append(shard.high)
+    return ' AND '.join(clauses) or '1', params
+
+
+def aggregate_shard(db_path, shard, aggregations):
+    # Runs in a worker process; returns {aggregation: {key: [values...]}}.
+    conn = connect_read_only(db_path)
+    try:
+        where, params = shard_filter(shard)
+        return {name: {row[0]: list(row[1:]) for row in conn.execute(AGGREGATIONS[name].format(where=where), params)}
+                for name in aggregations}
+    finally:
+        conn.close()
+
+
+def merge_values(current, values):
+    # [hours, shifts] plus, for volunteers, [first date, last date]. Every
+    # partial row stands for at least one shift, so its dates are never NULL,
+    # and YYYY-MM-DD text orders like the dates themselves.
+    current[0] += values[0]
+    current[1] += values[1]
+    if len(current) > 2:
+        if values[2] < current[2]:
+            current[2] = values[2]
+        if values[3] > current[3]:
+            current[3] = values[3]
+
+
+def add_to(totals, key, values):
+    if key in totals:
+        merge_values(totals[key], values)
+    else:
+        totals[key] = list(values)
+
+
+def merge_partials(partials, aggregations):
+    merged = {name: {} for name in aggregations}
+    for partial in partials:
+        for name in aggregations:
+            totals = merged[name]
+            for key, values in partial[name].items():
+                add_to(totals, key, values)
+    return merged
+
+
+def run_batch(db_path, reports=REPORTS, shard_by='volunteer', shards=None, workers=None):
+    # Returns {report: rows}: VolunteerTotal rows for 'volunteers' (sorted by
+    # id) and GroupTotal rows for 'months' and 'skills' (sorted by key).
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers
+    aggregations = [name for name in AGGREGATIONS
+                    if name in reports or (name == 'volunteers' and 'skills' in reports)]
+    conn = connect_read_only(db_path)
+    try:
+        shard_list = volunteer_shards(conn, shards) if shard_by == 'volunteer' else rowid_shards(conn, shards)
+        if workers == 1:
+            partials = [aggregate_shard(db_path, shard, aggregations) for shard in shard_list]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                partials = list(executor.map(aggregate_shard, [db_path] * len(shard_list), shard_list,
+                                             [aggregations] * len(shard_list)))
+        merged = merge_partials(partials, aggregations)
+
+        results = {}
+        volunteers = merged.get('volunteers', {})
+        if 'volunteers' in reports:
+            names = dict(conn.execute('SELECT id, name FROM volunteers'))
+            results['volunteers'] = [VolunteerTotal(key, names.get(key), *volunteers[key]) for key in sorted(volunteers)]
+        if 'months' in reports:
+            months = merged['months']
+            results['months'] = [GroupTotal(key, *months[key]) for key in sorted(months)]
+        if 'skills' in reports:
+            skills = {}
+            for volunteer_id, skill in conn.execute(
+                    'SELECT vs.volunteer_id, s.name FROM volunteer_skills vs JOIN skills s ON s.id = vs.skill_id'):
+                if volunteer_id in volunteers:
+                    add_to(skills, skill, volunteers[volunteer_id][:2])
+            results['skills'] = [GroupTotal(key, *skills[key]) for key in sorted(skills, key=str.lower)]
+        return results
+    finally:
+        conn.close()
+
+
+def batch_report_lines(report, rows):
+    if report == 'volunteers':
+        yield "Volunteer Hours (year-end)\n\n"
+        for row in rows:
+            yield (f"ID: {row.volunteer_id}, Name: {row.name}, Total Hours: {row.total_hours}, "
+                   f"Shifts: {row.shift_count}, First: {row.first_date}, Last: {row.last_date}\n")
+    else:
+        yield f"Hours by {report[:-1]}\n\n"
+        for row in rows:
+            yield f"{row.key}: {row.total_hours} hours, {row.shift_count} shifts\n"
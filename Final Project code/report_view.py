@@ -0,0 +1,135 @@
+import tkinter as tk
+from collections import deque
+from tkinter import ttk
+
+from database_handler import REPORT_PAGE_SIZE
+
+# Pages of rows kept in the Treeview at once.
+WINDOW_PAGES = 5
+
+
+class ReportView(tk.Frame):
+    # A Treeview that shows a window of at most window_pages keyset pages.
+    # Scrolling near the bottom appends the next page and evicts rows from
+    # the top; scrolling near the top fetches the previous page again (the
+    # same query, in the opposite order, from the first row shown) and
+    # evicts rows from the bottom. fetch_page(sort, descending, after, limit,
+    # on_rows, on_failed) starts the query and calls on_rows(rows) on the Tk
+    # thread when done, or on_failed() if the query failed or was cancelled.
+    # columns is a list of (key, heading, sortable); one of the keys must be
+    # 'id' because it is the tie-breaker for keyset pagination.
+    def __init__(self, master, columns, fetch_page, sort='id', page_size=REPORT_PAGE_SIZE,
+                 window_pages=WINDOW_PAGES, **kwargs):
+        super().__init__(master, **kwargs)
+        self.columns = columns
+        self.keys = [key for key, _, _ in columns]
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.window_rows = page_size * window_pages
+        self.sort = sort
+        self.descending = False
+        # (item, (sort value, id)) for every row shown, top to bottom.
+        self.shown = deque()
+        self.at_start = True
+        self.exhausted = False
+        self.loading = False
+        self.generation = 0
+
+        self.tree = ttk.Treeview(self, columns=self.keys, show='headings')
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_scroll)
+        for key, heading, sortable in columns:
+            command = (lambda key=key: self.sort_by(key)) if sortable else ''
+            self.tree.heading(key, text=heading, command=command)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        self.update_headings()
+        self.load_page()
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) > 0.9:
+            self.load_page()
+        if float(first) < 0.1:
+            self.load_page(backwards=True)
+
+    def load_page(self, backwards=False):
+        if self.loading or (self.at_start if backwards else self.exhausted):
+            return
+        if backwards:
+            after = self.shown[0][1]
+        else:
+            after = self.shown[-1][1] if self.shown else None
+        self.loading = True
+        generation = self.generation
+        self.fetch_page(self.sort, self.descending != backwards, after, self.page_size,
+                        lambda rows: self.show_page(generation, rows, backwards), lambda: self.page_failed(generation))
+
+    def page_failed(self, generation):
+        # Lets the next scroll ask for the same page again.
+        if generation == self.generation:
+            self.loading = False
+
+    def show_page(self, generation, rows, backwards=False):
+        # Drop pages requested before a re-sort or after the view was closed.
+        if generation != self.generation or not self.winfo_exists():
+            return
+        self.loading = False
+        top = self.top_row()
+        if backwards:
+            # rows run away from the first row shown, so each goes above the last.
+            for row in rows:
+                self.shown.appendleft((self.tree.insert('', 0, values=self.display_values(row)), self.row_key(row)))
+            self.at_start = len(rows) < self.page_size
+            top += len(rows)
+            evicted = [self.shown.pop()[0] for _ in range(len(self.shown) - self.window_rows)]
+            if evicted:
+                self.exhausted = False
+        else:
+            for row in rows:
+                self.shown.append((self.tree.insert('', tk.END, values=self.display_values(row)), self.row_key(row)))
+            self.exhausted = len(rows) < self.page_size
+            evicted = [self.shown.popleft()[0] for _ in range(len(self.shown) - self.window_rows)]
+            if evicted:
+                self.at_start = False
+                top -= len(evicted)
+        if evicted:
+            self.tree.delete(*evicted)
+        # Keep the rows the user was looking at in place.
+        if rows and self.shown:
+            self.tree.yview_moveto(max(top, 0) / len(self.shown))
+
+    def top_row(self):
+        # Index of the first visible row.
+        return round(float(self.tree.yview()[0]) * len(self.shown)) if self.shown else 0
+
+    def display_values(self, row):
+        return ['' if value is None else value for value in row]
+
+    def row_key(self, row):
+        return (row[self.keys.index(self.sort)], row[self.keys.index('id')])
+
+    def sort_by(self, key):
+        if key == self.sort:
+            self.descending = not self.descending
+        else:
+            self.sort = key
+            self.descending = False
+        self.reload()
+
+    def reload(self):
+        self.generation += 1
+        self.tree.delete(*(item for item, _ in self.shown))
+        self.shown.clear()
+        self.at_start = True
+        self.exhausted = False
+        self.loading = False
+        self.update_headings()
+        self.load_page()
+        self.tree.yview_moveto(0)
+
+    def update_headings(self):
+        for key, heading, _ in self.columns:
+            if key == self.sort:
+                heading += ' \u25bc' if self.descending else ' \u25b2'
+            self.tree.heading(key, text=heading)
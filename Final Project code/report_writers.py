@@ -0,0 +1,29 @@
+import tkinter as tk
+from itertools import islice
+
+
+def write_report(lines, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+
+def stream_to_text(text_widget, lines, batch_size=500, on_done=None):
+    # Inserts the report a batch at a time between Tk events so the window
+    # stays responsive; stops (and closes the generator) if the widget is
+    # destroyed before the report is finished.
+    lines = iter(lines)
+
+    def insert_batch():
+        if not text_widget.winfo_exists():
+            close = getattr(lines, 'close', None)
+            if close:
+                close()
+            return
+        chunk = ''.join(islice(lines, batch_size))
+        if chunk:
+            text_widget.insert(tk.END, chunk)
+            text_widget.after(1, insert_batch)
+        elif on_done:
+            on_done()
+
+    insert_batch()
@@ -0,0 +1,35 @@
+import re
+from functools import lru_cache
+
+# sqlite3 keeps a per-connection cache of compiled statements keyed by the
+# exact SQL text, so one statement must always be spelled the same way.
+# Every statement DatabaseHandler runs goes through canonical(), and the
+# fixed ones are registered here under a name that diagnostics can report.
+
+STATEMENT_CACHE_SIZE = 512
+
+STATEMENTS = {}
+STATEMENT_NAMES = {}
+
+WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def canonical(sql):
+    # Collapses runs of whitespace (none of our string literals contain any)
+    # and trims the ends.
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def register(name, sql):
+    sql = canonical(sql)
+    if STATEMENTS.get(name, sql) != sql:
+        raise ValueError(f"Statement {name!r} is already registered with different SQL")
+    STATEMENTS[name] = sql
+    STATEMENT_NAMES[sql] = name
+    return sql
+
+
+def statement_name(sql):
+    # The registered name of a canonical statement, or None for ad hoc SQL.
+    return STATEMENT_NAMES.get(sql)
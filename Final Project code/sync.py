@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from collections import namedtuple
+
+# Merging copies of volunteers.db kept at sites without a network. Every
+# change DatabaseHandler makes is appended to change_log, stamped with a
+# hybrid logical clock (HLC) value and the site id. A site exports the
+# changes another copy has not seen to a file; importing it adds the unseen
+# changes to the log and rebuilds the affected volunteers from the log, so
+# every copy that has seen the same changes ends up with the same data,
+# whatever order the files were imported in:
+#   - a volunteer's fields come from its latest change (last write wins,
+#     ties broken by site id); if that change is a removal it stays removed;
+#   - a volunteer's shifts are the ones logged after its latest removal.
+#
+# A change file is JSON lines: a header object with the exporting site and
+# its version vector (the newest HLC it holds from each site), then one
+# [hlc, site_id, entity, entity_id, op, data] array per change.
+
+Change = namedtuple('Change', ['hlc', 'site_id', 'entity', 'entity_id', 'op', 'data'])
+SyncResult = namedtuple('SyncResult', ['received', 'new', 'volunteers_rebuilt'])
+
+SYNC_FORMAT = 'volunteers-sync'
+SYNC_FORMAT_VERSION = 1
+CHANGE_KINDS = {('volunteer', 'put'), ('volunteer', 'delete'), ('hours', 'put')}
+# An HLC value is the wall clock in milliseconds shifted left by this many
+# bits, plus a counter for changes made within the same millisecond.
+COUNTER_BITS = 16
+
+
+def physical_time():
+    return int(time.time() * 1000) << COUNTER_BITS
+
+
+class HybridClock:
+    # Never goes backwards and always moves past every value it has seen, so
+    # a change made here after importing another site's change is ordered
+    # after it even if that site's wall clock was ahead.
+    def __init__(self, last=0):
+        self.last = last
+        self.lock = threading.Lock()
+
+    def now(self):
+        with self.lock:
+            self.last = max(physical_time(), self.last + 1)
+            return self.last
+
+    def reserve(self, count):
+        # The first of `count` consecutive values, all handed out at once.
+        with self.lock:
+            first = max(physical_time(), self.last + 1)
+            self.last = first + count - 1
+            return first
+
+    def observe(self, hlc):
+        with self.lock:
+            self.last = max(self.last, hlc)
+
+
+def export_changes(db_handler, path, since=None):
+    # Writes every change newer than the version vector `since` (all of them
+    # if None) and returns how many were written.
+    count = 0
+    header = {'format': SYNC_FORMAT, 'version': SYNC_FORMAT_VERSION,
+              'site_id': db_handler.site_id, 'vector': db_handler.version_vector()}
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header) + '\n')
+        for change in db_handler.iter_changes(since or {}):
+            f.write(json.dumps(change) + '\n')
+            count += 1
+    return count
+
+
+def read_header(path):
+    with open(path, encoding='utf-8') as f:
+        return check_header(path, f.readline())
+
+
+def check_header(path, line):
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('format') != SYNC_FORMAT:
+        raise ValueError(f"{path} is not a volunteer sync file")
+    if header.get('version') != SYNC_FORMAT_VERSION:
+        raise ValueError(f"{path} is sync format version {header.get('version')}; this program reads version {SYNC_FORMAT_VERSION}")
+    return header
+
+
+def read_changes(path):
+    with open(path, encoding='utf-8') as f:
+        header = check_header(path, f.readline())
+        changes = []
+        for number, line in enumerate(f, start=2):
+            if not line.strip():
+                continue
+            try:
+                change = Change(*json.loads(line))
+            except (ValueError, TypeError):
+                raise ValueError(f"{path}:{number}: not a change record")
+            if (change.entity, change.op) not in CHANGE_KINDS or not isinstance(change.hlc, int):
+                raise ValueError(f"{path}:{number}: unknown change {change.entity} {change.op}")
+            changes.append(change)
+    return header, changes
+
+
+def import_changes(db_handler, paths):
+    # Reads every file before touching the database, then merges all of
+    # them in one transaction.
+    changes = []
+    for path in paths:
+        header, file_changes = read_changes(path)
+        if header['site_id'] == db_handler.site_id:
+            raise ValueError(f"{path} was exported under this database's own site id {db_handler.site_id}; "
+                             "give every copy its own id with: db_tools.py sync-site --new")
+        changes.extend(file_changes)
+    return db_handler.apply_changes(changes)
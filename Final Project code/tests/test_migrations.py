@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+from database_handler import DatabaseHandler
+from migrations import create_base_tables, migrate, BAD_DATE, LATEST_VERSION, NO_VOLUNTEER
+
+# Builds a file with the version 1 schema, as the first release of the app
+# left it (no schema_version table, skills as comma-joined text, shift
+# dates as free text), and upgrades it through every step in one go.
+
+VOLUNTEERS = [
+    ('V1', 'Ann Smith', 'ann@example.org', '555-0101', 'cooking, Driving,,COOKING'),
+    ('V2', 'Bob Jones', 'bob@example.org', '555-0102', None),
+    ('V3', 'Cy Young', 'cy@example.org', '555-0103', 'first aid'),
+]
+SHIFTS = [
+    ('V1', '2024-01-05', 2.5, 'food bank'),
+    ('V1', '2024-01-20', 3.0, 'kitchen'),
+    ('V1', '2024-02-29', 1.5, 'leap day'),
+    ('V2', '2023-12-31', 4.0, 'garden'),
+    ('V2', '2024-02-30', 2.0, 'no such day'),
+    ('V3', '05/01/2024', 1.0, 'wrong format'),
+    ('V3', None, 1.0, 'no date'),
+    ('GONE', '2024-01-06', 6.0, 'volunteer removed'),
+]
+
+
+def columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def index_columns(conn, index):
+    return [row[2] for row in conn.execute(f'PRAGMA index_info({index})')]
+
+
+@pytest.fixture
+def upgraded(tmp_path):
+    path = str(tmp_path / 'version1.db')
+    conn = sqlite3.connect(path)
+    create_base_tables(conn.cursor())
+    conn.executemany('INSERT INTO volunteers VALUES (?, ?, ?, ?, ?)', VOLUNTEERS)
+    conn.executemany('INSERT INTO volunteer_hours VALUES (?, ?, ?, ?)', SHIFTS)
+    conn.commit()
+    assert migrate(conn) == LATEST_VERSION
+    yield path, conn
+    conn.close()
+
+
+def test_final_schema(upgraded):
+    path, conn = upgraded
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'volunteers', 'volunteer_hours', 'volunteer_hours_totals', 'volunteer_hours_monthly', 'skills',
+            'volunteer_skills', 'volunteers_fts', 'volunteer_hours_fts', 'change_log', 'sync_site',
+            'volunteer_hours_orphans', 'volunteer_hours_quarantine', 'import_checkpoints',
+            'rollup_deferred', 'schema_version'} <= tables
+    assert columns(conn, 'volunteers') == ['id', 'name', 'email', 'contact_info']
+    assert columns(conn, 'volunteer_hours') == ['id', 'volunteer_id', 'day', 'hours_worked', 'description',
+                                                'sync_hlc', 'sync_site']
+    assert index_columns(conn, 'idx_volunteer_hours_volunteer_day') == ['volunteer_id', 'day', 'id', 'hours_worked']
+    assert index_columns(conn, 'idx_volunteer_hours_day') == ['day']
+    assert conn.execute('PRAGMA foreign_key_check').fetchall() == []
+    skills = conn.execute('''
+        SELECT vs.volunteer_id, s.name FROM volunteer_skills vs JOIN skills s ON s.id = vs.skill_id
+        ORDER BY vs.volunteer_id, vs.position
+    ''').fetchall()
+    assert skills == [('V1', 'cooking'), ('V1', 'Driving'), ('V3', 'first aid')]
+
+
+def test_shifts_that_cannot_be_kept_are_set_aside(upgraded):
+    path, conn = upgraded
+    orphans = conn.execute('SELECT volunteer_id, date, hours_worked, reason FROM volunteer_hours_orphans').fetchall()
+    assert orphans == [('GONE', '2024-01-06', 6.0, NO_VOLUNTEER)]
+    quarantined = conn.execute('''
+        SELECT volunteer_id, date, description, reason FROM volunteer_hours_quarantine ORDER BY id
+    ''').fetchall()
+    assert quarantined == [('V2', '2024-02-30', 'no such day', BAD_DATE), ('V3', '05/01/2024', 'wrong format', BAD_DATE),
+                           ('V3', None, 'no date', BAD_DATE)]
+    kept = conn.execute('''
+        SELECT volunteer_id, date(day + 1721424.5), hours_worked FROM volunteer_hours ORDER BY id
+    ''').fetchall()
+    assert kept == [('V1', '2024-01-05', 2.5), ('V1', '2024-01-20', 3.0), ('V1', '2024-02-29', 1.5),
+                    ('V2', '2023-12-31', 4.0)]
+
+
+def test_rollups_match_the_kept_shifts(upgraded):
+    path, conn = upgraded
+    db_handler = DatabaseHandler(path)
+    try:
+        assert db_handler.check_rollups() == []
+        totals = db_handler.fetch_all('SELECT volunteer_id, total_hours, shift_count FROM volunteer_hours_totals ORDER BY 1')
+        assert [tuple(row) for row in totals] == [('V1', 7.0, 3), ('V2', 4.0, 1), ('V3', 0.0, 0)]
+    finally:
+        db_handler.close()
+
+
+def test_versions_agree(upgraded):
+    path, conn = upgraded
+    applied = [row[0] for row in conn.execute('SELECT version FROM schema_version ORDER BY version')]
+    assert applied == list(range(1, LATEST_VERSION + 1))
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == LATEST_VERSION
+    assert migrate(conn) == LATEST_VERSION
+    assert conn.execute('SELECT COUNT(*) FROM schema_version').fetchone()[0] == LATEST_VERSION
@@ -0,0 +1,139 @@
+import pytest
+
+from database_handler import DatabaseHandler
+from sync import export_changes, import_changes
+from volunteer import Volunteer
+from volunteer_hours import VolunteerHours
+
+# Two copies of the database at different sites, merged through change
+# files the way db_tools.py sync-export and sync-import do it. A site's
+# clock can be pushed ahead with observe() so a change made earlier in
+# wall time still carries the later HLC.
+
+CLOCK_LEAD = 1 << 32
+
+
+@pytest.fixture
+def sites(tmp_path):
+    site_a = DatabaseHandler(str(tmp_path / 'a.db'), cache_size=0)
+    site_b = DatabaseHandler(str(tmp_path / 'b.db'), cache_size=0)
+    yield site_a, site_b
+    site_a.close()
+    site_b.close()
+
+
+def send(source, target, path):
+    # Exports what target has not seen and imports it there.
+    export_changes(source, str(path), target.version_vector())
+    return import_changes(target, [str(path)])
+
+
+def exchange(site_a, site_b, tmp_path):
+    send(site_a, site_b, tmp_path / 'a-to-b.jsonl')
+    send(site_b, site_a, tmp_path / 'b-to-a.jsonl')
+
+
+def snapshot(db_handler):
+    volunteers = [(v.id, v.name, v.email, v.contact_info, v.skills)
+                  for v in sorted(db_handler.get_all_volunteers(), key=lambda v: v.id)]
+    hours = db_handler.fetch_all('SELECT volunteer_id, day, hours_worked, description FROM volunteer_hours ORDER BY 1, 2, 4')
+    totals = db_handler.fetch_all('SELECT volunteer_id, total_hours, shift_count FROM volunteer_hours_totals ORDER BY 1')
+    return volunteers, [tuple(row) for row in hours], [tuple(row) for row in totals]
+
+
+def latest_hlc(db_handler, volunteer_id):
+    return db_handler.fetch_one("SELECT MAX(hlc) FROM change_log WHERE entity = 'volunteer' AND entity_id = ?",
+                                (volunteer_id,))[0]
+
+
+def test_two_sites_converge(sites, tmp_path):
+    site_a, site_b = sites
+    site_a.add_volunteer(Volunteer('V1', 'Ann', 'ann@example.org', '555-0101', ['cooking']))
+    site_a.add_volunteer_hours('V1', VolunteerHours('2024-03-01', 2.0, 'food bank'))
+    site_b.add_volunteer(Volunteer('V2', 'Bob', 'bob@example.org', '555-0102', ['driving', 'first aid']))
+    site_b.add_volunteer_hours('V2', VolunteerHours('2024-03-02', 3.5, 'deliveries'))
+    exchange(site_a, site_b, tmp_path)
+    site_b.add_volunteer_hours('V1', VolunteerHours('2024-03-09', 1.5, 'kitchen'))
+    site_a.update_volunteer(Volunteer('V2', 'Bob Jones', 'bob@example.org', '555-0102', ['driving']))
+    exchange(site_a, site_b, tmp_path)
+
+    assert snapshot(site_a) == snapshot(site_b)
+    volunteers, hours, totals = snapshot(site_a)
+    assert [v[:2] for v in volunteers] == [('V1', 'Ann'), ('V2', 'Bob Jones')]
+    assert totals == [('V1', 3.5, 2), ('V2', 3.5, 1)]
+    assert site_a.check_rollups() == [] and site_b.check_rollups() == []
+
+
+def test_reapplying_changes_is_idempotent(sites, tmp_path):
+    site_a, site_b = sites
+    site_a.add_volunteer(Volunteer('V1', 'Ann', 'ann@example.org', '555-0101', ['cooking']))
+    for day in ('2024-03-01', '2024-03-02'):
+        site_a.add_volunteer_hours('V1', VolunteerHours(day, 2.0, 'food bank'))
+    path = tmp_path / 'all.jsonl'
+    export_changes(site_a, str(path))
+    first = import_changes(site_b, [str(path), str(path)])
+    before = snapshot(site_b)
+    again = import_changes(site_b, [str(path), str(path)])
+
+    assert (first.received, first.new) == (6, 3)
+    assert (again.received, again.new, again.volunteers_rebuilt) == (6, 0, 0)
+    assert snapshot(site_b) == before == snapshot(site_a)
+    assert site_b.check_rollups() == []
+
+
+@pytest.mark.parametrize('later', ['a', 'b'])
+def test_concurrent_edits_resolve_by_hlc(sites, tmp_path, later):
+    site_a, site_b = sites
+    site_a.add_volunteer(Volunteer('V1', 'Ann', 'ann@example.org', '555-0101', ['cooking']))
+    send(site_a, site_b, tmp_path / 'a-to-b.jsonl')
+    # Site a edits first in wall time either way; only the HLC decides.
+    if later == 'a':
+        site_a.clock.observe(site_b.clock.now() + CLOCK_LEAD)
+    site_a.update_volunteer(Volunteer('V1', 'Ann from a', 'a@example.org', '555-0101', ['cooking']))
+    if later == 'b':
+        site_b.clock.observe(site_a.clock.now() + CLOCK_LEAD)
+    site_b.update_volunteer(Volunteer('V1', 'Ann from b', 'b@example.org', '555-0101', ['driving']))
+    exchange(site_a, site_b, tmp_path)
+
+    winner = ('Ann from a', 'a@example.org', ['cooking']) if later == 'a' else ('Ann from b', 'b@example.org', ['driving'])
+    for site in (site_a, site_b):
+        volunteer = site.get_volunteer_by_id('V1')
+        assert (volunteer.name, volunteer.email, volunteer.skills) == winner
+    assert latest_hlc(site_a, 'V1') == latest_hlc(site_b, 'V1')
+
+
+def test_update_after_removal_restores_without_old_shifts(sites, tmp_path):
+    site_a, site_b = sites
+    site_a.add_volunteer(Volunteer('V1', 'Ann', 'ann@example.org', '555-0101', ['cooking']))
+    site_a.add_volunteer_hours('V1', VolunteerHours('2024-03-01', 2.0, 'before removal'))
+    send(site_a, site_b, tmp_path / 'a-to-b.jsonl')
+    site_a.remove_volunteer('V1')
+    site_b.clock.observe(site_a.clock.now() + CLOCK_LEAD)
+    site_b.update_volunteer(Volunteer('V1', 'Ann again', 'ann@example.org', '555-0101', ['cooking']))
+    site_b.add_volunteer_hours('V1', VolunteerHours('2024-04-01', 1.0, 'after removal'))
+    exchange(site_a, site_b, tmp_path)
+
+    assert snapshot(site_a) == snapshot(site_b)
+    volunteers, hours, totals = snapshot(site_a)
+    assert [v[:2] for v in volunteers] == [('V1', 'Ann again')]
+    assert [row[3] for row in hours] == ['after removal']
+    assert totals == [('V1', 1.0, 1)]
+    assert site_a.check_rollups() == [] and site_b.check_rollups() == []
+
+
+def test_removal_after_update_wins(sites, tmp_path):
+    site_a, site_b = sites
+    site_a.add_volunteer(Volunteer('V1', 'Ann', 'ann@example.org', '555-0101', ['cooking']))
+    send(site_a, site_b, tmp_path / 'a-to-b.jsonl')
+    site_b.update_volunteer(Volunteer('V1', 'Ann updated', 'ann@example.org', '555-0101', ['cooking']))
+    site_b.add_volunteer_hours('V1', VolunteerHours('2024-03-01', 2.0, 'before removal'))
+    site_a.clock.observe(site_b.clock.now() + CLOCK_LEAD)
+    site_a.remove_volunteer('V1')
+    # Imported in either order, the removal carries the later HLC.
+    send(site_b, site_a, tmp_path / 'b-to-a.jsonl')
+    send(site_a, site_b, tmp_path / 'a-to-b-2.jsonl')
+
+    for site in (site_a, site_b):
+        assert site.get_volunteer_by_id('V1') is None
+        assert snapshot(site) == ([], [], [])
+        assert site.check_rollups() == []
@@ -0,0 +1,29 @@
+import math
+import re
+
+from hours_log import date_ordinal, NO_ORDINAL
+
+EMAIL = re.compile(r"[^@]+@[^@]+\.[^@]+")
+MAX_SHIFT_HOURS = 24
+
+
+def validate_not_empty(*args):
+    for arg in args:
+        if not arg:
+            return False
+    return True
+
+
+def validate_email(email):
+    return EMAIL.match(email) is not None
+
+
+def validate_date(date):
+    # Only real dates written exactly as YYYY-MM-DD.
+    return date_ordinal(date) != NO_ORDINAL
+
+
+def validate_hours(hours):
+    # A shift takes some time and fits in a day; float() also parses 'nan'
+    # and 'inf', which would poison every total they are added to.
+    return math.isfinite(hours) and 0 < hours <= MAX_SHIFT_HOURS
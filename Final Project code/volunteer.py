@@ -1,11 +1,16 @@
+from hours_log import HoursLog
+
+
 class Volunteer:
+    __slots__ = ('id', 'name', 'email', 'contact_info', 'skills', 'hours')
+
     def __init__(self, id, name, email, contact_info, skills):
         self.id = id
         self.name = name
         self.email = email
         self.contact_info = contact_info
         self.skills = skills
-        self.hours = []
+        self.hours = HoursLog()
 
     def add_hours(self, volunteer_hours):
         self.hours.append(volunteer_hours)
@@ -20,3 +25,15 @@ class Volunteer:
         if skills:
             self.skills = skills
 
+
+def clean_skills(skills):
+    # Strips blanks and drops empty or repeated (case-insensitive) skills,
+    # keeping the order the volunteer gave them in.
+    seen = set()
+    cleaned = []
+    for skill in skills:
+        skill = skill.strip()
+        if skill and skill.lower() not in seen:
+            seen.add(skill.lower())
+            cleaned.append(skill)
+    return cleaned
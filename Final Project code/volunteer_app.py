@@ -1,17 +1,43 @@
 import tkinter as tk
-from tkinter import messagebox
-from database_handler import DatabaseHandler
+from tkinter import messagebox, ttk
 from volunteer import Volunteer
 from volunteer_hours import VolunteerHours
+from validation import validate_not_empty, validate_email, validate_date, validate_hours, MAX_SHIFT_HOURS
+from report_writers import write_report, stream_to_text
+from volunteer_index import load_volunteer_index
+from volunteer_picker import VolunteerPicker
 
 class VolunteerApp:
-    def __init__(self, root):
-        self.db_handler = DatabaseHandler()
+    def __init__(self, root, db_file='volunteers.db', instrumentation=None):
         self.root = root
+        self.db_file = db_file
+        self.instrumentation = instrumentation
         self.root.title("Volunteer Tracking System")
+        self.screens = {}
+        self.search_after_id = None
+        self.search_future = None
+        self.volunteer_index = None
+        self.volunteer_index_loading = False
         self.standardize_ui()
+        self.create_status_bar()
+        self.worker = None
         self.create_main_menu()
 
+    @property
+    def db_worker(self):
+        # Started by the first job, so the main menu is drawn before the
+        # database is opened (and migrated, if it has to be) on its thread.
+        if self.worker is None:
+            from db_worker import DatabaseWorker
+            self.worker = DatabaseWorker(self.root, on_busy=self.set_busy, handler_factory=self.open_database)
+        return self.worker
+
+    def open_database(self):
+        # Runs on the worker thread, so importing database_handler is paid
+        # there too; jobs name its methods rather than importing it here.
+        from database_handler import DatabaseHandler
+        return DatabaseHandler(self.db_file, instrumentation=self.instrumentation)
+
     def standardize_ui(self):
         self.bg_color = "lightblue"
         self.font = ("Arial", 12)
@@ -19,29 +45,104 @@ class VolunteerApp:
         self.label_style = {"bg": self.bg_color, "font": self.font}
         self.root.configure(bg=self.bg_color)
 
+    def create_status_bar(self):
+        self.status_bar = tk.Frame(self.root, bg=self.bg_color)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_label = tk.Label(self.status_bar, text="", **self.label_style)
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(self.status_bar, text="Cancel", command=self.cancel_database_work, state=tk.DISABLED, **self.button_style)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5, pady=2)
+
+    def set_busy(self, busy):
+        self.status_label.config(text="Working..." if busy else "")
+        self.cancel_button.config(state=tk.NORMAL if busy else tk.DISABLED)
+        self.root.config(cursor="watch" if busy else "")
+
+    def cancel_database_work(self):
+        if self.worker is not None:
+            self.worker.cancel_all()
+
     def clear_frame(self):
+        # Cached screens are only hidden; anything else (e.g. report views)
+        # is destroyed so old widget trees do not pile up.
+        cached = set(self.screens.values())
         for widget in self.root.winfo_children():
-            widget.pack_forget()
-
-    def create_main_menu(self):
+            if widget is self.status_bar:
+                continue
+            if widget in cached:
+                widget.pack_forget()
+            else:
+                widget.destroy()
+
+    def show_screen(self, name, build):
+        # Each screen is built once, then re-shown with its entries cleared.
         self.clear_frame()
-        frame = tk.Frame(self.root, bg=self.bg_color)
+        frame = self.screens.get(name)
+        if frame is None:
+            frame = tk.Frame(self.root, bg=self.bg_color)
+            build(frame)
+            self.screens[name] = frame
+        else:
+            self.reset_entries(frame)
         frame.pack(expand=True, fill=tk.BOTH)
+        return frame
+
+    def reset_entries(self, widget):
+        for child in widget.winfo_children():
+            if isinstance(child, VolunteerPicker):
+                child.clear()
+            elif isinstance(child, tk.Entry):
+                child.delete(0, tk.END)
+            else:
+                self.reset_entries(child)
+
+    def load_volunteer_index(self):
+        # The picker index is built on the worker the first time a screen
+        # needs it and then kept current from the add/update/remove callbacks.
+        # Jobs run in order, so writes queued before the load are already in
+        # it and writes queued after it report back after it arrives.
+        if self.volunteer_index is None and not self.volunteer_index_loading:
+            self.volunteer_index_loading = True
+            self.db_worker.submit(load_volunteer_index, on_success=self.volunteer_index_loaded,
+                                  on_error=self.volunteer_index_failed)
+
+    def volunteer_index_loaded(self, index):
+        self.volunteer_index = index
+        self.volunteer_index_loading = False
+
+    def volunteer_index_failed(self, error):
+        self.volunteer_index_loading = False
+        self.db_worker.report_error(error)
+
+    def suggest_volunteers(self, text):
+        if self.volunteer_index is None:
+            return []
+        return self.volunteer_index.suggest(text)
+
+    def volunteer_picker(self, frame):
+        picker = VolunteerPicker(frame, self.suggest_volunteers, font=self.font, bg=self.bg_color)
+        picker.pack(padx=10)
+        return picker
+
+    def create_main_menu(self):
+        self.show_screen("main_menu", self.build_main_menu)
 
+    def build_main_menu(self, frame):
         tk.Label(frame, text="Main Menu", font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=20)
 
         tk.Button(frame, text="Add Volunteer", command=self.add_volunteer_menu, **self.button_style).pack(fill=tk.X, pady=5)
         tk.Button(frame, text="Update Volunteer", command=self.update_volunteer_menu, **self.button_style).pack(fill=tk.X, pady=5)
         tk.Button(frame, text="Remove Volunteer", command=self.remove_volunteer_menu, **self.button_style).pack(fill=tk.X, pady=5)
         tk.Button(frame, text="Log Hours", command=self.log_hours_menu, **self.button_style).pack(fill=tk.X, pady=5)
+        tk.Button(frame, text="Search", command=self.search_menu, **self.button_style).pack(fill=tk.X, pady=5)
         tk.Button(frame, text="Generate Reports", command=self.generate_reports_menu, **self.button_style).pack(fill=tk.X, pady=5)
+        tk.Button(frame, text="Diagnostics", command=self.diagnostics_menu, **self.button_style).pack(fill=tk.X, pady=5)
         tk.Button(frame, text="Exit", command=self.exit_app, **self.button_style).pack(fill=tk.X, pady=5)
 
     def add_volunteer_menu(self):
-        self.clear_frame()
-        frame = tk.Frame(self.root, bg=self.bg_color)
-        frame.pack(expand=True, fill=tk.BOTH)
+        self.show_screen("add_volunteer", self.build_add_volunteer_menu)
 
+    def build_add_volunteer_menu(self, frame):
         tk.Label(frame, text="Add New Volunteer", font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=20)
 
         tk.Label(frame, text="ID:", **self.label_style).pack(pady=5)
@@ -80,20 +181,23 @@ class VolunteerApp:
             return
 
         volunteer = Volunteer(id, name, email, contact_info, skills.split(','))
-        self.db_handler.add_volunteer(volunteer)
+        self.db_worker.submit('add_volunteer', volunteer, on_success=lambda result: self.volunteer_added(volunteer))
+
+    def volunteer_added(self, volunteer):
+        if self.volunteer_index is not None:
+            self.volunteer_index.add(volunteer.id, volunteer.name, volunteer.email)
         messagebox.showinfo("Success", "Volunteer added successfully!")
         self.create_main_menu()
 
     def update_volunteer_menu(self):
-        self.clear_frame()
-        frame = tk.Frame(self.root, bg=self.bg_color)
-        frame.pack(expand=True, fill=tk.BOTH)
+        self.load_volunteer_index()
+        self.show_screen("update_volunteer", self.build_update_volunteer_menu)
 
+    def build_update_volunteer_menu(self, frame):
         tk.Label(frame, text="Update Volunteer", font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=20)
 
-        tk.Label(frame, text="Enter ID of Volunteer to Update:", **self.label_style).pack()
-        id_entry = tk.Entry(frame)
-        id_entry.pack()
+        tk.Label(frame, text="Volunteer to Update (ID, name or email):", **self.label_style).pack()
+        id_entry = self.volunteer_picker(frame)
 
         search_button = tk.Button(frame, text="Search", command=lambda: self.search_volunteer(id_entry.get()), **self.button_style)
         search_button.pack()
@@ -102,40 +206,42 @@ class VolunteerApp:
         back_button.pack(pady=5)
 
     def search_volunteer(self, id):
-        volunteer = self.db_handler.get_volunteer_by_id(id)
+        self.db_worker.submit('get_volunteer_by_id', id, on_success=self.volunteer_found)
+
+    def volunteer_found(self, volunteer):
         if volunteer:
             self.update_volunteer_details(volunteer)
         else:
             messagebox.showerror("Error", "Volunteer not found!")
 
     def update_volunteer_details(self, volunteer):
-        self.clear_frame()
-        frame = tk.Frame(self.root, bg=self.bg_color)
-        frame.pack(expand=True, fill=tk.BOTH)
+        self.editing_volunteer_id = volunteer.id
+        self.show_screen("update_volunteer_details", self.build_update_volunteer_details)
+        for entry, value in zip(self.detail_entries, (volunteer.name, volunteer.email, volunteer.contact_info, ','.join(volunteer.skills))):
+            entry.insert(0, value)
 
+    def build_update_volunteer_details(self, frame):
         tk.Label(frame, text="Update Volunteer Details", font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=20)
 
         tk.Label(frame, text="Name:", **self.label_style).pack()
         name_entry = tk.Entry(frame)
-        name_entry.insert(0, volunteer.name)
         name_entry.pack()
 
         tk.Label(frame, text="Email:", **self.label_style).pack()
         email_entry = tk.Entry(frame)
-        email_entry.insert(0, volunteer.email)
         email_entry.pack()
 
         tk.Label(frame, text="Contact Info:", **self.label_style).pack()
         contact_entry = tk.Entry(frame)
-        contact_entry.insert(0, volunteer.contact_info)
         contact_entry.pack()
 
         tk.Label(frame, text="Skills (comma-separated):", **self.label_style).pack()
         skills_entry = tk.Entry(frame)
-        skills_entry.insert(0, ','.join(volunteer.skills))
         skills_entry.pack()
 
-        save_button = tk.Button(frame, text="Save", command=lambda: self.save_updated_volunteer(volunteer.id, name_entry.get(), email_entry.get(), contact_entry.get(), skills_entry.get()), **self.button_style)
+        self.detail_entries = [name_entry, email_entry, contact_entry, skills_entry]
+
+        save_button = tk.Button(frame, text="Save", command=lambda: self.save_updated_volunteer(self.editing_volunteer_id, name_entry.get(), email_entry.get(), contact_entry.get(), skills_entry.get()), **self.button_style)
         save_button.pack(pady=10)
 
         back_button = tk.Button(frame, text="Back", command=self.create_main_menu, **self.button_style)
@@ -151,20 +257,23 @@ class VolunteerApp:
             return
 
         volunteer = Volunteer(id, name, email, contact_info, skills.split(','))
-        self.db_handler.update_volunteer(volunteer)
+        self.db_worker.submit('update_volunteer', volunteer, on_success=lambda result: self.volunteer_updated(volunteer))
+
+    def volunteer_updated(self, volunteer):
+        if self.volunteer_index is not None:
+            self.volunteer_index.update(volunteer.id, volunteer.name, volunteer.email)
         messagebox.showinfo("Success", "Volunteer updated successfully!")
         self.create_main_menu()
 
     def remove_volunteer_menu(self):
-        self.clear_frame()
-        frame = tk.Frame(self.root, bg=self.bg_color)
-        frame.pack(expand=True, fill=tk.BOTH)
+        self.load_volunteer_index()
+        self.show_screen("remove_volunteer", self.build_remove_volunteer_menu)
 
+    def build_remove_volunteer_menu(self, frame):
         tk.Label(frame, text="Remove Volunteer", font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=20)
 
-        tk.Label(frame, text="Enter ID of Volunteer to Remove:", **self.label_style).pack()
-        id_entry = tk.Entry(frame)
-        id_entry.pack()
+        tk.Label(frame, text="Volunteer to Remove (ID, name or email):", **self.label_style).pack()
+        id_entry = self.volunteer_picker(frame)
 
         remove_button = tk.Button(frame, text="Remove", command=lambda: self.remove_volunteer(id_entry.get()), **self.button_style)
         remove_button.pack()
@@ -173,24 +282,26 @@ class VolunteerApp:
         back_button.pack(pady=5)
 
     def remove_volunteer(self, id):
-        volunteer = self.db_handler.get_volunteer_by_id(id)
-        if volunteer:
-            self.db_handler.remove_volunteer(id)
+        self.db_worker.submit(remove_existing_volunteer, id, on_success=lambda removed: self.volunteer_removed(id, removed))
+
+    def volunteer_removed(self, id, removed):
+        if removed:
+            if self.volunteer_index is not None:
+                self.volunteer_index.remove(id)
             messagebox.showinfo("Success", "Volunteer removed successfully!")
             self.create_main_menu()
         else:
             messagebox.showerror("Error", "Volunteer not found!")
 
     def log_hours_menu(self):
-        self.clear_frame()
-        frame = tk.Frame(self.root, bg=self.bg_color)
-        frame.pack(expand=True, fill=tk.BOTH)
+        self.load_volunteer_index()
+        self.show_screen("log_hours", self.build_log_hours_menu)
 
+    def build_log_hours_menu(self, frame):
         tk.Label(frame, text="Log Volunteer Hours", font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=20)
 
-        tk.Label(frame, text="Enter Volunteer ID:", **self.label_style).pack()
-        id_entry = tk.Entry(frame)
-        id_entry.pack()
+        tk.Label(frame, text="Volunteer (ID, name or email):", **self.label_style).pack()
+        id_entry = self.volunteer_picker(frame)
 
         tk.Label(frame, text="Date (YYYY-MM-DD):", **self.label_style).pack()
         date_entry = tk.Entry(frame)
@@ -211,68 +322,255 @@ class VolunteerApp:
         back_button.pack(pady=5)
 
     def log_hours(self, id, date, hours, description):
-        volunteer = self.db_handler.get_volunteer_by_id(id)
-        if volunteer:
-            if not self.validate_not_empty(date, hours, description):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-
-            try:
-                hours_worked = float(hours)
-            except ValueError:
-                messagebox.showerror("Error", "Hours worked must be a number!")
-                return
-
-            volunteer_hours = VolunteerHours(date, hours_worked, description)
-            self.db_handler.add_volunteer_hours(id, volunteer_hours)
+        if not self.validate_not_empty(date, hours, description):
+            messagebox.showerror("Error", "All fields are required!")
+            return
+
+        if not self.validate_date(date):
+            messagebox.showerror("Error", "Date must be a real date written as YYYY-MM-DD!")
+            return
+
+        try:
+            hours_worked = float(hours)
+        except ValueError:
+            messagebox.showerror("Error", "Hours worked must be a number!")
+            return
+
+        if not validate_hours(hours_worked):
+            messagebox.showerror("Error", f"Hours worked must be more than 0 and at most {MAX_SHIFT_HOURS}!")
+            return
+
+        volunteer_hours = VolunteerHours(date, hours_worked, description)
+        self.db_worker.submit(log_hours_for_existing_volunteer, id, volunteer_hours, on_success=self.hours_logged)
+
+    def hours_logged(self, logged):
+        if logged:
             messagebox.showinfo("Success", "Volunteer hours logged successfully!")
             self.create_main_menu()
         else:
             messagebox.showerror("Error", "Volunteer not found!")
 
+    def search_menu(self):
+        self.show_screen("search", self.build_search_menu)
+        self.search_results.delete(*self.search_results.get_children())
+
+    def build_search_menu(self, frame):
+        tk.Label(frame, text="Search", font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=10)
+
+        search_entry = tk.Entry(frame, font=self.font)
+        search_entry.pack(fill=tk.X, padx=10, pady=5)
+
+        # Optional shift date range, e.g. to find last March's shifts among
+        # years of matches.
+        range_frame = tk.Frame(frame, bg=self.bg_color)
+        range_frame.pack(pady=5)
+        tk.Label(range_frame, text="Shifts from (YYYY-MM-DD):", **self.label_style).pack(side=tk.LEFT)
+        start_entry = tk.Entry(range_frame, width=12)
+        start_entry.pack(side=tk.LEFT, padx=5)
+        tk.Label(range_frame, text="to:", **self.label_style).pack(side=tk.LEFT)
+        end_entry = tk.Entry(range_frame, width=12)
+        end_entry.pack(side=tk.LEFT, padx=5)
+        for entry in (search_entry, start_entry, end_entry):
+            entry.bind("<KeyRelease>", lambda event: self.schedule_search(search_entry.get(), start_entry.get(), end_entry.get()))
+
+        columns = [('kind', 'Match'), ('volunteer_id', 'ID'), ('name', 'Name'), ('date', 'Date'), ('text', 'Details')]
+        self.search_results = ttk.Treeview(frame, columns=[key for key, _ in columns], show='headings')
+        for key, heading in columns:
+            self.search_results.heading(key, text=heading)
+        self.search_results.bind("<Double-1>", self.open_search_result)
+        self.search_results.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
+
+        back_button = tk.Button(frame, text="Back", command=self.create_main_menu, **self.button_style)
+        back_button.pack(pady=5)
+
+    def schedule_search(self, text, start='', end=''):
+        # Waits for a short pause in typing, then drops any search still
+        # queued or running so only the latest text gets results. A date
+        # that is still being typed holds the search back until it is real.
+        if any(date and not self.validate_date(date) for date in (start, end)):
+            return
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(150, lambda: self.run_search(text, start or None, end or None))
+
+    def run_search(self, text, start=None, end=None):
+        self.search_after_id = None
+        if self.search_future is not None and not self.search_future.done():
+            self.db_worker.cancel(self.search_future)
+        self.search_future = self.db_worker.submit(lambda db: db.search(text, start=start, end=end),
+                                                   on_success=self.show_search_results)
+
+    def show_search_results(self, hits):
+        self.search_results.delete(*self.search_results.get_children())
+        for hit in hits:
+            self.search_results.insert('', tk.END, values=['' if value is None else value for value in hit[:5]])
+
+    def open_search_result(self, event):
+        selection = self.search_results.selection()
+        if selection:
+            self.search_volunteer(self.search_results.item(selection[0], 'values')[1])
+
     def generate_reports_menu(self):
-        self.clear_frame()
-        frame = tk.Frame(self.root, bg=self.bg_color)
-        frame.pack(expand=True, fill=tk.BOTH)
+        self.show_screen("reports", self.build_generate_reports_menu)
 
+    def build_generate_reports_menu(self, frame):
         tk.Label(frame, text="Generate Reports", font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=20)
 
         tk.Button(frame, text="Generate Volunteer Hours Report", command=self.generate_hours_report, **self.button_style).pack(pady=5)
         tk.Button(frame, text="Generate Volunteer Summary Report", command=self.generate_summary_report, **self.button_style).pack(pady=5)
+        tk.Button(frame, text="Activity Trends (30/90 days)", command=self.generate_activity_report, **self.button_style).pack(pady=5)
+        tk.Button(frame, text="Retention Cohorts", command=self.generate_retention_report, **self.button_style).pack(pady=5)
+        tk.Button(frame, text="Hours Distribution", command=self.generate_distribution_report, **self.button_style).pack(pady=5)
 
         back_button = tk.Button(frame, text="Back", command=self.create_main_menu, **self.button_style)
         back_button.pack(pady=5)
 
     def generate_hours_report(self):
-        report = self.db_handler.generate_hours_report()
-        self.display_report(report)
+        columns = [('id', 'ID', True), ('name', 'Name', True), ('total_hours', 'Total Hours', True)]
+        self.display_report("Volunteer Hours Report", columns, 'hours_report_page', 'name',
+                            lambda db: db.hours_report_lines())
 
     def generate_summary_report(self):
-        report = self.db_handler.generate_volunteer_summary()
-        self.display_report(report)
+        columns = [('id', 'ID', True), ('name', 'Name', True), ('email', 'Email', True),
+                   ('contact_info', 'Contact', False), ('skills', 'Skills', False)]
+        self.display_report("Volunteer Summary Report", columns, 'volunteer_summary_page', 'id',
+                            lambda db: db.volunteer_summary_lines())
+
+    def generate_activity_report(self):
+        self.display_analytics_report("Activity Trends", 'activity_report_lines')
+
+    def generate_retention_report(self):
+        self.display_analytics_report("Retention Cohorts", 'retention_report_lines')
+
+    def generate_distribution_report(self):
+        self.display_analytics_report("Hours Distribution", 'distribution_report_lines')
+
+    def display_analytics_report(self, title, report_name):
+        # The analytics reports need NumPy, which the rest of the app does
+        # not, so it is only imported when one of them is asked for.
+        try:
+            import analytics
+        except ImportError:
+            messagebox.showerror("Error", "This report needs NumPy. Install it with: pip install numpy")
+            return
+        self.display_text_report(title, getattr(analytics, report_name))
+
+    def display_text_report(self, title, report_lines):
+        self.clear_frame()
+        frame = tk.Frame(self.root, bg=self.bg_color)
+        frame.pack(expand=True, fill=tk.BOTH)
+
+        tk.Label(frame, text=title, font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=10)
+
+        text_frame = tk.Frame(frame)
+        text_frame.pack(expand=True, fill=tk.BOTH, padx=10)
+        report_text = tk.Text(text_frame, wrap=tk.NONE, font=('Courier', 10))
+        scrollbar = tk.Scrollbar(text_frame, command=report_text.yview)
+        report_text.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        report_text.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        self.db_worker.submit(lambda db: list(report_lines(db)), on_success=lambda lines: stream_to_text(report_text, lines))
+
+        save_button = tk.Button(frame, text="Save to File", command=lambda: self.save_report(report_lines), **self.button_style)
+        save_button.pack(pady=5)
+
+        back_button = tk.Button(frame, text="Back", command=self.create_main_menu, **self.button_style)
+        back_button.pack(pady=5)
+
+    def display_report(self, title, columns, fetch_page, sort, report_lines):
+        self.clear_frame()
+        frame = tk.Frame(self.root, bg=self.bg_color)
+        frame.pack(expand=True, fill=tk.BOTH)
+
+        tk.Label(frame, text=title, font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=10)
+
+        def fetch(sort, descending, after, limit, on_rows, on_failed):
+            def failed(error):
+                on_failed()
+                self.db_worker.report_error(error)
+
+            return self.db_worker.submit(fetch_page, sort, descending, after, limit, on_success=on_rows,
+                                         on_error=failed, on_cancel=on_failed)
+
+        from report_view import ReportView
+        report_view = ReportView(frame, columns, fetch, sort=sort)
+        report_view.pack(expand=True, fill=tk.BOTH)
+
+        save_button = tk.Button(frame, text="Save to File", command=lambda: self.save_report(report_lines), **self.button_style)
+        save_button.pack(pady=5)
+
+        back_button = tk.Button(frame, text="Back", command=self.create_main_menu, **self.button_style)
+        back_button.pack(pady=5)
 
-    def display_report(self, report):
+    def diagnostics_menu(self):
+        # Not cached: the snapshot is taken each time the screen is opened.
         self.clear_frame()
-        frame = tk.Frame(self.root)
+        frame = tk.Frame(self.root, bg=self.bg_color)
         frame.pack(expand=True, fill=tk.BOTH)
 
-        report_text = tk.Text(frame, wrap=tk.WORD)
-        report_text.insert(tk.END, report)
-        report_text.pack(expand=True, fill=tk.BOTH)
+        tk.Label(frame, text="Diagnostics", font=('Helvetica', 16, 'bold'), bg=self.bg_color).pack(pady=10)
+        if self.instrumentation is None:
+            tk.Label(frame, text="Timing is off. Start the app with: python main.py --diagnostics", **self.label_style).pack(pady=10)
+        else:
+            from instrumentation import diagnostics_lines
+            text_frame = tk.Frame(frame)
+            text_frame.pack(expand=True, fill=tk.BOTH, padx=10)
+            diagnostics_text = tk.Text(text_frame, wrap=tk.NONE, font=('Courier', 10))
+            scrollbar = tk.Scrollbar(text_frame, command=diagnostics_text.yview)
+            diagnostics_text.config(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            diagnostics_text.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+            diagnostics_text.insert(tk.END, ''.join(diagnostics_lines(self.instrumentation.snapshot())))
+
+            tk.Button(frame, text="Refresh", command=self.diagnostics_menu, **self.button_style).pack(pady=5)
+            tk.Button(frame, text="Save as JSON", command=self.save_diagnostics, **self.button_style).pack(pady=5)
+            tk.Button(frame, text="Reset", command=self.reset_diagnostics, **self.button_style).pack(pady=5)
 
         back_button = tk.Button(frame, text="Back", command=self.create_main_menu, **self.button_style)
         back_button.pack(pady=5)
 
+    def save_diagnostics(self):
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if path:
+            self.instrumentation.dump(path)
+            messagebox.showinfo("Success", "Diagnostics saved successfully!")
+
+    def reset_diagnostics(self):
+        self.instrumentation.reset()
+        self.diagnostics_menu()
+
+    def save_report(self, report_lines):
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if path:
+            self.db_worker.submit(lambda db: write_report(report_lines(db), path),
+                                  on_success=lambda result: messagebox.showinfo("Success", "Report saved successfully!"))
+
     def exit_app(self):
-        self.db_handler.close()
+        if self.worker is not None:
+            self.worker.close()
         self.root.quit()
 
     def validate_not_empty(self, *args):
-        for arg in args:
-            if not arg:
-                return False
-        return True
+        return validate_not_empty(*args)
 
     def validate_email(self, email):
-        import re
-        return re.match(r"[^@]+@[^@]+\.[^@]+", email) is not None
+        return validate_email(email)
+
+    def validate_date(self, date):
+        return validate_date(date)
+
+
+def remove_existing_volunteer(db_handler, id):
+    if db_handler.get_volunteer_by_id(id):
+        db_handler.remove_volunteer(id)
+        return True
+    return False
+
+
+def log_hours_for_existing_volunteer(db_handler, id, volunteer_hours):
+    if db_handler.get_volunteer_by_id(id):
+        db_handler.add_volunteer_hours(id, volunteer_hours)
+        return True
+    return False
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'size', 'capacity'])
+
+
+class VolunteerCache:
+    # Least-recently-used map of volunteer id -> Volunteer. It is an identity
+    # map as well: while an id stays cached every lookup returns the same
+    # object. Only found volunteers are stored, so adding a volunteer never
+    # has to invalidate anything. A capacity of 0 turns the cache off. The
+    # lock only guards the map; loads run outside it. Writers invalidate after
+    # they commit, and every invalidation bumps `generation`: a load that was
+    # already running then may have read the old row, so its result is
+    # returned but not stored.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def get(self, volunteer_id, load):
+        if not self.enabled:
+            return load(volunteer_id)
+        with self.lock:
+            volunteer = self.entries.get(volunteer_id)
+            if volunteer is not None:
+                self.entries.move_to_end(volunteer_id)
+                self.hits += 1
+                return volunteer
+            self.misses += 1
+            generation = self.generation
+        volunteer = load(volunteer_id)
+        if volunteer is not None:
+            with self.lock:
+                if generation != self.generation:
+                    return volunteer
+                volunteer = self.entries.setdefault(volunteer_id, volunteer)
+                if len(self.entries) > self.capacity:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return volunteer
+
+    def peek(self, volunteer_id):
+        # Looks an entry up without counting it or changing its LRU position.
+        return self.entries.get(volunteer_id)
+
+    def invalidate(self, volunteer_id):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(volunteer_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def resize(self, capacity):
+        with self.lock:
+            self.capacity = max(capacity, 0)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self.entries), self.capacity)
@@ -1,5 +1,5 @@
-class VolunteerHours:
-    def __init__(self, date, hours_worked, description):
-        self.date = date
-        self.hours_worked = hours_worked
-        self.description = description
\ No newline at end of file
+from collections import namedtuple
+
+
+class VolunteerHours(namedtuple('VolunteerHours', ['date', 'hours_worked', 'description'])):
+    __slots__ = ()
\ No newline at end of file
@@ -0,0 +1,68 @@
+from bisect import bisect_left, insort
+
+
+class VolunteerIndex:
+    # Sorted list of (key, volunteer_id) pairs for prefix lookups on the Tk
+    # thread. Every volunteer is keyed by its id, email, full name and each
+    # later word of the name, all lower-cased, so "lee" finds "Ann Lee".
+    def __init__(self, rows=()):
+        self.volunteers = {}
+        self.keys = []
+        for volunteer_id, name, email in rows:
+            self.volunteers[volunteer_id] = (name, email)
+            self.keys.extend((key, volunteer_id) for key in index_keys(volunteer_id, name, email))
+        self.keys.sort()
+
+    def __len__(self):
+        return len(self.volunteers)
+
+    def add(self, volunteer_id, name, email):
+        if volunteer_id in self.volunteers:
+            self.remove(volunteer_id)
+        self.volunteers[volunteer_id] = (name, email)
+        for key in index_keys(volunteer_id, name, email):
+            insort(self.keys, (key, volunteer_id))
+
+    def update(self, volunteer_id, name, email):
+        if volunteer_id in self.volunteers:
+            self.add(volunteer_id, name, email)
+
+    def remove(self, volunteer_id):
+        entry = self.volunteers.pop(volunteer_id, None)
+        if entry is None:
+            return
+        for key in index_keys(volunteer_id, *entry):
+            position = bisect_left(self.keys, (key, volunteer_id))
+            if position < len(self.keys) and self.keys[position] == (key, volunteer_id):
+                del self.keys[position]
+
+    def suggest(self, text, limit=10):
+        # Returns up to limit (id, name, email) tuples whose id, email or a
+        # name word starts with text, in key order, each volunteer once.
+        prefix = text.strip().lower()
+        if not prefix:
+            return []
+        found = []
+        seen = set()
+        for position in range(bisect_left(self.keys, (prefix,)), len(self.keys)):
+            key, volunteer_id = self.keys[position]
+            if not key.startswith(prefix):
+                break
+            if volunteer_id not in seen:
+                seen.add(volunteer_id)
+                found.append((volunteer_id, *self.volunteers[volunteer_id]))
+                if len(found) >= limit:
+                    break
+        return found
+
+
+def index_keys(volunteer_id, name, email):
+    name = (name or '').lower()
+    keys = {volunteer_id.lower(), (email or '').lower(), name}
+    keys.update(name[index + 1:] for index, char in enumerate(name) if char == ' ')
+    keys.discard('')
+    return keys
+
+
+def load_volunteer_index(db_handler):
+    return VolunteerIndex(db_handler.iter_volunteer_keys())
@@ -0,0 +1,59 @@
+import tkinter as tk
+
+
+class VolunteerPicker(tk.Frame):
+    # An Entry with a suggestion list underneath. suggest(text) returns
+    # (id, name, email) tuples; picking one puts its id in the entry, so get()
+    # always returns an id (or whatever the user typed).
+    def __init__(self, master, suggest, font=None, rows=6, **kwargs):
+        super().__init__(master, **kwargs)
+        self.suggest = suggest
+        self.suggestions = []
+        self.entry = tk.Entry(self, font=font)
+        self.entry.pack(fill=tk.X)
+        self.listbox = tk.Listbox(self, height=rows, font=font)
+        self.listbox.pack(fill=tk.X)
+        self.entry.bind("<KeyRelease>", self.on_key)
+        self.entry.bind("<Down>", lambda event: self.move_selection(1))
+        self.entry.bind("<Up>", lambda event: self.move_selection(-1))
+        self.entry.bind("<Return>", lambda event: self.pick())
+        self.listbox.bind("<<ListboxSelect>>", lambda event: self.pick())
+
+    def get(self):
+        return self.entry.get().strip()
+
+    def clear(self):
+        self.entry.delete(0, tk.END)
+        self.refresh()
+
+    def on_key(self, event):
+        if event is not None and getattr(event, 'keysym', None) in ('Up', 'Down', 'Return'):
+            return
+        self.refresh()
+
+    def refresh(self):
+        self.suggestions = self.suggest(self.entry.get())
+        self.listbox.delete(0, tk.END)
+        for volunteer_id, name, email in self.suggestions:
+            self.listbox.insert(tk.END, f"{volunteer_id} - {name} <{email}>")
+
+    def move_selection(self, step):
+        if not self.suggestions:
+            return
+        selection = self.listbox.curselection()
+        position = selection[0] + step if selection else 0
+        position = max(0, min(position, len(self.suggestions) - 1))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(position)
+        self.listbox.activate(position)
+        self.listbox.see(position)
+
+    def pick(self):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        volunteer_id = self.suggestions[selection[0]][0]
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, volunteer_id)
+        self.suggestions = []
+        self.listbox.delete(0, tk.END)